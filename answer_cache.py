@@ -0,0 +1,166 @@
+# answer_cache.py (Local cache of GENERAL_QUERY answers: exact + semantic match)
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from . import config
+from .log import get_logger
+
+logger = get_logger("answer_cache")
+
+FILLER_PREFIXES = ("hey ", "okay ", "ok ", "please ", "can you tell me ", "could you tell me ", "tell me ", "do you know ")
+# Explicit time markers: the answer is only good for a short while ("weather today" vs "weather in June")
+TIME_SENSITIVE_WORDS = {"today", "tonight", "tomorrow", "now", "current", "currently", "latest"}
+# Follow-ups that only make sense with the conversation so far are never cached
+CONTEXT_WORDS = {"it", "that", "this", "those", "these", "they", "them", "he", "she", "him", "her", "there", "again", "more"}
+CONTEXT_PREFIXES = ("and ", "what about ", "how about ", "why ", "also ")
+
+
+def normalize_question(text):
+    cleaned = re.sub(r"[^a-z0-9 ]+", " ", text.lower())
+    cleaned = " ".join(cleaned.split())
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in FILLER_PREFIXES:
+            if cleaned.startswith(prefix):
+                cleaned = cleaned[len(prefix):]
+                stripped = True
+    return cleaned
+
+def is_context_dependent(text):
+    normalized = normalize_question(text)
+    return normalized.startswith(CONTEXT_PREFIXES) or bool(CONTEXT_WORDS & set(normalized.split()))
+
+def ttl_for(text):
+    if TIME_SENSITIVE_WORDS & set(normalize_question(text).split()):
+        return config.ANSWER_CACHE_TIME_SENSITIVE_TTL_S
+    return config.ANSWER_CACHE_TTL_S
+
+
+# --- EMBEDDING INDEX (optional: fastembed + hnswlib) ---
+class _EmbeddingIndex:
+    """
+    Small CPU embedding model (fastembed, ONNX) with an HNSW approximate
+    nearest-neighbour index (hnswlib). Loaded on a background thread; until it
+    is ready, or if either package is missing, the cache matches exact text only.
+    """
+    def __init__(self, max_elements):
+        self.max_elements = max_elements
+        self.model = None
+        self.index = None
+        self.ready = threading.Event()
+        threading.Thread(target=self._load, daemon=True).start()
+
+    def _load(self):
+        try:
+            from fastembed import TextEmbedding
+            import hnswlib
+        except ImportError:
+            logger.warning("⚠️ fastembed/hnswlib not installed. Answer cache will match exact questions only.")
+            return
+        try:
+            self.model = TextEmbedding(model_name=config.ANSWER_CACHE_EMBED_MODEL)
+            dim = len(next(iter(self.model.embed(["warm up"]))))
+            self.index = hnswlib.Index(space="cosine", dim=dim)
+            self.index.init_index(max_elements=self.max_elements, ef_construction=100, M=16, allow_replace_deleted=True)
+            self.index.set_ef(32)
+            self.ready.set()
+            logger.info("✅ Answer cache embedding model ready (%s).", config.ANSWER_CACHE_EMBED_MODEL)
+        except Exception as e:
+            logger.error("🚨 Answer cache embedding model failed to load: %s", e)
+
+    def embed(self, text):
+        return next(iter(self.model.embed([text])))
+
+    def add(self, label, vector):
+        self.index.add_items([vector], [label], replace_deleted=True)
+
+    def remove(self, label):
+        try:
+            self.index.mark_deleted(label)
+        except RuntimeError:
+            pass # Never indexed (added before the model was ready)
+
+    def nearest(self, vector):
+        """Returns (label, cosine_similarity) or (None, 0.0)."""
+        if self.index.get_current_count() == 0:
+            return None, 0.0
+        try:
+            labels, distances = self.index.knn_query([vector], k=1)
+        except RuntimeError:
+            return None, 0.0 # Every element is marked deleted
+        return int(labels[0][0]), 1.0 - float(distances[0][0])
+
+
+# --- ANSWER CACHE ---
+class AnswerCache:
+    """
+    GENERAL_QUERY answers keyed by normalized question text, with a semantic
+    fallback through _EmbeddingIndex. Entries expire after their own TTL and
+    the least recently used entry is evicted beyond ANSWER_CACHE_MAX_ENTRIES.
+    """
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or config.ANSWER_CACHE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # normalized question -> entry dict, LRU order
+        self.by_label = {}
+        self.next_label = 0
+        self.hits = self.misses = 0
+        # +1: a new entry is indexed before the LRU one is evicted
+        self.embeddings = _EmbeddingIndex(self.max_entries + 1) if config.ANSWER_CACHE_SEMANTIC else None
+
+    def _semantic_ready(self):
+        return self.embeddings is not None and self.embeddings.ready.is_set()
+
+    def _drop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.by_label.pop(entry["label"], None)
+        if self._semantic_ready():
+            self.embeddings.remove(entry["label"])
+
+    def lookup(self, question):
+        """Returns the cached list of sentences, or None."""
+        key = normalize_question(question)
+        now = time.time()
+        vector = self.embeddings.embed(key) if self._semantic_ready() else None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and vector is not None:
+                label, similarity = self.embeddings.nearest(vector)
+                candidate = self.by_label.get(label)
+                if candidate and similarity >= config.ANSWER_CACHE_SIMILARITY:
+                    entry = candidate
+                    key = candidate["key"]
+            if entry is not None and entry["expires"] <= now:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(entry["sentences"])
+
+    def store(self, question, sentences, ttl=None):
+        if not sentences:
+            return
+        key = normalize_question(question)
+        ttl = ttl_for(question) if ttl is None else ttl
+        if ttl <= 0:
+            return
+        vector = self.embeddings.embed(key) if self._semantic_ready() else None
+        with self.lock:
+            self._drop(key)
+            label = self.next_label
+            self.next_label += 1
+            entry = {"key": key, "label": label, "sentences": list(sentences), "expires": time.time() + ttl}
+            self.entries[key] = entry
+            self.by_label[label] = entry
+            if vector is not None:
+                self.embeddings.add(label, vector)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
@@ -0,0 +1,1069 @@
+# bench.py (Latency benchmarks against the local stand-ins in standins.py)
+# Run as a module from the parent directory, e.g.:  python -m <package>.bench bargein
+import argparse
+import array
+import collections
+import gc
+import json
+import math
+import os
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+import wave
+
+from . import config
+from . import state
+from .command_queue import CommandQueue
+from .log import setup_logging, shutdown_logging
+from .playback import PcmPlayer
+from .tts_engines import create_local_tts
+from .standins import FakeChatServer, FakeOutputStream, FakeTTSClient, FakeTranscriberServer, NullIntentClassifier
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _wait_for(predicate, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+# --- BARGE-IN: interrupt-to-silence latency ---
+def bench_bargein(args):
+    from .main import FireworksResponder, ElevenLabsSpeaker, barge_in
+
+    server = FakeChatServer(token_delay=args.token_delay).start()
+    tts = FakeTTSClient(chunk_delay=args.chunk_delay)
+
+    responder = FireworksResponder()
+    responder.url = server.url
+    speaker = ElevenLabsSpeaker(client=tts, player=PcmPlayer(open_output=FakeOutputStream))
+    responder.start()
+    speaker.start()
+
+    latencies = []
+    leaked_sentences = 0
+    for trial in range(args.trials):
+        state.interruption_event.clear()
+        state.command_queue.put(f"tell me a long story number {trial}")
+
+        if not _wait_for(speaker.player.is_playing, timeout=10):
+            print(f"[Bench] Trial {trial}: speaker never started. Skipping.")
+            continue
+        time.sleep(args.speak_for)
+
+        latencies.append(barge_in(speaker))
+        # Anything that reaches the queue after the flush means the LLM stream was not stopped
+        time.sleep(0.2)
+        leaked_sentences += state.tts_sentence_queue.drop_sentences()
+        state.interruption_event.clear()
+
+    server.stop()
+
+    if not latencies:
+        print("[Bench] No successful trials.")
+        return 1
+
+    target = config.BARGE_IN_TARGET_MS
+    p95 = _percentile(latencies, 95)
+    print("\n--- Barge-in (interrupt -> silence) ---")
+    print(f"trials: {len(latencies)}")
+    print(f"p50: {statistics.median(latencies):.1f} ms  p95: {p95:.1f} ms  max: {max(latencies):.1f} ms  (target {target} ms)")
+    print(f"LLM streams closed early: {server.closed_streams}  completed: {server.completed_streams}")
+    print(f"TTS streams aborted: {tts.aborted_streams}")
+    print(f"sentences queued after barge-in: {leaked_sentences}")
+
+    ok = p95 <= target and leaked_sentences == 0
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- UPLINK: capture timing while the network stalls ---
+def bench_uplink(args):
+    from .transcribers import FrameUplink
+
+    frame = b"\x00\x00" * int(config.SAMPLE_RATE * 0.03) # One 30 ms VAD frame
+    received = []
+
+    def slow_send(data):
+        # A normal send takes --send-delay; every --stall-every seconds one hangs for --stall
+        now = time.monotonic()
+        if now - slow_send.last_stall >= args.stall_every:
+            slow_send.last_stall = now
+            time.sleep(args.stall)
+        else:
+            time.sleep(args.send_delay)
+        received.append(len(data))
+        return True
+    slow_send.last_stall = time.monotonic()
+
+    uplink = FrameUplink(slow_send)
+    put_ms, lateness_ms = [], []
+    started = time.perf_counter()
+    for i in range(int(args.duration / 0.03)):
+        due = started + i * 0.03
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lateness_ms.append((time.perf_counter() - due) * 1000)
+        t0 = time.perf_counter()
+        uplink.put(frame)
+        put_ms.append((time.perf_counter() - t0) * 1000)
+    uplink.close()
+    uplink.thread.join(timeout=args.stall + 5)
+
+    frames = len(put_ms)
+    print("\n--- Transcriber uplink (capture loop vs. network stalls) ---")
+    print(f"frames captured: {frames}  sent: {uplink.sent_frames}  dropped: {uplink.dropped_frames}")
+    print(f"messages: {uplink.messages}  frames/message: {uplink.sent_frames / max(1, uplink.messages):.1f}")
+    print(f"put(): p99 {_percentile(put_ms, 99):.3f} ms  max {max(put_ms):.3f} ms")
+    print(f"capture lateness: p99 {_percentile(lateness_ms, 99):.2f} ms  max {max(lateness_ms):.2f} ms")
+
+    ok = max(put_ms) < 5 and uplink.sent_frames + uplink.dropped_frames == frames
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- UPLINK CODECS: bytes sent and end-to-end latency per codec ---
+def _speech_like_pcm(seconds, seed=7):
+    """Voiced harmonics with a syllable-rate envelope and a little noise: compresses roughly like speech."""
+    rng = random.Random(seed)
+    rate = config.SAMPLE_RATE
+    samples = array.array("h")
+    for n in range(int(seconds * rate)):
+        t = n / rate
+        f0 = 120 + 20 * math.sin(2 * math.pi * 0.7 * t)
+        envelope = max(0.0, math.sin(2 * math.pi * 4 * t)) ** 2
+        voiced = sum(math.sin(2 * math.pi * f0 * k * t) / k for k in (1, 2, 3, 5, 8))
+        samples.append(int(6000 * envelope * voiced + rng.gauss(0, 150)))
+    return samples.tobytes()
+
+def bench_codec(args):
+    from .transcribers import FireworksTranscriber
+    from .uplink_codecs import choose_encoder
+
+    frame_bytes = int(config.SAMPLE_RATE * 0.03) * 2
+    pcm = _speech_like_pcm(args.duration)
+    frames = [pcm[i:i + frame_bytes] for i in range(0, len(pcm) - frame_bytes + 1, frame_bytes)]
+    results = []
+
+    for codec in args.codecs:
+        if choose_encoder((codec,), (codec,)).name != codec:
+            print(f"[Bench] {codec}: encoder unavailable here, skipped.")
+            continue
+        server = FakeTranscriberServer().start()
+        capture_times, latencies = [], []
+
+        def on_text(text):
+            heard_ms = int(text)
+            index = min(len(capture_times), math.ceil(heard_ms / 30)) - 1
+            if index >= 0:
+                latencies.append((time.perf_counter() - capture_times[index]) * 1000)
+
+        transcriber = FireworksTranscriber(on_text, url=server.url, codecs=(codec,))
+        transcriber.start()
+        if not transcriber.wait_ready(timeout=5):
+            print(f"[Bench] {codec}: could not connect to the stand-in. Skipped.")
+            server.stop()
+            continue
+
+        started = time.perf_counter()
+        for i, frame in enumerate(frames):
+            due = started + i * 0.03
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            capture_times.append(time.perf_counter())
+            transcriber.send(frame)
+        uplink = transcriber.uplink
+        uplink.close(wait=5)
+        _wait_for(lambda: server.messages_received >= uplink.messages and len(latencies) >= uplink.messages, timeout=5)
+        transcriber.stop()
+        server.stop()
+
+        results.append((codec, server.bytes_received, uplink.messages, server.decode_errors, latencies))
+
+    if not results:
+        print("[Bench] No codec could be benchmarked.")
+        return 1
+
+    raw_bytes = len(frames) * frame_bytes
+    print(f"\n--- Uplink codecs ({len(frames) * 30 / 1000:.1f} s of audio, raw PCM {raw_bytes} bytes) ---")
+    for codec, sent, messages, errors, latencies in results:
+        kbps = sent * 8 / (len(frames) * 0.03) / 1000
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        p95 = _percentile(latencies, 95) if latencies else float("nan")
+        print(f"{codec:<5} bytes: {sent:>8} ({sent / raw_bytes:6.1%})  {kbps:6.1f} kbit/s  messages: {messages:>4}  "
+              f"decode errors: {errors}  latency p50 {p50:.1f} ms  p95 {p95:.1f} ms")
+
+    ok = all(errors == 0 and latencies for _, _, _, errors, latencies in results)
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- WAKE GATE: idle CPU over long room recordings ---
+def _room_frames(args, frame_length):
+    """Yields (pcm, is_onset) frames from 16 kHz mono WAV files, or from synthetic room audio."""
+    import numpy as np
+    if args.wav:
+        for path in args.wav:
+            with wave.open(path, "rb") as w:
+                if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (config.SAMPLE_RATE, 1, 2):
+                    raise SystemExit(f"{path}: need {config.SAMPLE_RATE} Hz mono 16-bit audio")
+                while True:
+                    pcm = w.readframes(frame_length)
+                    if len(pcm) < frame_length * 2:
+                        break
+                    yield pcm, False
+        return
+
+    # Quiet room (noise + mains hum) with short bursts of speech-like sound; onsets are known
+    rng = np.random.default_rng(7)
+    rate = config.SAMPLE_RATE
+    t = np.arange(frame_length) / rate
+    burst_left = 0
+    for i in range(int(args.synthetic_hours * 3600 * rate / frame_length)):
+        start = i * frame_length / rate
+        frame = rng.normal(0, 25, frame_length) + 15 * np.sin(2 * np.pi * 50 * (t + start))
+        onset = False
+        if burst_left == 0 and rng.random() < args.activity / (60.0 * rate / frame_length):
+            burst_left, onset = int(rng.uniform(1.0, 5.0) * rate / frame_length), True
+        if burst_left:
+            burst_left -= 1
+            f0 = 110 + 30 * rng.random()
+            frame += 2500 * sum(np.sin(2 * np.pi * f0 * k * (t + start)) / k for k in (1, 2, 3, 5))
+        yield np.clip(frame, -32768, 32767).astype(np.int16).tobytes(), onset
+
+def bench_wakegate(args):
+    try:
+        import numpy # noqa: F401 (the gate needs it)
+    except ImportError:
+        print("[Bench] numpy is not installed; the wake gate is disabled without it.")
+        return 1
+    from .wake_gate import WakeWordGate
+
+    gated = ungated = None
+    frame_length = 512
+    if args.porcupine:
+        import pvporcupine
+        gated = pvporcupine.create(access_key=config.PICOVOICE_ACCESS_KEY, keywords=[config.WAKE_WORD])
+        ungated = pvporcupine.create(access_key=config.PICOVOICE_ACCESS_KEY, keywords=[config.WAKE_WORD])
+        frame_length = gated.frame_length
+
+    gate = WakeWordGate(frame_length)
+    frames = onsets = missed_onsets = 0
+    gate_cpu = gated_cpu = ungated_cpu = 0.0
+    gated_hits = ungated_hits = 0
+    pending_onsets = {} # id(pcm) -> pcm, for onsets not yet seen by the detector
+    for pcm, is_onset in _room_frames(args, frame_length):
+        frames += 1
+        if is_onset:
+            onsets += 1
+            pending_onsets[id(pcm)] = pcm
+        started = time.process_time()
+        admitted = gate.admit(pcm)
+        gate_cpu += time.process_time() - started
+        for frame in admitted:
+            pending_onsets.pop(id(frame), None)
+        if gated is not None:
+            started = time.process_time()
+            gated_hits += sum(gated.process(memoryview(f).cast("h")) >= 0 for f in admitted)
+            gated_cpu += time.process_time() - started
+            started = time.process_time()
+            ungated_hits += ungated.process(memoryview(pcm).cast("h")) >= 0
+            ungated_cpu += time.process_time() - started
+        if len(pending_onsets) > 0 and not admitted and len(gate.lookback) == gate.lookback.maxlen:
+            # An onset that fell out of the look-back buffer without being admitted was missed
+            live = {id(f) for f in gate.lookback}
+            for key in [k for k in pending_onsets if k not in live]:
+                del pending_onsets[key]
+                missed_onsets += 1
+
+    hours = frames * frame_length / config.SAMPLE_RATE / 3600
+    print("\n--- Wake-word energy gate ---")
+    print(f"audio: {hours:.2f} h  frames: {frames}  reached Porcupine: {gate.processed} ({gate.processed / max(1, frames):.1%})  skipped: {gate.skipped}")
+    print(f"gate CPU: {gate_cpu / max(hours, 1e-9):.2f} s per audio hour")
+    if onsets:
+        print(f"sound onsets: {onsets}  onsets never given to Porcupine: {missed_onsets}")
+    if gated is not None:
+        print(f"Porcupine CPU per audio hour: ungated {ungated_cpu / hours:.1f} s  gated {(gated_cpu + gate_cpu) / hours:.1f} s (incl. gate)")
+        print(f"detections: ungated {ungated_hits}  gated {gated_hits}")
+        gated.delete()
+        ungated.delete()
+    else:
+        print("(pass --porcupine with a Picovoice key to measure Porcupine CPU and compare detections)")
+
+    ok = missed_onsets == 0 and (gated is None or gated_hits == ungated_hits)
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- STATE MACHINE: concurrent transitions from the three workers ---
+def bench_statemachine(args):
+    S = state.AssistantState
+    # Strict, so every refused undeclared move is attributable to the worker that tried it
+    machine = state.AssistantStateMachine(strict=True)
+    observed = []
+    machine.subscribe(lambda prev, new: observed.append((prev, new)))
+    stop = threading.Event()
+
+    # Each worker makes the same compare-and-set moves it makes in main.py
+    moves = {
+        "audio": [(S.LISTENING, {S.IDLE, S.SPEAKING}), (S.THINKING, {S.LISTENING}), (S.IDLE, {S.LISTENING})],
+        "responder": [(S.THINKING, {S.IDLE, S.THINKING, S.SPEAKING}), (S.SPEAKING, {S.THINKING}), (S.IDLE, {S.THINKING, S.SPEAKING})],
+        "speaker": [(S.SPEAKING, {S.THINKING}), (S.IDLE, {S.SPEAKING, S.THINKING})],
+        # Undeclared moves: each one is either stale or refused as illegal, never made
+        "rogue": [(S.SPEAKING, {S.IDLE, S.LISTENING}), (S.LISTENING, {S.THINKING})],
+    }
+    illegal = collections.Counter() # worker -> IllegalTransition raised
+    made = collections.Counter() # worker -> transitions that went through
+
+    def worker(name, seed):
+        rng = random.Random(seed)
+        while not stop.is_set():
+            target, expected = rng.choice(moves[name])
+            try:
+                if machine.transition(target, expected=expected, reason=name) and name == "rogue":
+                    made[name] += 1
+            except state.IllegalTransition:
+                illegal[name] += 1
+            if args.jitter:
+                time.sleep(rng.random() * args.jitter)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(name, i * 1000 + n), daemon=True)
+               for i in range(args.threads) for n, name in enumerate(moves)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - started
+
+    chained = all(observed[i][1] == observed[i + 1][0] for i in range(len(observed) - 1))
+    declared = all(new in machine.TRANSITIONS[prev] for prev, new in observed)
+    dwell = sum(machine.dwell_seconds().values())
+    refused = illegal["rogue"] > 0 and made["rogue"] == 0
+    counted = machine.illegal_transitions == illegal["rogue"] and sum(illegal.values()) == illegal["rogue"]
+
+    print("\n--- State machine under concurrent transitions ---")
+    print(f"worker threads: {len(threads)}  transitions: {len(observed)}  stale (refused): {machine.stale_transitions}")
+    print(f"undeclared moves refused: {illegal['rogue']}  made: {made['rogue']}  counted as illegal: {machine.illegal_transitions}"
+          f"  by the other workers: {sum(illegal.values()) - illegal['rogue']}")
+    print(f"subscriber order consistent: {chained}  all declared: {declared}")
+    print(f"dwell total: {dwell:.3f} s  wall: {wall:.3f} s")
+
+    # Dwell also counts the few ms between creating the machine and starting the clock
+    ok = refused and counted and chained and declared and abs(dwell - wall) <= 0.05
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- PLAYBACK: time-to-first-sample, gaps between sentences, stop latency ---
+def bench_playback(args):
+    from .main import ElevenLabsSpeaker
+
+    speech = b"\x00\x10" # One non-silent 16-bit sample
+    blocks = [] # (perf_counter when the device pulled it, block)
+
+    def open_output(sample_rate, frames_per_buffer, callback):
+        return FakeOutputStream(sample_rate, frames_per_buffer, callback, on_block=lambda block: blocks.append((time.perf_counter(), block)))
+
+    tts = FakeTTSClient(chunks_per_sentence=args.chunks, chunk_delay=args.chunk_delay, sample=speech)
+    speaker = ElevenLabsSpeaker(client=tts, player=PcmPlayer(open_output=open_output))
+    speaker.start()
+    _wait_for(speaker.player.is_open, timeout=5)
+    state.interruption_event.clear()
+
+    # 1. One turn of several sentences: every sample between the first and the last word should be speech
+    turn = state.new_turn()
+    del blocks[:]
+    for i in range(args.sentences):
+        state.tts_sentence_queue.put(f"Sentence number {i}.", turn)
+    state.tts_sentence_queue.end_turn(turn)
+    expected = args.sentences * args.chunks * len(tts.chunk) // len(speech)
+    spoken = lambda: sum(block.count(speech) for _, block in list(blocks))
+    finished = _wait_for(lambda: spoken() >= expected, timeout=args.sentences * args.chunks * args.chunk_delay * 4 + 5)
+    audio = b"".join(block for _, block in blocks)
+    first, last = audio.find(speech), audio.rfind(speech)
+    gap_samples = (last - first) // 2 + 1 - audio.count(speech) if first >= 0 else 0
+    latencies = [seconds * 1000 for seconds, queued in speaker.first_sample_latencies if not queued]
+    queued = sum(1 for _, queued in speaker.first_sample_latencies if queued)
+
+    # 2. Stop while speaking: time until the output device is handed silence
+    stop_ms = []
+    for _ in range(args.stops):
+        state.new_turn()
+        state.tts_sentence_queue.put("A long sentence that gets interrupted.")
+        if not _wait_for(speaker.player.is_playing, timeout=5):
+            continue
+        time.sleep(0.2)
+        stopped = time.perf_counter()
+        speaker.stop_playback()
+        _wait_for(lambda: any(t > stopped and block.count(speech) == 0 for t, block in list(blocks)), timeout=2)
+        silent_at = next(t for t, block in list(blocks) if t > stopped and block.count(speech) == 0)
+        stop_ms.append((silent_at - stopped) * 1000)
+        state.CURRENT_TURN.cancel()
+    speaker.player.close()
+
+    print("\n--- In-process playback (stand-in TTS and output device) ---")
+    print(f"sentences: {args.sentences}  all audio played: {finished}  underruns: {speaker.player.underruns}")
+    if latencies:
+        print(f"time to first sample (nothing playing): {statistics.median(latencies):.1f} ms over {len(latencies)} sentence(s)  "
+              f"(TTS first chunk after {args.chunk_delay * 1000:.0f} ms, pre-roll {config.PLAYBACK_PREROLL_MS} ms)")
+    print(f"sentences fetched while the previous one was still playing: {queued}")
+    print(f"silence between sentences: {gap_samples / speaker.player.sample_rate * 1000:.1f} ms")
+    if stop_ms:
+        print(f"stop -> silence: p50 {statistics.median(stop_ms):.1f} ms  max {max(stop_ms):.1f} ms  (block {config.PLAYBACK_BLOCK_MS} ms)")
+
+    ok = finished and gap_samples == 0 and bool(stop_ms) and max(stop_ms) <= 2 * config.PLAYBACK_BLOCK_MS
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- LOCAL TTS: first-chunk latency and real-time factor of the CPU voice ---
+def bench_localtts(args):
+    engine = create_local_tts()
+    if engine is None:
+        print("[Bench] No local TTS engine (set LOCAL_TTS_ENGINE / PIPER_MODEL_PATH, or install espeak-ng).")
+        return 1
+
+    replies = args.text or ["Pausing Spotify playback via API.", "Volume set to 40 percent.",
+                            "Message cancelled. Returning to idle.", "Skipping to the next track via API."]
+    first_chunk_ms = []
+    factors = []
+    for _ in range(args.rounds):
+        for text in replies:
+            started = time.perf_counter()
+            first = None
+            audio = 0
+            for chunk in engine.stream(text):
+                if first is None:
+                    first = time.perf_counter() - started
+                audio += len(chunk)
+            total = time.perf_counter() - started
+            first_chunk_ms.append(first * 1000)
+            factors.append(total / (audio / 2 / engine.sample_rate))
+
+    print(f"\n--- Local TTS: {engine.name} ({engine.sample_rate} Hz), {len(first_chunk_ms)} replies ---")
+    print(f"first chunk: p50 {statistics.median(first_chunk_ms):.1f} ms  p95 {_percentile(first_chunk_ms, 95):.1f} ms")
+    print(f"real-time factor (synthesis time / audio length): p50 {statistics.median(factors):.3f}  max {max(factors):.3f}")
+    return 0
+
+
+# --- COMMAND QUEUE: a "stop" or "pause" spoken behind slow turns ---
+def bench_commands(args):
+    config.COMMAND_QUERY_MAX_AGE_S = args.query_max_age
+    print(f"\n--- {args.queries} queries of {args.turn:.1f}s each (every one spoken twice), "
+          f"'pause music' at {args.control_at:.1f}s, 'stop' at {args.stop_at:.1f}s ---")
+    for mode in ("fifo", "priority"):
+        current = {"turn": threading.Event()}
+        q = queue.Queue() if mode == "fifo" else CommandQueue(on_preempt=lambda: current["turn"].set())
+        put_at = {}
+        waited = {}
+        served = []
+        finished = threading.Event()
+
+        def consumer():
+            while True:
+                try:
+                    command = q.get(timeout=args.stop_at + args.turn)
+                except queue.Empty:
+                    break
+                waited[command] = time.monotonic() - put_at[command]
+                turn = current["turn"] = threading.Event()
+                if command.startswith("what"):
+                    served.append(command if not turn.wait(args.turn) else command + " (cut short)")
+                q.task_done()
+                if command == "stop":
+                    break
+            finished.set()
+
+        started = time.monotonic()
+        threading.Thread(target=consumer, daemon=True).start()
+        for command in [f"what is fact number {i}" for i in range(args.queries) for _ in range(2)]:
+            put_at[command] = time.monotonic()
+            q.put(command)
+        for at, command in sorted([(args.control_at, "pause music"), (args.stop_at, "stop")]):
+            time.sleep(max(0.0, started + at - time.monotonic()))
+            put_at[command] = time.monotonic()
+            q.put(command)
+        finished.wait()
+
+        counts = getattr(q, "counts", {})
+        print(f"{mode:>8}: 'pause music' waited {waited.get('pause music', float('nan')):.2f}s  "
+              f"'stop' waited {waited.get('stop', float('nan')):.2f}s  queries answered: {len(served)}  "
+              f"collapsed: {counts.get('collapsed', 0)}  expired: {counts.get('expired', 0)}  "
+              f"dropped by stop: {counts.get('preempted', 0)}  done after {time.monotonic() - started:.1f}s")
+    return 0
+
+
+# --- SOAK: thousands of turns through the responder and speaker; memory and queues must stay flat ---
+def _rss_mb():
+    """Resident set size of this process (Linux); elsewhere the peak RSS, which can only grow."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def bench_soak(args):
+    from . import main
+    from .skill_registry import SkillRegistry
+
+    config.ANSWER_CACHE_SEMANTIC = False # Exact-match cache only: no model download, no background load
+    answer = " ".join(f"Short sentence number {i}." for i in range(args.sentences))
+    route = lambda query: ({"intent": "LAUNCH_TARGET", "slots": {"target": "notepad", "target_type": "app"}} if query.startswith("open")
+                           else {"intent": "GENERAL_QUERY", "slots": {"query": query}})
+    server = FakeChatServer(answer=answer, router_reply=route, token_delay=0.0).start()
+    tts = FakeTTSClient(chunks_per_sentence=2, chunk_size=256, chunk_delay=0.0)
+
+    main.SKILLS = SkillRegistry()
+    @main.SKILLS.skill("launch", intents=["LAUNCH_TARGET"]) # Stand-in: replies without launching anything
+    def launch(slots, ctx):
+        return "Done."
+
+    # A small sentence queue, so the responder regularly waits for the speaker (backpressure)
+    state.tts_sentence_queue.maxsize = args.sentence_queue
+    responder = main.FireworksResponder()
+    responder.url = server.url
+    responder.intent_classifier = NullIntentClassifier()
+    speaker = main.ElevenLabsSpeaker(client=tts, player=PcmPlayer(open_output=FakeOutputStream))
+    responder.start()
+    speaker.start()
+    idle = threading.Event()
+    state.state_machine.subscribe(lambda previous, new: new == state.AssistantState.IDLE and idle.set())
+    settled = lambda: (state.command_queue.qsize() == 0 and state.command_queue.running is None
+                       and state.tts_sentence_queue.qsize() == 0)
+
+    # New questions (LLM stream), repeated ones (answer cache), skills, and answers cut short by "stop"
+    kinds = ["query", "repeat", "skill", "stop"]
+    samples = [] # (turns done, RSS MB)
+    stuck = leftovers = 0
+    started = time.perf_counter()
+    for i in range(args.turns):
+        kind = kinds[i % len(kinds)]
+        idle.clear()
+        if kind == "query":
+            state.command_queue.put(f"tell me fact number {i}")
+        elif kind == "repeat":
+            state.command_queue.put("what is the capital of france")
+        elif kind == "skill":
+            state.command_queue.put("open notepad")
+        else:
+            state.command_queue.put(f"tell me a longer fact number {i}")
+            _wait_for(speaker.player.is_playing, timeout=5)
+            idle.clear()
+            state.command_queue.put("stop")
+        if not idle.wait(timeout=10) or not _wait_for(settled, timeout=5):
+            stuck += 1
+            print(f"[Bench] Turn {i} ({kind}) did not settle: state {state.state_machine.current}, "
+                  f"commands {state.command_queue.qsize()}, sentences {state.tts_sentence_queue.qsize()}")
+            state.tts_sentence_queue.drop_sentences() # Its end-of-turn markers still reach the speaker
+            state.state_machine.reset(reason="soak")
+        leftovers += state.tts_sentence_queue.qsize()
+
+        done = i + 1
+        if done >= args.warmup and (done - args.warmup) % args.sample_every == 0 or done == args.turns:
+            gc.collect()
+            samples.append((done, _rss_mb()))
+    elapsed = time.perf_counter() - started
+    server.stop()
+    speaker.player.close()
+
+    counts = state.tts_sentence_queue.counts
+    print(f"\n--- Soak: {args.turns} turns in {elapsed:.0f}s ({args.turns / elapsed:.1f} turns/s) ---")
+    for done, rss in samples:
+        print(f"after {done:>6} turns: RSS {rss:7.1f} MB")
+    growth = samples[-1][1] - samples[0][1] if len(samples) > 1 else 0.0
+    print(f"RSS growth after warm-up: {growth:+.1f} MB (limit {args.max_growth_mb} MB)")
+    print(f"sentences queued: {counts['queued']}  waited for the speaker: {counts['waited']}  dropped: {counts['dropped']}")
+    print(f"turns ended: {counts['ended']}  duplicate end-of-turn markers: {counts['duplicate_end']}  "
+          f"items left behind after a turn: {leftovers}  turns that did not settle: {stuck}")
+    print(f"commands: {dict(state.command_queue.counts)}")
+
+    ok = growth <= args.max_growth_mb and counts["duplicate_end"] == 0 and leftovers == 0 and stuck == 0
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- CONTACTS: misheard names against a synthetic contact book ---
+_GIVEN_NAMES = ["jane", "bob", "robert", "jennifer", "michael", "katherine", "stephen", "sarah", "mohammed", "priya",
+                "anjali", "rahul", "deepak", "thomas", "lucy", "olivia", "daniel", "chris", "elizabeth", "mark",
+                "fatima", "arjun", "sean", "neha", "william", "grace", "omar", "meera", "john", "ali"]
+_SURNAMES = ["smith", "patel", "kumar", "jones", "brown", "sharma", "khan", "taylor", "singh", "wilson"]
+# ASR-style confusions: (written form, misheard form)
+_MISHEARINGS = [("ane", "ayne"), ("ph", "v"), ("ie", "y"), ("k", "c"), ("c", "k"), ("ee", "i"), ("ah", "a"),
+                ("sh", "s"), ("o", "oh"), ("ea", "ee"), ("er", "a"), ("y", "i"), ("th", "t"), ("ll", "l")]
+
+def _mishear(name, rng):
+    choices = [(a, b) for a, b in _MISHEARINGS if a in name]
+    if choices:
+        a, b = rng.choice(choices)
+        return name.replace(a, b, 1)
+    i = rng.randrange(1, len(name)) # Swap two neighbouring letters
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:] if i < len(name) else name + "e"
+
+def bench_contacts(args):
+    from .contacts import ContactIndex, NICKNAME_GROUPS
+
+    rng = random.Random(args.seed)
+    names = set(_GIVEN_NAMES)
+    while len(names) < args.contacts:
+        names.add(f"{rng.choice(_GIVEN_NAMES)} {rng.choice(_SURNAMES)}")
+    book = {name: f"+4470000{i:05d}" for i, name in enumerate(sorted(names))}
+    started = time.perf_counter()
+    index = ContactIndex(book, aliases={})
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # (kind, spoken, intended contact): exact names, nicknames with the surname and misheard names
+    nicknames = {form: group for group in NICKNAME_GROUPS for form in group}
+    trials = []
+    for _ in range(args.lookups):
+        name = rng.choice(sorted(book))
+        kind = rng.choice(("exact", "nickname", "misheard", "misheard"))
+        given, _, surname = name.partition(" ")
+        others = [n for n in nicknames.get(given, ()) if n != given and surname] # "bobby smith" for "robert smith"
+        if kind == "nickname" and others:
+            spoken = f"{rng.choice(sorted(others))} {surname}"
+            trials.append((kind, spoken, spoken if spoken in book else name)) # "bob smith" may be saved as well
+        elif kind != "exact":
+            spoken = _mishear(name, rng)
+            trials.append(("misheard", spoken, spoken if spoken in book else name))
+        else:
+            trials.append((kind, name, name))
+
+    lookup_us = []
+    outcomes = {kind: {"n": 0, "top1": 0, "accepted": 0, "wrong": 0, "asked": 0} for kind in ("exact", "nickname", "misheard")}
+    for kind, spoken, intended in trials:
+        started = time.perf_counter()
+        ranked = index.match(spoken)
+        lookup_us.append((time.perf_counter() - started) * 1e6)
+        match, candidates = index.resolve(spoken)
+        row = outcomes[kind]
+        row["n"] += 1
+        row["top1"] += bool(ranked) and ranked[0].name == intended
+        if match:
+            row["accepted" if match.name == intended else "wrong"] += 1
+        elif candidates:
+            row["asked"] += 1
+
+    print(f"\n--- Contact index: {len(book)} contacts (built in {build_ms:.1f} ms), {len(trials)} lookups ---")
+    print(f"lookup: p50 {statistics.median(lookup_us):.0f} us  p99 {_percentile(lookup_us, 99):.0f} us  max {max(lookup_us):.0f} us")
+    print(f"{'spoken as':<10} {'n':>6} {'top-1':>7} {'accepted':>9} {'wrong':>6} {'asked':>6}")
+    for kind, row in outcomes.items():
+        if row["n"]:
+            n = row["n"]
+            print(f"{kind:<10} {n:>6} {row['top1'] / n:>7.1%} {row['accepted'] / n:>9.1%} {row['wrong'] / n:>6.1%} {row['asked'] / n:>6.1%}")
+    print("(accepted: resolved to the intended contact without a retry; asked: 'Did you mean X or Y?')")
+
+    # Asking again is fine; messaging the wrong person is not
+    wrong = sum(row["wrong"] for row in outcomes.values()) / len(trials)
+    p99_us = _percentile(lookup_us, 99)
+    ok = outcomes["exact"]["accepted"] == outcomes["exact"]["n"] and wrong <= args.max_wrong and p99_us <= args.max_p99_us
+    print(f"wrong contact: {wrong:.2%} (limit {args.max_wrong:.2%})  lookup p99: {p99_us:.0f} us (limit {args.max_p99_us:.0f} us)")
+    print("✅ PASS" if ok else "❌ FAIL")
+    return 0 if ok else 1
+
+
+# --- DIALOGUE: answers to "Should I send it?" recognized locally, before any router call ---
+_DIALOGUE_REPLIES = [ # (answer, expected match_dialogue_reply: CONFIRM, CANCEL or None for the router)
+    ("yes", "CONFIRM"), ("yes please send it now", "CONFIRM"), ("okay send it", "CONFIRM"), ("sure, go ahead", "CONFIRM"),
+    ("no", "CANCEL"), ("no, don't send it", "CANCEL"), ("nope, cancel it", "CANCEL"), ("never mind", "CANCEL"),
+    ("please cancel", "CANCEL"), ("don't send it yet", "CANCEL"), ("no thanks", "CANCEL"),
+    ("send it to bob instead", None), ("ok wait, change it", None),
+    ("yes, no problem", None), ("yes send it no worries", None), ("yes, don't wait", None), ("no, send it", None),
+    ("tell him I'll be there at no later than six", None),
+]
+
+def bench_dialogue(args):
+    from .skills import match_dialogue_reply
+
+    print(f"\n--- Dialogue replies: {len(_DIALOGUE_REPLIES)} answers to a send confirmation ---")
+    wrong = 0
+    started = time.perf_counter()
+    for answer, expected in _DIALOGUE_REPLIES:
+        got = match_dialogue_reply(answer)
+        if got != expected:
+            wrong += 1
+            print(f"❌ '{answer}': {got or 'router'}, expected {expected or 'router'}")
+    per_answer_us = (time.perf_counter() - started) / len(_DIALOGUE_REPLIES) * 1e6
+    print(f"{len(_DIALOGUE_REPLIES) - wrong}/{len(_DIALOGUE_REPLIES)} as expected, {per_answer_us:.0f} us per answer "
+          f"(None goes to the router; a wrong CONFIRM or CANCEL sends or drops the message)")
+    print("✅ PASS" if not wrong else "❌ FAIL")
+    return 0 if not wrong else 1
+
+
+# --- SPOTIFY: commands across token expiries, refreshed lazily (in the command) vs in the background ---
+def bench_spotify(args):
+    from . import spotify_api
+    from .spotify_session import SpotifySession
+    from .standins import FakeSpotifyAuth, FakeSpotifyClient
+
+    print(f"\n--- Spotify: {args.commands} commands, one every {args.every:.2f}s, token lifetime {args.token_lifetime:.1f}s, "
+          f"refresh {args.refresh_delay * 1000:.0f} ms, API call {args.latency * 1000:.0f} ms ---")
+    for mode in ("lazy", "session"):
+        auth = FakeSpotifyAuth(lifetime=args.token_lifetime, refresh_delay=args.refresh_delay)
+        client = FakeSpotifyClient(latency=args.latency, auth=auth)
+        if mode == "session":
+            client = SpotifySession(client, auth, refresh_margin_s=args.token_lifetime / 3, keepalive_s=0).start()
+        latencies = []
+        for i in range(args.commands):
+            started = time.perf_counter()
+            query = "liked songs" if i % 2 else None
+            spotify_api.api_control_playback(client, "search_and_play" if query else "next", query)
+            latencies.append(time.perf_counter() - started)
+            time.sleep(args.every)
+        if mode == "session":
+            client.stop()
+        user_calls = sum(1 for name, _ in (client.client if mode == "session" else client).calls if name == "current_user")
+        print(f"{mode:>8}: p50 {statistics.median(latencies) * 1000:.0f} ms  p99 {_percentile(latencies, 99) * 1000:.0f} ms  "
+              f"max {max(latencies) * 1000:.0f} ms  token refreshes: {auth.refreshes}  current_user calls: {user_calls}")
+    return 0
+
+
+
+# --- SERVER: concurrent sessions one box sustains at a target p95 reply latency ---
+class _LoadClient:
+    """One simulated server-mode client: wake word, a spoken command, then waits for the reply to finish playing."""
+    def __init__(self, url, name, timeout):
+        import websocket
+        self.ws = websocket.create_connection(f"{url}?name={name}", timeout=timeout)
+        self.timeout = timeout
+        self.events = {} # event ("LISTENING", "heard", "audio", "IDLE"...) -> perf_counter of its first arrival this turn
+        self.cond = threading.Condition()
+        json.loads(self.ws.recv()) # {"type": "ready", ...}
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                message = self.ws.recv()
+            except Exception:
+                return
+            now = time.perf_counter()
+            if not message: # Closed
+                return
+            if isinstance(message, bytes):
+                event = "audio"
+            else:
+                message = json.loads(message)
+                event = message["state"] if message["type"] == "state" else message["type"]
+            with self.cond:
+                self.events.setdefault(event, now)
+                self.cond.notify_all()
+
+    def _wait(self, event):
+        with self.cond:
+            return self.cond.wait_for(lambda: event in self.events, self.timeout)
+
+    def turn(self, speech_frames, silence_frame, frame_s):
+        """Returns (end of speech -> first reply audio, end of utterance heard -> first reply audio), or None on a timeout."""
+        with self.cond:
+            self.events.clear()
+        self.ws.send(json.dumps({"type": "wake"}))
+        if not self._wait("LISTENING"):
+            return None
+        started = time.perf_counter()
+        for i, frame in enumerate(speech_frames):
+            time.sleep(max(0.0, started + i * frame_s - time.perf_counter()))
+            self.ws.send_binary(frame)
+        spoken = time.perf_counter()
+        # The microphone keeps streaming (silence) until the server has heard the end of the command
+        i = 0
+        while "heard" not in self.events and time.perf_counter() - spoken < self.timeout:
+            i += 1
+            time.sleep(max(0.0, spoken + i * frame_s - time.perf_counter()))
+            self.ws.send_binary(silence_frame)
+        if not (self._wait("audio") and self._wait("IDLE")):
+            return None
+        return self.events["audio"] - spoken, self.events["audio"] - self.events["heard"]
+
+    def say(self, text):
+        """Types a command; True once its reply has finished (IDLE, or LISTENING when a dialogue asks for more)."""
+        with self.cond:
+            self.events.clear()
+        self.ws.send(json.dumps({"type": "text", "text": text}))
+        with self.cond:
+            return self.cond.wait_for(lambda: "THINKING" in self.events and
+                                      max(self.events.get("IDLE", 0), self.events.get("LISTENING", 0)) > self.events["THINKING"], self.timeout)
+
+    def close(self):
+        self.ws.close()
+
+
+def _check_dialogue_isolation(args):
+    """Two clients hold overlapping WhatsApp dialogues; each must finish its own, and only the confirmed one is sent."""
+    from . import skills, spotify_api
+    from .contacts import ContactIndex
+    from .headless import stand_in_router
+    from .server import AssistantServer
+    from .standins import FakeDesktop, FakeSpotifyClient
+
+    desktop = FakeDesktop().install(skills)
+    spotify_api.SPOTIFY_CLIENT = FakeSpotifyClient()
+    skills.contact_index = ContactIndex({"jane": "+440000000001", "bob": "+910000000002"}, aliases={})
+    script = [("message jane", "SEND_WHATSAPP", {"contact": "jane"}), ("message bob", "SEND_WHATSAPP", {"contact": "bob"})]
+    chat = FakeChatServer(answer="Stand-in answer.", router_reply=stand_in_router(script), token_delay=0.0).start()
+    server = AssistantServer(host="127.0.0.1", port=0, max_sessions=2, tts_client=FakeTTSClient(chunks_per_sentence=2, chunk_delay=0.0, sample=b"\x00\x10"),
+                             intent_classifier=NullIntentClassifier(), fireworks_url=chat.url).start()
+    dialogues = {"a": ["message jane", "running late", "yes"], "b": ["message bob", "see you soon", "no"]}
+    seen = collections.defaultdict(list) # client -> dialogue slots after each line
+    failures = []
+
+    def run_client(name, delay):
+        time.sleep(delay) # b starts while a is still in its dialogue
+        try:
+            client = _LoadClient(server.url, name, timeout=args.timeout)
+        except Exception as e:
+            failures.append(f"{name}: connect: {e}")
+            return
+        try:
+            for line in dialogues[name]:
+                if not client.say(line):
+                    failures.append(f"{name}: no reply to '{line}'")
+                    return
+                dialogue = server.sessions[name].session.dialogue
+                seen[name].append(dict(dialogue["slots"]) if dialogue["active"] else None)
+                time.sleep(0.2)
+        finally:
+            client.close()
+
+    try:
+        threads = [threading.Thread(target=run_client, args=(name, i * 0.1), daemon=True) for i, name in enumerate(dialogues)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.stop()
+        chat.stop()
+
+    for name, contact, message in (("a", "jane", "running late"), ("b", "bob", "see you soon")):
+        if failures:
+            break
+        pending = seen[name][1]
+        if not pending or pending.get("contact", "").lower() != contact or pending.get("message") != message:
+            failures.append(f"{name}: expected a pending message to {contact}, found {pending}")
+        if seen[name][2] is not None:
+            failures.append(f"{name}: dialogue still active after '{dialogues[name][2]}'")
+    if state.DEFAULT_SESSION.dialogue["active"]:
+        failures.append("the local session picked up a client's dialogue")
+    sent = desktop.actions.count(("press", "enter"))
+    if not failures and (sent != 1 or ("write", "running late") not in desktop.actions or ("write", "see you soon") not in desktop.actions):
+        failures.append(f"expected both messages typed and one sent, desktop did {desktop.actions}")
+    if failures:
+        print(f"❌ Dialogue isolation: {failures[0]}")
+        return False
+    print("✅ PASS: two clients with overlapping WhatsApp dialogues stayed isolated (one sent, one cancelled).")
+    return True
+
+
+def bench_server(args):
+    import logging
+    from .server import AssistantServer
+
+    if not args.verbose:
+        logging.getLogger("assistant").setLevel(logging.WARNING) # One line per connection and command otherwise
+    config.ANSWER_CACHE_SEMANTIC = False
+    config.ANSWER_CACHE_TTL_S = 0 # Every command reaches the stand-in LLM: load the pipeline, not the cache
+    levels = sorted(set(args.sessions))
+    services = []
+    url = args.url
+    if not url:
+        chat = FakeChatServer(answer="This is a stand-in answer. It has two sentences.", token_delay=args.token_delay).start()
+        transcriber = FakeTranscriberServer().start()
+        tts = FakeTTSClient(chunks_per_sentence=args.chunks, chunk_delay=args.chunk_delay, sample=b"\x00\x10")
+        server = AssistantServer(host="127.0.0.1", port=0, max_sessions=levels[-1], tts_client=tts,
+                                 intent_classifier=NullIntentClassifier(), fireworks_url=chat.url, transcriber_url=transcriber.url).start()
+        services = [server, transcriber, chat]
+        url = server.url
+
+    frame_s = 0.03
+    frame_bytes = int(config.SAMPLE_RATE * frame_s) * 2
+    pcm = _speech_like_pcm(args.speech)
+    speech_frames = [pcm[i:i + frame_bytes] for i in range(0, len(pcm) - frame_bytes + 1, frame_bytes)]
+    silence_frame = bytes(frame_bytes)
+    where = "in-process server, stand-in cloud" if services else url
+
+    print(f"\n--- Server mode: {args.turns} turns per session, {args.speech:.1f}s commands, target p95 {args.target_p95:.2f}s ({where}) ---")
+    print(f"{'sessions':>8} {'turns':>6} {'failed':>6} {'turn p50':>9} {'turn p95':>9} {'reply p95':>10} {'cpu':>6}")
+    sustained = 0
+    try:
+        for level in levels:
+            results, failures = [], []
+            lock = threading.Lock()
+
+            def run_client(index):
+                rng = random.Random(index)
+                time.sleep(rng.uniform(0, args.stagger)) # Clients do not all speak in lockstep
+                try:
+                    client = _LoadClient(url, f"load-{level}-{index}", timeout=args.timeout)
+                except Exception as e:
+                    with lock:
+                        failures.append(f"connect: {e}")
+                    return
+                try:
+                    for _ in range(args.turns):
+                        result = client.turn(speech_frames, silence_frame, frame_s)
+                        with lock:
+                            (results if result else failures).append(result or "timeout")
+                        time.sleep(rng.uniform(0, args.think))
+                finally:
+                    client.close()
+
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            threads = [threading.Thread(target=run_client, args=(i,), daemon=True) for i in range(level)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            cpu = (time.process_time() - cpu_started) / (time.perf_counter() - wall_started)
+            _wait_for(lambda: not services or not services[0].sessions, timeout=5) # Disconnected sessions are released
+
+            if not results:
+                print(f"{level:>8} {0:>6} {len(failures):>6}  (no completed turns: {failures[0] if failures else '-'})")
+                break
+            turn_s = [r[0] for r in results]
+            reply_s = [r[1] for r in results]
+            p95 = _percentile(turn_s, 95)
+            print(f"{level:>8} {len(results):>6} {len(failures):>6} {_percentile(turn_s, 50):>8.2f}s {p95:>8.2f}s "
+                  f"{_percentile(reply_s, 95):>9.2f}s {cpu * 100:>5.0f}%" + ("" if services else " (client side)"))
+            if failures or p95 > args.target_p95:
+                break
+            sustained = level
+    finally:
+        for service in services:
+            service.stop()
+
+    print(f"turn = end of speech to first reply audio at the client (includes the endpointer's silence window); "
+          f"reply = from the server's end of utterance")
+    isolated = args.url or _check_dialogue_isolation(args) # Needs the in-process server's sessions
+    if not sustained:
+        print(f"❌ Not even {levels[0]} session(s) within p95 {args.target_p95:.2f}s.")
+        return 1
+    more = " (the largest level tried)" if sustained == levels[-1] else ""
+    print(f"✅ Sustains {sustained} concurrent session(s) at p95 <= {args.target_p95:.2f}s{more}.")
+    return 0 if isolated else 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency benchmarks against local stand-in services.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("bargein", help="Interrupt-to-silence latency while the assistant is speaking.")
+    p.add_argument("--trials", type=int, default=20)
+    p.add_argument("--speak-for", type=float, default=0.5, help="Seconds of playback before interrupting.")
+    p.add_argument("--token-delay", type=float, default=0.02)
+    p.add_argument("--chunk-delay", type=float, default=0.02)
+    p.set_defaults(func=bench_bargein)
+
+    p = sub.add_parser("uplink", help="Capture-loop timing while the transcriber uplink stalls.")
+    p.add_argument("--duration", type=float, default=10.0)
+    p.add_argument("--send-delay", type=float, default=0.005, help="Normal WebSocket send time, seconds.")
+    p.add_argument("--stall", type=float, default=4.0, help="Length of each network stall, seconds.")
+    p.add_argument("--stall-every", type=float, default=5.0)
+    p.set_defaults(func=bench_uplink)
+
+    p = sub.add_parser("codec", help="Bytes sent and end-to-end latency per uplink codec, against a stand-in transcriber.")
+    p.add_argument("--codecs", nargs="+", default=["pcm", "flac", "opus"])
+    p.add_argument("--duration", type=float, default=6.0, help="Seconds of synthetic speech per codec.")
+    p.set_defaults(func=bench_codec)
+
+    p = sub.add_parser("wakegate", help="Idle CPU of the wake-word loop with the energy gate, over long room recordings.")
+    p.add_argument("--wav", nargs="*", help="16 kHz mono 16-bit room recordings (default: synthetic room audio).")
+    p.add_argument("--synthetic-hours", type=float, default=1.0)
+    p.add_argument("--activity", type=float, default=1.0, help="Synthetic: bursts of sound per minute, on average.")
+    p.add_argument("--porcupine", action="store_true", help="Also run Porcupine (needs PICOVOICE_ACCESS_KEY).")
+    p.set_defaults(func=bench_wakegate)
+
+    p = sub.add_parser("statemachine", help="Hammer the state machine from many threads and check its invariants.")
+    p.add_argument("--threads", type=int, default=8, help="Copies of each worker (audio, responder, speaker, rogue).")
+    p.add_argument("--duration", type=float, default=2.0)
+    p.add_argument("--jitter", type=float, default=0.0005, help="Max sleep between transitions, seconds.")
+    p.set_defaults(func=bench_statemachine)
+
+    p = sub.add_parser("playback", help="Time to first sample, gaps between sentences and stop latency of the PCM player.")
+    p.add_argument("--sentences", type=int, default=5)
+    p.add_argument("--chunks", type=int, default=20, help="TTS chunks (1024 bytes) per sentence.")
+    p.add_argument("--chunk-delay", type=float, default=0.01, help="Seconds between TTS chunks.")
+    p.add_argument("--stops", type=int, default=10)
+    p.set_defaults(func=bench_playback)
+
+    p = sub.add_parser("localtts", help="First-chunk latency and real-time factor of the local CPU voice on short replies.")
+    p.add_argument("--text", nargs="*", help="Replies to synthesize (default: typical skill replies).")
+    p.add_argument("--rounds", type=int, default=5)
+    p.set_defaults(func=bench_localtts)
+
+    p = sub.add_parser("commands", help="How long 'pause'/'stop' wait behind slow turns: FIFO vs the priority command queue.")
+    p.add_argument("--queries", type=int, default=6)
+    p.add_argument("--turn", type=float, default=1.0, help="Seconds each query takes to answer.")
+    p.add_argument("--control-at", type=float, default=0.5)
+    p.add_argument("--stop-at", type=float, default=3.5)
+    p.add_argument("--query-max-age", type=float, default=config.COMMAND_QUERY_MAX_AGE_S)
+    p.set_defaults(func=bench_commands)
+
+    p = sub.add_parser("soak", help="Thousands of turns against the stand-ins: RSS must stay flat and no end-of-turn markers pile up.")
+    p.add_argument("--turns", type=int, default=2000)
+    p.add_argument("--sentences", type=int, default=6, help="Sentences per LLM answer.")
+    p.add_argument("--sentence-queue", type=int, default=3, help="Sentence queue size (small, to exercise backpressure).")
+    p.add_argument("--warmup", type=int, default=200, help="Turns before the RSS baseline (caches and pools fill up).")
+    p.add_argument("--sample-every", type=int, default=200)
+    p.add_argument("--max-growth-mb", type=float, default=8.0)
+    p.set_defaults(func=bench_soak)
+
+    p = sub.add_parser("contacts", help="Lookup time and accuracy of the contact index on nicknames and misheard names.")
+    p.add_argument("--contacts", type=int, default=200, help="Size of the synthetic contact book.")
+    p.add_argument("--lookups", type=int, default=5000)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--max-wrong", type=float, default=0.01, help="Highest share of lookups accepted as the wrong contact.")
+    p.add_argument("--max-p99-us", type=float, default=5000, help="Highest 99th-percentile lookup time, microseconds.")
+    p.set_defaults(func=bench_contacts)
+
+    p = sub.add_parser("dialogue", help="Local confirm/cancel recognition of answers to 'Should I send it?'.")
+    p.set_defaults(func=bench_dialogue)
+
+    p = sub.add_parser("spotify", help="Spotify command latency across token expiries: refresh in the command vs in the background.")
+    p.add_argument("--commands", type=int, default=40)
+    p.add_argument("--every", type=float, default=0.1, help="Seconds between commands.")
+    p.add_argument("--token-lifetime", type=float, default=1.5, help="Access token lifetime, seconds (an hour on Spotify).")
+    p.add_argument("--refresh-delay", type=float, default=0.3, help="Token refresh round trip, seconds.")
+    p.add_argument("--latency", type=float, default=0.02, help="Each Web API call, seconds.")
+    p.set_defaults(func=bench_spotify)
+
+    p = sub.add_parser("server", help="Ramp up concurrent server-mode clients; the most sessions within a target p95 latency.")
+    p.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Concurrency levels, tried in order.")
+    p.add_argument("--target-p95", type=float, default=2.5, help="End of speech to first reply audio, seconds.")
+    p.add_argument("--turns", type=int, default=3, help="Commands each client says per level.")
+    p.add_argument("--speech", type=float, default=1.2, help="Seconds of synthetic speech per command.")
+    p.add_argument("--think", type=float, default=1.0, help="Max pause between a client's commands, seconds.")
+    p.add_argument("--stagger", type=float, default=1.0, help="Max delay before a client connects, seconds.")
+    p.add_argument("--timeout", type=float, default=20.0, help="A turn not answered within this counts as failed.")
+    p.add_argument("--token-delay", type=float, default=0.02)
+    p.add_argument("--chunks", type=int, default=20, help="Stand-in TTS chunks (1024 bytes) per sentence.")
+    p.add_argument("--chunk-delay", type=float, default=0.01)
+    p.add_argument("--url", help="Load an already running server (python -m <package>.server) instead of an in-process one.")
+    p.add_argument("--verbose", action="store_true", help="Keep the server's per-session log lines.")
+    p.set_defaults(func=bench_server)
+
+    args = parser.parse_args(argv)
+    setup_logging()
+    try:
+        return args.func(args)
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
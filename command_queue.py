@@ -0,0 +1,177 @@
+# command_queue.py (Priority command queue: cancel/stop > control > query, with expiry and de-duplication)
+import collections
+import heapq
+import itertools
+import queue
+import threading
+import time
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("commands")
+
+CANCEL, CONTROL, QUERY = 0, 1, 2
+PRIORITY_NAMES = {CANCEL: "cancel", CONTROL: "control", QUERY: "query"}
+
+# Phrases that mean "stop whatever you are doing" (after normalization)
+CANCEL_PHRASES = {"stop", "cancel", "never mind", "stop listening", "stop talking", "shut up", "be quiet", "quiet"}
+CONTROL_COMMANDS = {"CONFIRM_SEND"}
+
+
+def classify_command(command):
+    """CANCEL for stop/cancel phrases, CONTROL for basic commands (play, pause, volume...), QUERY otherwise."""
+    from .skills import match_basic_command, normalize_command # Imported here: skills imports state
+    if command in CONTROL_COMMANDS:
+        return CONTROL
+    if normalize_command(command) in CANCEL_PHRASES:
+        return CANCEL
+    basic = match_basic_command(command)
+    if basic:
+        return CANCEL if basic['intent'] == "CANCEL" else CONTROL
+    return QUERY
+
+
+def _max_age(priority):
+    return {CANCEL: config.COMMAND_CANCEL_MAX_AGE_S, CONTROL: config.COMMAND_CONTROL_MAX_AGE_S, QUERY: config.COMMAND_QUERY_MAX_AGE_S}[priority]
+
+
+class _Entry:
+    __slots__ = ("command", "key", "priority", "seq", "queued_at")
+
+    def __init__(self, command, key, priority, seq):
+        self.command = command
+        self.key = key
+        self.priority = priority
+        self.seq = seq
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CommandQueue:
+    """
+    Drop-in for the responder's queue.Queue: put()/get()/get_nowait()/qsize()/task_done().
+
+    Commands are served by class (cancel/stop, then control, then queries) and
+    first-come within a class. On put():
+      - a command already pending (same normalized text) is collapsed into the
+        pending one, which keeps its place and gets a fresh timestamp;
+      - a cancel-class command drops every pending lower-priority command and
+        calls `on_preempt()` to cancel the running turn;
+      - any other command preempts the running turn only if it outranks it
+        (e.g. "pause music" while a query is being answered).
+    get() skips commands older than their class's COMMAND_*_MAX_AGE_S.
+
+    At most `maxsize` (COMMAND_QUEUE_SIZE) commands are pending. put() never
+    blocks (it runs on the audio thread): when the queue is full, the oldest
+    command of the lowest pending class is dropped to make room, or the new
+    command is refused if every pending one outranks it.
+    """
+    def __init__(self, on_preempt=None, classify=classify_command, maxsize=None):
+        self.on_preempt = on_preempt
+        self.classify = classify
+        self.maxsize = maxsize or config.COMMAND_QUEUE_SIZE
+        self._heap = []
+        self._pending = {} # normalized text -> _Entry
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self.running = None # Priority of the command the consumer is working on, until task_done()
+        self.closed = False
+        self.counts = collections.Counter() # result -> commands (queued/collapsed/preempted/expired/overflow)
+
+    def _count(self, priority, result):
+        self.counts[result] += 1
+        metrics.COMMANDS.inc(priority=PRIORITY_NAMES[priority], result=result)
+
+    @staticmethod
+    def _key(command):
+        return " ".join(command.lower().split())
+
+    def put(self, command, priority=None):
+        priority = self.classify(command) if priority is None else priority
+        key = self._key(command)
+        with self._cond:
+            pending = self._pending.get(key)
+            if pending is not None and pending.priority == priority:
+                pending.queued_at = time.monotonic()
+                self._count(priority, "collapsed")
+                logger.debug("Collapsed duplicate command: %s", command)
+                return
+            preempt = priority == CANCEL or (self.running is not None and priority < self.running)
+            if priority == CANCEL:
+                self._drop(lambda entry: entry.priority > CANCEL, "preempted")
+            if len(self._heap) >= self.maxsize:
+                victim = max(self._heap, key=lambda entry: (entry.priority, -entry.seq))
+                if victim.priority < priority:
+                    self._count(priority, "overflow")
+                    metrics.QUEUE_OVERFLOWS.inc(queue="command_queue", policy="refuse_lowest")
+                    logger.warning("⚠️ Command queue full; refused: %s", command)
+                    return
+                self._drop(lambda entry: entry is victim, "overflow")
+                metrics.QUEUE_OVERFLOWS.inc(queue="command_queue", policy="drop_oldest_lowest")
+            entry = _Entry(command, key, priority, next(self._seq))
+            heapq.heappush(self._heap, entry)
+            self._pending[key] = entry
+            self._count(priority, "queued")
+            self._cond.notify()
+        if preempt and self.on_preempt:
+            logger.info("⏭️ '%s' (%s) preempts the running turn.", command, PRIORITY_NAMES[priority])
+            self.on_preempt()
+
+    def _drop(self, predicate, result):
+        """Removes pending entries matching `predicate`. Caller holds the lock."""
+        kept = [entry for entry in self._heap if not predicate(entry)]
+        if len(kept) == len(self._heap):
+            return
+        for entry in self._heap:
+            if predicate(entry):
+                self._pending.pop(entry.key, None)
+                self._count(entry.priority, result)
+                logger.info("Dropped %s command: %s", result, entry.command)
+        heapq.heapify(kept)
+        self._heap = kept
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._drop(lambda entry: now - entry.queued_at > _max_age(entry.priority), "expired")
+                if self._heap:
+                    entry = heapq.heappop(self._heap)
+                    self._pending.pop(entry.key, None)
+                    self.running = entry.priority
+                    metrics.COMMAND_QUEUE_WAIT.observe(now - entry.queued_at, priority=PRIORITY_NAMES[entry.priority])
+                    return entry.command
+                if not block:
+                    raise queue.Empty
+                if self.closed:
+                    return None
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._cond.wait(remaining)
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def close(self):
+        """Wakes the consumer: once the queue is empty, a blocking get() returns None (the session ended)."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def task_done(self):
+        """Called by the consumer when it has finished the command returned by get(), including any skill it waited on."""
+        with self._cond:
+            self.running = None
+
+    def qsize(self):
+        with self._cond:
+            return len(self._heap)
@@ -10,7 +10,113 @@ ELEVENLABS_API_KEY = "YOUR_ELEVENLABS_API_KEY_HERE"
 WAKE_WORD = "  "
 SAMPLE_RATE = 16000
 AUDIO_FORMAT = pyaudio.paInt16
-TEST_MODE = False 
+TEST_MODE = False # Headless: commands typed on stdin, stand-in desktop and Spotify (python -m <package>.headless for options)
+
+# --- WAKE-WORD ENERGY GATE (Skip Porcupine in a silent room; needs numpy) ---
+WAKE_GATE_ENABLED = True
+WAKE_GATE_MARGIN_DB = 8 # Louder than the tracked noise floor by this much counts as sound
+WAKE_GATE_MIN_DBFS = -65 # Quieter than this is always silence
+WAKE_GATE_LOOKBACK_MS = 640 # Skipped audio replayed into Porcupine when sound starts
+WAKE_GATE_HANGOVER_S = 2.0 # Keep processing this long after the last loud frame
+
+# --- COMMAND QUEUE (cancel/stop > control > query; stale commands are dropped) ---
+COMMAND_CANCEL_MAX_AGE_S = 3.0 # A "stop" that waited longer than this no longer refers to anything
+COMMAND_CONTROL_MAX_AGE_S = 10.0 # "pause music", "volume up"...
+COMMAND_QUERY_MAX_AGE_S = 30.0
+COMMAND_QUEUE_SIZE = 8 # Pending commands; when full, the oldest of the lowest class is dropped
+
+# --- PLAYBACK (In-process PCM output; one stream for the whole session) ---
+TTS_SAMPLE_RATE = 22050 # Requested from ElevenLabs as raw PCM (output_format pcm_22050)
+PLAYBACK_BLOCK_MS = 20 # Output callback period; also the longest a stop takes to silence audio
+PLAYBACK_PREROLL_MS = 120 # Jitter buffer filled before speech starts, and again after an underrun
+PLAYBACK_MAX_BUFFER_S = 30 # The speaker waits while more than this is queued
+TTS_SENTENCE_QUEUE_SIZE = 8 # Sentences waiting for the speaker; the responder waits (reads the LLM slower) beyond this
+TTS_SENTENCE_PUT_TIMEOUT_S = 30 # A sentence the speaker has not taken after this long is dropped (stuck speaker)
+
+# --- LOCAL TTS (CPU voice for short replies and when ElevenLabs is unreachable) ---
+LOCAL_TTS_ENGINE = "auto" # "piper", "espeak", "auto" (Piper if PIPER_MODEL_PATH is set, else espeak-ng) or "" to disable
+PIPER_MODEL_PATH = "" # e.g. en_US-lessac-medium.onnx (pip install piper-tts)
+ESPEAK_VOICE = "en-us"
+ESPEAK_WORDS_PER_MINUTE = 175
+TTS_LOCAL_MAX_CHARS = 80 # Skill replies and prompts up to this long use the local voice
+TTS_LOCAL_FIRST_SENTENCE = False # Say an answer's first sentence locally while ElevenLabs synthesizes the next
+TTS_CLOUD_RETRY_AFTER_S = 60 # After an ElevenLabs failure, use the local voice for this long
+
+# --- BARGE-IN ---
+# Target time from wake word (interrupt) to silenced playback, in milliseconds.
+BARGE_IN_TARGET_MS = 100
+
+# --- FOLLOW-UP LISTENING (Answering a dialogue prompt without the wake word) ---
+FOLLOW_UP_WINDOW_S = 8 # Time to start answering after the prompt has played; 0 to need the wake word every time
+
+# --- TRANSCRIBER FAILOVER (Offline CPU ASR) ---
+# Local Vosk model directory (e.g. vosk-model-small-en-us-0.15). Leave empty to disable.
+LOCAL_ASR_MODEL_PATH = "models/vosk-model-small-en-us-0.15"
+LOCAL_ASR_MEMORY_BUDGET_MB = 200 # Refuse to load a model larger than this
+TRANSCRIBER_CONNECT_TIMEOUT = 1.5 # seconds to wait for the cloud before switching to local
+TRANSCRIBER_MAX_LATENCY_S = 2.0 # first-transcript delay that marks the cloud as degraded
+TRANSCRIBER_RETRY_AFTER_S = 60 # how long to stay on local before trying the cloud again
+
+# --- TRANSCRIBER UPLINK (The capture loop never waits on the network) ---
+UPLINK_QUEUE_FRAMES = 100 # About 3 s of 30 ms frames; the oldest are dropped beyond this
+UPLINK_BATCH_MS = 60 # Frames are joined into WebSocket messages of about this much audio
+UPLINK_MAX_BATCH_MS = 600 # Largest message when catching up on a backlog
+UPLINK_CODECS = ("opus", "flac", "pcm") # Preference order; the first one the endpoint accepts and that loads is used
+TRANSCRIBER_ACCEPTED_CODECS = ("pcm",) # Add "flac"/"opus" only if your transcriber endpoint decodes them
+UPLINK_OPUS_BITRATE = 24000 # bits/s (needs opuslib and the system libopus); FLAC needs soundfile
+
+# --- END-OF-UTTERANCE DETECTION (Adaptive silence window) ---
+ENDPOINT_DEFAULT_S = 1.5 # Silence that ends a command until enough pauses are learned (the old fixed window)
+ENDPOINT_COMPLETE_S = 0.4 # The transcript is already a complete known command ("pause", "next song")
+ENDPOINT_CONTINUATION_S = 2.5 # The transcript ends on "and", "to", "the"...
+ENDPOINT_MIN_S = 0.7 # Bounds for the window learned from your own pauses
+ENDPOINT_MAX_S = 2.0
+ENDPOINT_PAUSE_MARGIN_S = 0.25 # Added to your 95th-percentile mid-command pause
+ENDPOINT_MIN_PAUSES = 20 # Pauses observed before the learned window is used
+ENDPOINT_STATS_PATH = "endpoint_stats.json" # Empty to keep pause statistics in memory only
+
+# --- LOCAL INTENT CLASSIFIER (Trained from logged router decisions) ---
+ROUTER_LOG_PATH = "router_decisions.jsonl"
+CLASSIFIER_MIN_CONFIDENCE = 0.6 # Below this the LLM router is used
+CLASSIFIER_MIN_EXAMPLES = 50 # Do not answer locally until this many LLM decisions are logged
+CLASSIFIER_RETRAIN_EVERY = 25 # Retrain after this many new LLM decisions
+
+# --- CONVERSATION MEMORY (GENERAL_QUERY follow-ups) ---
+CONVERSATION_TOKEN_BUDGET = 600 # Recent turns (plus summary) sent with each question
+CONVERSATION_SUMMARY_MAX_TOKENS = 120 # Rolling summary of turns that fell out of the budget
+CONVERSATION_IDLE_RESET_S = 600 # Start a fresh conversation after this much silence
+
+# --- ANSWER CACHE (Repeated GENERAL_QUERY questions) ---
+ANSWER_CACHE_MAX_ENTRIES = 500 # LRU eviction beyond this
+ANSWER_CACHE_TTL_S = 7 * 24 * 3600 # Default lifetime of a cached answer
+ANSWER_CACHE_TIME_SENSITIVE_TTL_S = 10 * 60 # Questions with "today", "now", "latest"...: kept briefly (0 disables caching them)
+ANSWER_CACHE_SEMANTIC = True # Similarity match via fastembed + hnswlib (optional packages)
+ANSWER_CACHE_EMBED_MODEL = "BAAI/bge-small-en-v1.5"
+ANSWER_CACHE_SIMILARITY = 0.92 # Cosine similarity needed to reuse an answer
+
+# --- FLIGHT RECORDER (Opt-in ring of recent turns on disk; replay with python -m <package>.replay) ---
+FLIGHT_RECORDER_ENABLED = False
+FLIGHT_RECORDER_DIR = "flight_recorder"
+FLIGHT_RECORDER_MAX_MB = 200 # Oldest segments are deleted beyond this
+FLIGHT_RECORDER_SEGMENT_MB = 8
+FLIGHT_RECORDER_QUEUE_SIZE = 2000 # Records waiting for the writer thread; more are dropped, never waited for
+
+# --- METRICS & HEALTH (Optional local HTTP endpoint) ---
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1" # Keep it local; there is no authentication
+METRICS_PORT = 9464 # /metrics (Prometheus text format) and /healthz
+
+# --- SERVER MODE (python -m <package>.server: one isolated session per WebSocket client) ---
+SERVER_HOST = "127.0.0.1" # Keep it local; there is no authentication
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 16 # More clients are refused (HTTP 503); also the size of the shared Fireworks connection pool
+
+# --- LOGGING (Queued; a background thread does all console I/O) ---
+LOG_LEVEL = "INFO" # DEBUG for routing/speaker details
+LOG_JSON = False # One JSON object per line instead of text
+LOG_QUEUE_SIZE = 10000 # Records beyond this are dropped, never blocking the caller
+LOG_STREAM_DEBUG = False # Log interim transcripts and LLM tokens (needs LOG_LEVEL = "DEBUG")
+LOG_STREAM_MAX_PER_S = 10 # Rate limit for those per-frame/per-token records
 
 # --- NEW: Maximum time to record command after wake word ---
 COMMAND_RECORDING_TIME = 8 # seconds
@@ -19,6 +125,9 @@ COMMAND_RECORDING_TIME = 8 # seconds
 # NOTE: Replace these with the model paths/names you intend to use.
 ROUTER_MODEL = "accounts/fireworks/models/YOUR_ROUTER_MODEL_NAME" # For function calling/routing
 LLM_MODEL = "accounts/fireworks/models/YOUR_MAIN_LLM_NAME" # For general instructions/chat
+ROUTER_MAX_TOKENS = 96 # Compact JSON replies; the command's own length is added on top, since slots such as a WhatsApp message copy it
+ROUTER_STRUCTURED_OUTPUT = True # Send the intent JSON schema as response_format (set False if the model rejects it)
+ROUTER_TIMEOUT_S = 4.0 # A slower router reply falls back to the offline basic commands
 FIREWORKS_URL = "https://api.fireworks.ai/....." # Base URL (usually unchanged)
 
 # --- CONTACTS ---
@@ -27,14 +136,28 @@ CONTACT_BOOK = {
     "bob": "+91XXXXXXXXXX", 
     "jane": "+44XXXXXXXXXX",
 }
+CONTACT_ALIASES = { # Extra spoken forms -> CONTACT_BOOK name (common nicknames such as "bobby" -> "bob" are built in)
+    "mum": "jane",
+}
+CONTACT_MATCH_MIN_SCORE = 0.75 # Misheard names scoring at least this (0-1) are used, and named in the confirmation
+CONTACT_MATCH_MARGIN = 0.1 # ...if they beat the next contact by this much; otherwise "Did you mean X or Y?"
+CONTACT_MAX_EDIT_DISTANCE = 2 # Letters changed for a name that does not sound alike
+CONTACT_PHONETIC_BONUS = 0.5 # Names that sound alike: their spelling similarity moves this fraction of the way to 1
 
 # --- PYAUTOGUI SETTINGS (NO CHANGES) ---
 # NOTE: These coordinates may need adjustment based on screen resolution.
 MESSAGE_BOX_X = 960 
 MESSAGE_BOX_Y = 970
 
+# --- CHROME (Websites and WhatsApp Web open in this profile) ---
+CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+CHROME_PROFILE_DIR_NAME = "Default"
+
 # --- SPOTIFY API SETTINGS (NEW) ---
 # NOTE: Replace the placeholders with your full, correct credentials from Spotify Developer Dashboard.
 SPOTIFY_CLIENT_ID = "YOUR_SPOTIFY_CLIENT_ID" 
 SPOTIFY_CLIENT_SECRET = "YOUR_SPOTIFY_CLIENT_SECRET" 
 SPOTIFY_REDIRECT_URI = "http://..."# This must match your Spotify Developer settings
+SPOTIFY_REFRESH_MARGIN_S = 300 # Refresh the access token in the background this long before it expires
+SPOTIFY_REFRESH_RETRY_S = 30 # ...and retry this often if Spotify does not answer
+SPOTIFY_KEEPALIVE_S = 45 # A cheap API call this often keeps the connection warm; 0 to disable
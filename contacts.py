@@ -0,0 +1,233 @@
+# contacts.py (Contact index for WhatsApp targeting: exact names, nicknames, phonetic keys and edit distance)
+from collections import defaultdict, namedtuple
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("contacts")
+
+try:
+    from metaphone import doublemetaphone # pip install metaphone
+except ImportError:
+    doublemetaphone = None
+
+ContactMatch = namedtuple("ContactMatch", "name number score reason")
+
+# Each group is one given name and its common forms; a contact saved under any of them answers to all.
+# A form belongs to one group only: "jon" is Jonathan, not John, or every "jon" would be ambiguous.
+NICKNAME_GROUPS = [
+    {"robert", "bob", "bobby", "rob", "robbie", "bert"},
+    {"william", "will", "bill", "billy", "willy", "liam"},
+    {"richard", "rick", "ricky", "rich", "dick"},
+    {"james", "jim", "jimmy", "jamie"},
+    {"john", "johnny", "jack"},
+    {"jonathan", "jon", "jonny"},
+    {"michael", "mike", "mikey", "mick"},
+    {"thomas", "tom", "tommy"},
+    {"joseph", "joe", "joey"},
+    {"daniel", "dan", "danny"},
+    {"david", "dave", "davey"},
+    {"christopher", "chris", "kit"},
+    {"matthew", "matt", "matty"},
+    {"anthony", "tony"},
+    {"nicholas", "nick", "nicky"},
+    {"alexander", "alex", "alec", "sandy"},
+    {"benjamin", "ben", "benny"},
+    {"samuel", "sam", "sammy"},
+    {"edward", "ed", "eddie", "ted", "teddy"},
+    {"steven", "stephen", "steve", "stevie"},
+    {"andrew", "andy", "drew"},
+    {"peter", "pete"},
+    {"jennifer", "jen", "jenny"},
+    {"elizabeth", "liz", "lizzie", "beth", "betty", "eliza"},
+    {"katherine", "catherine", "kate", "katie", "kathy", "cathy", "kat"},
+    {"margaret", "maggie", "meg", "peggy"},
+    {"rebecca", "becky", "becca"},
+    {"jessica", "jess", "jessie"},
+    {"patricia", "pat", "patty", "trish"},
+    {"susan", "sue", "susie"},
+    {"victoria", "vicky", "tori"},
+    {"alexandra", "sasha", "lexi"},
+    {"samantha", "sammie"},
+    {"deborah", "debbie", "deb"},
+    {"jane", "janey"},
+]
+
+PARTIAL_NAME_WEIGHT = 0.9 # Score factor for matching one word of a longer saved name
+
+_SOUNDEX_CODES = {letter: digit for digit, letters in {"1": "bfpv", "2": "cgjkqsxz", "3": "dt", "4": "l", "5": "mn", "6": "r"}.items()
+                  for letter in letters}
+
+
+def normalize_name(text):
+    cleaned = "".join(c for c in (text or "").lower() if c.isalpha() or c.isspace())
+    return " ".join(cleaned.split())
+
+
+def soundex(word):
+    """American Soundex: the first letter and three digits ("jayne" -> "J500")."""
+    letters = [c for c in word.lower() if c.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for letter in letters[1:]:
+        digit = _SOUNDEX_CODES.get(letter, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in "hw": # A vowel separates equal codes; h and w do not
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def phonetic_keys(name):
+    """Word-by-word Soundex, plus the primary and alternate Double Metaphone codes when the metaphone package is installed."""
+    words = name.split()
+    keys = {"S:" + " ".join(soundex(w) for w in words)}
+    if doublemetaphone is not None:
+        codes = [doublemetaphone(w) for w in words]
+        keys.add("M:" + " ".join(c[0] for c in codes))
+        keys.add("M:" + " ".join(c[1] or c[0] for c in codes))
+    return keys
+
+
+def _deletions(word, depth):
+    """`word` and every string made by deleting up to `depth` of its letters."""
+    found = {word}
+    edge = {word}
+    for _ in range(depth):
+        edge = {w[:i] + w[i + 1:] for w in edge for i in range(len(w))} - found
+        found |= edge
+    return found
+
+
+def edit_distance(a, b):
+    """Levenshtein distance with adjacent transpositions (optimal string alignment)."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            cost = ca != cb
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class ContactIndex:
+    """
+    Ranks CONTACT_BOOK entries against a spoken (possibly misheard) name.
+
+    Built once from the contact book and CONTACT_ALIASES: exact names and
+    nicknames are dict lookups; phonetic keys (Soundex, and Double Metaphone
+    when installed) map to the contacts that share them; and every form with up
+    to CONTACT_MAX_EDIT_DISTANCE letters deleted maps to the forms it came from,
+    so names a few typos away are found without scanning the book. Only those
+    candidates get a full edit distance, which keeps a lookup in the
+    microseconds.
+
+    Scores: 1.0 for the saved name, 0.95 for a nickname or alias, otherwise the
+    edit-distance similarity, moved CONTACT_PHONETIC_BONUS of the way towards
+    1 when the names sound alike; a match on one word of a longer name counts
+    PARTIAL_NAME_WEIGHT as much. resolve() accepts the best match when it
+    reaches CONTACT_MATCH_MIN_SCORE and beats the runner-up by
+    CONTACT_MATCH_MARGIN.
+    """
+    def __init__(self, contacts=None, aliases=None):
+        contacts = config.CONTACT_BOOK if contacts is None else contacts
+        aliases = config.CONTACT_ALIASES if aliases is None else aliases
+        self.numbers = {normalize_name(name): number for name, number in contacts.items()}
+        self.aliases = defaultdict(set) # spoken form -> contact names
+        self.phonetic = defaultdict(set) # phonetic key -> (contact name, form)
+        self.deletes = defaultdict(set) # form with letters deleted -> (contact name, form)
+        self.forms = defaultdict(dict) # contact name -> {form it answers to: weight}
+        self.max_distance = config.CONTACT_MAX_EDIT_DISTANCE
+
+        nicknames = {form: group for group in NICKNAME_GROUPS for form in group}
+        for name in self.numbers:
+            given, _, surname = name.partition(" ")
+            forms = self.forms[name]
+            forms[name] = 1.0
+            for form in nicknames.get(given, ()):
+                forms.setdefault(f"{form} {surname}".strip(), 1.0)
+            if surname:
+                # "Jane Doe" also answers to "Jane", "Doe" and "Janey", a little below a contact saved as just "Jane"
+                for form in {given, *name.split()[1:], *nicknames.get(given, ())}:
+                    forms.setdefault(form, PARTIAL_NAME_WEIGHT)
+        for alias, name in aliases.items():
+            name = normalize_name(name)
+            if name in self.numbers:
+                self.forms[name][normalize_name(alias)] = 1.0
+            else:
+                logger.warning("⚠️ CONTACT_ALIASES: '%s' points to '%s', which is not in CONTACT_BOOK.", alias, name)
+        for name, forms in self.forms.items():
+            for form in forms:
+                if form != name:
+                    self.aliases[form].add(name)
+                for key in phonetic_keys(form):
+                    self.phonetic[key].add((name, form))
+                for deleted in _deletions(form, self.max_distance):
+                    self.deletes[deleted].add((name, form))
+
+    def match(self, spoken, limit=3):
+        """Returns up to `limit` ContactMatch, best first."""
+        spoken = normalize_name(spoken)
+        if not spoken:
+            return []
+        if spoken in self.numbers:
+            return [ContactMatch(spoken, self.numbers[spoken], 1.0, "exact")]
+
+        scores = {}
+        for name in self.aliases.get(spoken, ()):
+            scores[name] = (0.95 * self.forms[name][spoken], "alias")
+        if len(scores) == 1:
+            name, (score, reason) = next(iter(scores.items()))
+            return [ContactMatch(name, self.numbers[name], round(score, 3), reason)]
+
+        sounds_like = set()
+        for key in phonetic_keys(spoken):
+            sounds_like |= self.phonetic.get(key, set())
+        nearby = set()
+        for deleted in _deletions(spoken, self.max_distance):
+            nearby |= self.deletes.get(deleted, set())
+        for name, form in sounds_like | nearby:
+            if scores.get(name, (0.0, ""))[1] == "alias":
+                continue
+            distance = edit_distance(spoken, form)
+            similarity = 1.0 - distance / max(len(spoken), len(form))
+            if (name, form) in sounds_like:
+                score, reason = min(0.94, similarity + config.CONTACT_PHONETIC_BONUS * (1.0 - similarity)), "phonetic"
+            elif distance <= self.max_distance and similarity > 0:
+                score, reason = similarity, "fuzzy"
+            else:
+                continue
+            score *= self.forms[name][form]
+            if score > scores.get(name, (0.0, ""))[0]:
+                scores[name] = (score, reason)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [ContactMatch(name, self.numbers[name], round(score, 3), reason) for name, (score, reason) in ranked]
+
+    def resolve(self, spoken):
+        """
+        Returns (match, candidates). `match` is the accepted ContactMatch or None;
+        `candidates` are the close matches to offer when the name is ambiguous.
+        """
+        ranked = self.match(spoken)
+        best = ranked[0] if ranked else None
+        runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+        if best and best.score >= config.CONTACT_MATCH_MIN_SCORE and best.score - runner_up >= config.CONTACT_MATCH_MARGIN:
+            metrics.CONTACT_LOOKUPS.inc(result=best.reason)
+            if best.reason != "exact":
+                logger.info("📇 Contact '%s' -> %s (%s, %.2f)", spoken, best.name, best.reason, best.score)
+            return best, []
+        candidates = [m for m in ranked if m.score >= config.CONTACT_MATCH_MIN_SCORE - config.CONTACT_MATCH_MARGIN]
+        metrics.CONTACT_LOOKUPS.inc(result="ambiguous" if candidates else "none")
+        return None, candidates
+
+
+contact_index = ContactIndex()
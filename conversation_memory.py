@@ -0,0 +1,102 @@
+# conversation_memory.py (Token-budgeted GENERAL_QUERY history with a rolling summary)
+import threading
+import time
+
+from . import config
+from .log import get_logger
+
+logger = get_logger("memory")
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token) - no tokenizer dependency."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class ConversationMemory:
+    """
+    Keeps the most recent GENERAL_QUERY turns within CONVERSATION_TOKEN_BUDGET.
+    Turns that fall out of the budget are folded into a rolling summary by a
+    background thread (off the critical path), so the request payload stays
+    roughly the same size however long the session runs.
+
+    `summarize(previous_summary, turns)` is supplied by the responder and must
+    return the new summary text; it runs on the summarizer thread only.
+    """
+    def __init__(self, summarize, token_budget=None, summary_max_tokens=None, idle_reset_s=None):
+        self.summarize = summarize
+        self.token_budget = token_budget or config.CONVERSATION_TOKEN_BUDGET
+        self.summary_max_tokens = summary_max_tokens or config.CONVERSATION_SUMMARY_MAX_TOKENS
+        self.idle_reset_s = idle_reset_s or config.CONVERSATION_IDLE_RESET_S
+
+        self.lock = threading.Lock()
+        self.turns = [] # [(user, assistant)] newest last
+        self.summary = ""
+        self.evicted = [] # Turns waiting to be folded into the summary
+        self.last_turn_time = 0.0
+        self.summarizing = False
+        self.generation = 0 # Bumped on reset so a late summary cannot resurrect an old session
+
+    def _turn_tokens(self, turn):
+        return estimate_tokens(turn[0]) + estimate_tokens(turn[1])
+
+    def _reset_locked(self):
+        self.turns, self.evicted, self.summary = [], [], ""
+        self.generation += 1
+
+    def reset(self):
+        with self.lock:
+            self._reset_locked()
+
+    def build_messages(self, query):
+        """Chat messages for the next request: summary, recent turns, then the new query."""
+        with self.lock:
+            if self.last_turn_time and time.time() - self.last_turn_time > self.idle_reset_s:
+                self._reset_locked()
+            messages = []
+            if self.summary:
+                messages.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+            for user_text, assistant_text in self.turns:
+                messages.append({"role": "user", "content": user_text})
+                messages.append({"role": "assistant", "content": assistant_text})
+        messages.append({"role": "user", "content": query})
+        return messages
+
+    def add_turn(self, user_text, assistant_text):
+        if not assistant_text:
+            return
+        with self.lock:
+            self.turns.append((user_text, assistant_text))
+            self.last_turn_time = time.time()
+
+            used = sum(self._turn_tokens(t) for t in self.turns)
+            budget = self.token_budget - min(estimate_tokens(self.summary), self.summary_max_tokens)
+            while len(self.turns) > 1 and used > budget:
+                oldest = self.turns.pop(0)
+                used -= self._turn_tokens(oldest)
+                self.evicted.append(oldest)
+
+            start_summary = self.evicted and not self.summarizing
+            if start_summary:
+                self.summarizing = True
+        if start_summary:
+            threading.Thread(target=self._summarize_evicted, daemon=True).start()
+
+    def _summarize_evicted(self):
+        while True:
+            with self.lock:
+                if not self.evicted:
+                    self.summarizing = False
+                    return
+                turns, self.evicted = self.evicted, []
+                previous = self.summary
+                generation = self.generation
+            try:
+                summary = self.summarize(previous, turns)
+            except Exception as e:
+                logger.warning("⚠️ Conversation summary failed, keeping the previous one: %s", e)
+                summary = previous
+            with self.lock:
+                if generation == self.generation:
+                    # Hard cap in case the model ignores max_tokens
+                    self.summary = (summary or "")[:self.summary_max_tokens * 4]
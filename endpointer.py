@@ -0,0 +1,118 @@
+# endpointer.py (Adaptive end-of-utterance detection)
+import json
+import os
+import threading
+from collections import deque
+
+from . import config
+from . import metrics
+from .log import get_logger
+from .skills import BASIC_COMMANDS, normalize_command, strip_command_prefix
+
+logger = get_logger("endpointer")
+
+# A command that ends on one of these is probably not finished yet
+CONTINUATION_WORDS = {"and", "or", "but", "then", "to", "the", "a", "an", "of", "for", "with", "on", "in", "at",
+                      "my", "your", "is", "are", "by", "from", "about", "because", "so", "that", "um", "uh"}
+PAUSE_HISTORY = 200
+MIN_PAUSE_S = 0.15 # Shorter silences are VAD flicker, not pauses
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class AdaptiveEndpointer:
+    """
+    Decides how much trailing silence ends a command, from the interim transcript:
+
+      complete   - already a known command ("pause music", "next song", "yes") that no
+                   longer one starts with: ENDPOINT_COMPLETE_S. "play" and "next"
+                   are not complete: "play music", "next song" may still follow,
+                   and so may a song name
+      continue   - ends on "and", "to", "the"...: ENDPOINT_CONTINUATION_S
+      learned    - otherwise, the user's 95th-percentile mid-command pause plus a
+                   margin, once ENDPOINT_MIN_PAUSES pauses have been observed
+      default    - ENDPOINT_DEFAULT_S until then
+
+    Pause statistics persist in ENDPOINT_STATS_PATH. Every decision is compared
+    with the fixed ENDPOINT_DEFAULT_S window it replaces, and the difference is
+    exported as end-of-speech latency saved (or added).
+    """
+    def __init__(self, complete_phrases=(), stats_path=None):
+        self.complete_phrases = {normalize_command(p) for p in complete_phrases} | set(BASIC_COMMANDS)
+        # Every leading run of words of a longer known command ("play" of "play music")
+        self.prefixes = {" ".join(words[:n]) for words in map(str.split, self.complete_phrases) for n in range(1, len(words))}
+        self.stats_path = config.ENDPOINT_STATS_PATH if stats_path is None else stats_path
+        self.pauses = deque(maxlen=PAUSE_HISTORY)
+        self.saved_s = 0.0
+        self.utterances = 0
+        self._learned = None
+        self._cache = (None, None) # (transcript, (window, reason)): the same interim is checked every frame
+        self._save_lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, encoding="utf-8") as f:
+                self.pauses.extend(float(p) for p in json.load(f).get("pauses", []))
+            self._learned = self._learned_window()
+            logger.debug("Loaded %d pauses from %s.", len(self.pauses), self.stats_path)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️ Could not read endpoint stats %s: %s", self.stats_path, e)
+
+    def _save(self, pauses):
+        with self._save_lock:
+            try:
+                with open(self.stats_path, "w", encoding="utf-8") as f:
+                    json.dump({"pauses": pauses}, f)
+            except OSError as e:
+                logger.warning("⚠️ Could not save endpoint stats: %s", e)
+
+    def _learned_window(self):
+        if len(self.pauses) < config.ENDPOINT_MIN_PAUSES:
+            return None
+        window = _percentile(self.pauses, 95) + config.ENDPOINT_PAUSE_MARGIN_S
+        return min(config.ENDPOINT_MAX_S, max(config.ENDPOINT_MIN_S, window))
+
+    def observe_pause(self, seconds):
+        """A silence inside a command (speech resumed after it)."""
+        if seconds >= MIN_PAUSE_S:
+            self.pauses.append(round(seconds, 3))
+            self._learned = self._learned_window()
+            self._cache = (None, None)
+
+    def window(self, transcript):
+        """Returns (silence_seconds, reason) for the current interim transcript."""
+        if transcript == self._cache[0]:
+            return self._cache[1]
+        normalized = normalize_command(transcript)
+        words = normalized.split()
+        command = strip_command_prefix(normalized)
+        if words and command in self.complete_phrases and command not in self.prefixes:
+            decision = (config.ENDPOINT_COMPLETE_S, "complete")
+        elif words and words[-1] in CONTINUATION_WORDS:
+            decision = (config.ENDPOINT_CONTINUATION_S, "continue")
+        elif self._learned is not None:
+            decision = (self._learned, "learned")
+        else:
+            decision = (config.ENDPOINT_DEFAULT_S, "default")
+        self._cache = (transcript, decision)
+        return decision
+
+    def end_utterance(self, silence_s, reason):
+        """Records the decision that ended a command. Stats are saved off the audio thread."""
+        saved = config.ENDPOINT_DEFAULT_S - silence_s
+        self.saved_s += saved
+        self.utterances += 1
+        metrics.ENDPOINT_SILENCE.observe(silence_s, reason=reason)
+        if saved > 0:
+            metrics.ENDPOINT_SAVED.inc(saved)
+        elif saved < 0:
+            metrics.ENDPOINT_ADDED.inc(-saved)
+        logger.debug("End of speech after %.2fs of silence (%s, %+.2fs vs fixed window).", silence_s, reason, saved)
+        if self.stats_path:
+            threading.Thread(target=self._save, args=(list(self.pauses),), daemon=True).start()
@@ -0,0 +1,224 @@
+# flight_recorder.py (Opt-in on-disk ring of recent turns: captured audio, transcripts and timings, for replay.py)
+import io
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+from . import config
+from . import metrics
+from . import state
+from .log import get_logger
+
+logger = get_logger("recorder")
+
+# Record types
+EVENT, AUDIO_PCM, AUDIO_FLAC = 0, 1, 2
+# type, turn id, wall-clock time, payload length; then the payload (JSON, raw PCM or a FLAC stream)
+HEADER = struct.Struct("<BQdI")
+SEGMENT_PREFIX = "flight-"
+SEGMENT_SUFFIX = ".rec"
+AUDIO_FLUSH_BYTES = 512 * 1024 # Captured audio is written in pieces of about 16 s (compressed, if possible)
+AUDIO_BOUNDARIES = {"turn_start", "end_of_utterance"} # Events that flush the turn's audio first
+
+
+class FlightRecorder:
+    """
+    Keeps the last FLIGHT_RECORDER_MAX_MB of turns on disk, in segment files of
+    FLIGHT_RECORDER_SEGMENT_MB. The oldest segment is deleted once the ring is
+    full. Per turn it stores the microphone audio captured while listening
+    (FLAC when soundfile is installed, otherwise raw PCM) and timestamped
+    events: transcripts, end of utterance, router input and output, skill
+    calls and results, LLM token timing, and TTS timing.
+
+    Callers only put records on a bounded queue. A writer thread encodes and
+    writes them, and records are dropped (and counted) rather than blocking
+    the audio loop. Every event is labelled with the caller's session (server
+    mode records many at once), and belongs to that session's most recently
+    started turn unless a turn id is passed. When FLIGHT_RECORDER_ENABLED is
+    off, every call returns immediately.
+    """
+    def __init__(self, directory=None, enabled=None):
+        self.directory = directory or config.FLIGHT_RECORDER_DIR
+        self.enabled = config.FLIGHT_RECORDER_ENABLED if enabled is None else enabled
+        self.max_bytes = int(config.FLIGHT_RECORDER_MAX_MB * 1024 * 1024)
+        self.segment_bytes = int(config.FLIGHT_RECORDER_SEGMENT_MB * 1024 * 1024)
+        self.turn = 0 # Most recently started turn of any session
+        self._turns = {} # session name -> its current turn
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=config.FLIGHT_RECORDER_QUEUE_SIZE)
+        self._writer = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._audio = {} # turn -> [first frame time, bytearray]
+        self._flac = None
+
+    def start(self, directory=None):
+        """Enables recording (into `directory`, if given) from now on."""
+        with self._lock:
+            if directory:
+                self.directory = directory
+            self.enabled = True
+        return self
+
+    # --- Recording API (any thread; never blocks) ---
+    def begin_turn(self, **fields):
+        if not self.enabled:
+            return None
+        with self._lock:
+            # Milliseconds since the epoch: sortable across restarts, and bumped so sessions starting together differ
+            self.turn = max(time.time_ns() // 1_000_000, self.turn + 1)
+            turn = self._turns[state.current_session().name] = self.turn
+        self.event("turn_start", turn=turn, **fields)
+        return turn
+
+    def event(self, kind, turn=None, **fields):
+        if self.enabled:
+            session = state.current_session().name
+            fields["kind"] = kind
+            fields["session"] = session
+            self._put((EVENT, turn or self._turns.get(session, 0), time.time(), fields))
+
+    def audio(self, pcm, turn=None):
+        if self.enabled:
+            self._put((AUDIO_PCM, turn or self._turns.get(state.current_session().name, 0), time.time(), pcm))
+
+    def flush(self, timeout=5.0):
+        """Waits until everything recorded so far is on disk (audio included)."""
+        if not self.enabled:
+            return True
+        done = threading.Event()
+        self._put(None, done)
+        return done.wait(timeout)
+
+    def _put(self, record, done=None):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="flight-recorder", daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait((record, done))
+        except queue.Full:
+            self.dropped += 1
+            metrics.RECORDER_RECORDS.inc(result="dropped")
+
+    # --- Writer thread ---
+    def _run(self):
+        while True:
+            record, done = self._queue.get()
+            try:
+                if record is None:
+                    for turn in list(self._audio):
+                        self._flush_audio(turn)
+                    if self._file:
+                        self._file.flush()
+                elif record[0] == AUDIO_PCM:
+                    _, turn, t, pcm = record
+                    pending = self._audio.setdefault(turn, [t, bytearray()])
+                    pending[1] += pcm
+                    if len(pending[1]) >= AUDIO_FLUSH_BYTES:
+                        self._flush_audio(turn)
+                else:
+                    _, turn, t, fields = record
+                    if fields["kind"] in AUDIO_BOUNDARIES:
+                        for pending_turn in list(self._audio):
+                            self._flush_audio(pending_turn)
+                    self._write(EVENT, turn, t, json.dumps(fields, default=str, separators=(",", ":")).encode("utf-8"))
+            except Exception as e:
+                logger.warning("⚠️ Flight recorder write failed: %s", e)
+            finally:
+                if done:
+                    done.set()
+
+    def _flush_audio(self, turn):
+        t, pcm = self._audio.pop(turn)
+        if not pcm:
+            return
+        kind, payload = AUDIO_PCM, bytes(pcm)
+        encoded = self._encode_flac(payload)
+        if encoded is not None:
+            kind, payload = AUDIO_FLAC, encoded
+        self._write(kind, turn, t, payload)
+
+    def _encode_flac(self, pcm):
+        if self._flac is None:
+            try:
+                from .uplink_codecs import FlacEncoder
+                self._flac = FlacEncoder()
+            except (ImportError, OSError):
+                self._flac = False # Raw PCM from now on
+        return self._flac.encode(pcm)[0] if self._flac else None
+
+    def _write(self, kind, turn, t, payload):
+        if self._file is None or self._file.tell() >= self.segment_bytes or os.path.dirname(self._file.name) != self.directory:
+            self._roll()
+        self._file.write(HEADER.pack(kind, turn, t, len(payload)))
+        self._file.write(payload)
+        metrics.RECORDER_RECORDS.inc(result="written")
+        metrics.RECORDER_BYTES.inc(HEADER.size + len(payload))
+
+    def _roll(self):
+        """Starts a new segment and deletes the oldest ones beyond FLIGHT_RECORDER_MAX_MB."""
+        if self._file:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{time.time_ns() // 1000:020d}{SEGMENT_SUFFIX}")
+        self._file = open(path, "ab", buffering=64 * 1024)
+        segments = list_segments(self.directory)
+        total = sum(os.path.getsize(p) for p in segments)
+        for oldest in segments[:-1]:
+            if total <= self.max_bytes:
+                break
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+            logger.debug("Flight recorder ring full; deleted %s.", oldest)
+
+
+recorder = FlightRecorder()
+
+
+# --- READING (replay.py) ---
+def list_segments(directory):
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(n for n in os.listdir(directory) if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(directory, n) for n in names]
+
+
+def read_records(directory):
+    """Yields (type, turn, time, payload) oldest first; payload is a dict for events, PCM bytes for audio."""
+    for path in list_segments(directory):
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break # End of segment (or a write cut short by a crash)
+                kind, turn, t, length = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    break
+                if kind == EVENT:
+                    yield kind, turn, t, json.loads(payload)
+                elif kind == AUDIO_FLAC:
+                    import soundfile
+                    samples, _ = soundfile.read(io.BytesIO(payload), dtype="int16")
+                    yield AUDIO_PCM, turn, t, samples.tobytes()
+                else:
+                    yield kind, turn, t, payload
+
+
+def load_turns(directory):
+    """{turn id: {"events": [event dicts with "t"], "audio": PCM, "audio_started": time}} for every turn on disk."""
+    turns = {}
+    for kind, turn, t, payload in read_records(directory):
+        entry = turns.setdefault(turn, {"events": [], "audio": bytearray(), "audio_started": None})
+        if kind == EVENT:
+            entry["events"].append(dict(payload, t=t))
+        else:
+            if entry["audio_started"] is None:
+                entry["audio_started"] = t
+            entry["audio"] += payload
+    return turns
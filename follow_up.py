@@ -0,0 +1,74 @@
+# follow_up.py (Follow-up listening: the answer to a dialogue prompt needs no wake word)
+import threading
+import time
+from collections import Counter
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("follow_up")
+
+
+class FollowUpWindow:
+    """
+    After a dialogue prompt ("Who should I send that message to?", "Should I
+    send it?") the assistant keeps listening for FOLLOW_UP_WINDOW_S instead of
+    going back to waiting for the wake word.
+
+    The responder arm()s the window for the turn that asks the question. While
+    the prompt plays, the audio loop connects a transcriber session in the
+    background; when the turn's last sentence has played, the speaker open()s
+    the window and hands over to LISTENING instead of IDLE. If no speech starts
+    before the window expires, the audio loop closes it and the dialogue waits
+    for the wake word as before. Barge-in closes it too.
+
+    0 disables the window: every dialogue answer starts with the wake word.
+    """
+    def __init__(self, window_s=None):
+        self.window_s = config.FOLLOW_UP_WINDOW_S if window_s is None else window_s
+        self._lock = threading.Lock()
+        self._turn = None
+        self.deadline = None # monotonic; set while the window is open
+        self.counts = Counter() # result -> windows (answered/timeout/interrupted)
+
+    def arm(self, turn):
+        """The responder: `turn` ends on a question. Returns False when follow-up listening is disabled."""
+        if self.window_s <= 0:
+            return False
+        with self._lock:
+            self._turn = turn
+            self.deadline = None
+        return True
+
+    def armed(self):
+        return self._turn is not None
+
+    def open(self, turn):
+        """The speaker: `turn` has finished playing. Returns True if the audio loop should listen for the answer."""
+        with self._lock:
+            if self._turn is None or self._turn is not turn or turn.is_cancelled():
+                return False
+            self.deadline = time.monotonic() + self.window_s
+        logger.info("👂 Listening for your answer for %ss (no wake word needed)...", self.window_s)
+        return True
+
+    def is_open(self):
+        return self.deadline is not None
+
+    def expired(self):
+        deadline = self.deadline
+        return deadline is not None and time.monotonic() >= deadline
+
+    def close(self, result, turn=None):
+        """
+        Ends the window (armed or open) with `result`: answered, timeout or
+        interrupted. No-op when not armed, or armed for a turn other than `turn`.
+        """
+        with self._lock:
+            if self._turn is None or (turn is not None and self._turn is not turn):
+                return
+            self._turn = None
+            self.deadline = None
+        self.counts[result] += 1
+        metrics.FOLLOW_UPS.inc(result=result)
@@ -0,0 +1,274 @@
+# headless.py (Text-only batch mode: typed commands through the router, dialogue logic and skills, no audio)
+# Run as a module from the parent directory, e.g.:  python -m <package>.headless commands.tsv --sessions 8
+#                                                   echo "pause music" | python -m <package>.headless --stand-in-router
+#
+# One command per line: text [TAB expected intent [TAB slots as JSON, for --stand-in-router]].
+# Blank lines and lines starting with '#' are skipped. Every session runs the whole script in order,
+# so multi-turn dialogues ("message Bob" -> "what should it say?" -> ...) play out within a session.
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from . import config
+from .standins import FakeChatServer
+
+COMMAND_TIMEOUT_S = 60 # Longer than any skill timeout or LLM answer
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def read_script(lines):
+    """[(command, expected intent or None, stand-in router slots or None)]"""
+    script = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        fields = [field.strip() for field in line.split("\t")]
+        expected = fields[1] if len(fields) > 1 and fields[1] else None
+        slots = json.loads(fields[2]) if len(fields) > 2 and fields[2] else None
+        script.append((fields[0], expected, slots))
+    return script
+
+
+def stand_in_router(script):
+    """Router replies for the stand-in chat server: each command's expected intent and slots (GENERAL_QUERY otherwise)."""
+    from .skills import normalize_command
+    decisions = {normalize_command(command): {"intent": expected, "slots": slots or {}}
+                 for command, expected, slots in script if expected}
+    return lambda query: decisions.get(normalize_command(query), {"intent": "GENERAL_QUERY", "slots": {}})
+
+
+# --- ONE SESSION (its own process: the dialogue state is per process) ---
+class _RoutingSource:
+    """Wraps the responder's intent classifier to tell whether the last command was routed locally."""
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.local = False
+
+    def classify(self, text):
+        decision = self.classifier.classify(text)
+        self.local = decision is not None
+        return decision
+
+    def record(self, *args, **kwargs):
+        self.classifier.record(*args, **kwargs)
+
+
+def _run_command(responder, command, expected):
+    """Queues one command and collects the reply up to its end of turn, the way the speaker would."""
+    from . import state
+    from .sentence_queue import EndOfTurn
+    from .skill_registry import SkillContext
+    from .skills import match_dialogue_reply
+
+    # A follow-up answer ("Bob", "tell him I'm late") is handled by the active dialogue without routing
+    dialogue = state.DIALOGUE_CONTEXT['intent'] if state.DIALOGUE_CONTEXT['active'] else None
+    if dialogue and state.DIALOGUE_CONTEXT['slots'].get('awaiting_confirmation'):
+        dialogue = match_dialogue_reply(command) or dialogue # "yes"/"cancel" are recognized locally, not routed
+    # Spoken, this command would be heard in the follow-up window of the previous prompt: no wake word
+    follow_up = state.follow_up.armed()
+    state.follow_up.close("answered")
+    responder.routed.clear()
+    started = time.perf_counter()
+    state.command_queue.put(command)
+    reply = []
+    ended = False
+    while not ended:
+        try:
+            item = state.tts_sentence_queue.get(timeout=COMMAND_TIMEOUT_S)
+        except queue.Empty:
+            break
+        if isinstance(item, EndOfTurn):
+            ended = True
+        elif isinstance(item, SkillContext):
+            skill_reply = item.wait() # A skill's reply, in turn order
+            if skill_reply:
+                reply.append(skill_reply)
+        else:
+            reply.append(item)
+    seconds = time.perf_counter() - started
+    state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.SPEAKING, state.AssistantState.THINKING}, reason="headless end of turn")
+
+    routed = responder.routed[-1] if responder.routed else None
+    return {
+        "command": command,
+        "expected": expected,
+        "intent": routed[0].get("intent") if routed else dialogue,
+        "router_s": routed[1] if routed else None,
+        "router_source": ("local" if routed[2] else "llm") if routed else None,
+        "seconds": seconds,
+        "ended": ended,
+        "follow_up": follow_up,
+        "reply": " ".join(reply),
+    }
+
+
+def run_session(session, script, url, repeat, local_router, verbose):
+    """Runs the script `repeat` times against stand-in desktop and Spotify backends. Returns the session's results."""
+    from . import main, skills, spotify_api, state
+    from .intent_classifier import IntentClassifier
+    from .log import setup_logging, shutdown_logging
+    from .standins import FakeDesktop, FakeSpotifyClient, NullIntentClassifier
+
+    class HeadlessResponder(main.FireworksResponder):
+        def __init__(self):
+            super().__init__()
+            self.routed = [] # (decision, seconds, routed locally) for the current command
+
+        def _get_intent(self, query):
+            started = time.perf_counter()
+            decision = super()._get_intent(query)
+            self.routed.append((decision, time.perf_counter() - started, self.intent_classifier.local))
+            return decision
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    log_dir = tempfile.mkdtemp(prefix="headless-")
+    with output:
+        setup_logging(level=None if verbose else "ERROR")
+        try:
+            desktop = FakeDesktop().install(skills)
+            spotify = spotify_api.SPOTIFY_CLIENT = FakeSpotifyClient()
+            state.LISTENING_INTERFACE['stop_transcriber'] = lambda: None # No transcriber ("go to sleep")
+
+            responder = HeadlessResponder()
+            if url:
+                responder.url = url
+            if local_router:
+                # The local classifier trains on a copy of the decision log; this run's decisions stay out of the real one
+                log_path = os.path.join(log_dir, "router_decisions.jsonl")
+                if os.path.exists(config.ROUTER_LOG_PATH):
+                    shutil.copyfile(config.ROUTER_LOG_PATH, log_path)
+                classifier = IntentClassifier(log_path=log_path)
+                while classifier.training.is_set():
+                    time.sleep(0.01)
+            else:
+                classifier = NullIntentClassifier()
+            responder.intent_classifier = _RoutingSource(classifier)
+            responder.start()
+
+            results = []
+            started = time.time()
+            for _ in range(repeat):
+                state.end_dialogue()
+                state.follow_up.close("interrupted")
+                for command, expected, _ in script:
+                    results.append(_run_command(responder, command, expected))
+            finished = time.time()
+        finally:
+            shutdown_logging()
+            shutil.rmtree(log_dir, ignore_errors=True)
+    return {"session": session, "started": started, "finished": finished, "results": results,
+            "desktop_actions": len(desktop.actions), "spotify_calls": len(spotify.calls)}
+
+
+# --- REPORT ---
+def _latency_line(label, values):
+    if not values:
+        return f"{label}: -"
+    return (f"{label} (n={len(values)}): p50 {_percentile(values, 50) * 1000:.0f} ms  p90 {_percentile(values, 90) * 1000:.0f} ms  "
+            f"p99 {_percentile(values, 99) * 1000:.0f} ms  max {max(values) * 1000:.0f} ms")
+
+
+def report(sessions, script, args):
+    """Prints throughput, latencies and per-intent accuracy. Returns the overall accuracy (None without expectations)."""
+    results = [r for s in sessions for r in s["results"]]
+    elapsed = max(s["finished"] for s in sessions) - min(s["started"] for s in sessions)
+    router = "stand-in router" if args.stand_in_router else "Fireworks router"
+    print(f"\n--- Headless: {len(sessions)} session(s) x {len(script)} command(s) x {args.repeat}, {router} ---")
+    print(f"commands: {len(results)} in {elapsed:.1f}s -> {len(results) / elapsed:.1f} commands/s  "
+          f"(desktop actions: {sum(s['desktop_actions'] for s in sessions)}, Spotify calls: {sum(s['spotify_calls'] for s in sessions)})")
+    print(_latency_line("turn latency", [r["seconds"] for r in results]))
+    for source in ("llm", "local"):
+        print(_latency_line(f"router latency, {source}", [r["router_s"] for r in results if r["router_source"] == source]))
+    print(f"handled by an active dialogue without routing: {sum(1 for r in results if r['router_source'] is None)}  "
+          f"turns without an end of turn: {sum(1 for r in results if not r['ended'])}")
+    follow_ups = sum(1 for r in results if r["follow_up"])
+    print(f"wake words needed: {len(results) - follow_ups} for {len(results)} commands "
+          f"({follow_ups} answered in a follow-up window, FOLLOW_UP_WINDOW_S = {config.FOLLOW_UP_WINDOW_S})")
+
+    scored = [r for r in results if r["expected"]]
+    if not scored:
+        return None
+    by_intent = defaultdict(list)
+    for r in scored:
+        by_intent[r["expected"]].append(r)
+    print(f"\n{'expected intent':<20} {'n':>6} {'correct':>8} {'accuracy':>9}  most common mistake")
+    for intent in sorted(by_intent):
+        rows = by_intent[intent]
+        correct = sum(1 for r in rows if r["intent"] == intent)
+        mistakes = Counter(r["intent"] or "(none)" for r in rows if r["intent"] != intent)
+        mistake = ", ".join(f"{name} x{count}" for name, count in mistakes.most_common(1))
+        print(f"{intent:<20} {len(rows):>6} {correct:>8} {correct / len(rows):>8.1%}  {mistake}")
+    correct = sum(1 for r in scored if r["intent"] == r["expected"])
+    print(f"{'overall':<20} {len(scored):>6} {correct:>8} {correct / len(scored):>8.1%}")
+    if args.verbose:
+        for r in scored:
+            if r["intent"] != r["expected"]:
+                print(f"  expected {r['expected']}, got {r['intent']}: {r['command']}")
+    return correct / len(scored)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run typed commands through the router, dialogue logic and skills, without audio.")
+    parser.add_argument("script", nargs="?", default="-", help="Command file, or - for stdin (default).")
+    parser.add_argument("--sessions", type=int, default=1, help="Independent sessions run concurrently, one process each.")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each session runs the script.")
+    parser.add_argument("--stand-in-router", action="store_true",
+                        help="Route with a local stand-in that answers each command's expected intent and slots (no Fireworks key).")
+    parser.add_argument("--router-delay", type=float, default=0.3, help="Stand-in router latency, seconds.")
+    parser.add_argument("--no-local-router", action="store_true", help="Skip the local intent classifier; every command goes to the router.")
+    parser.add_argument("--min-accuracy", type=float, help="Exit with status 1 if the intent accuracy is below this (0-1).")
+    parser.add_argument("--verbose", action="store_true", help="Show the sessions' logs, skill output and every wrong intent.")
+    args = parser.parse_args(argv)
+
+    if args.script == "-":
+        script = read_script(sys.stdin)
+    else:
+        with open(args.script, encoding="utf-8") as f:
+            script = read_script(f)
+    if not script:
+        print("[Headless] No commands to run.")
+        return 1
+
+    server = url = None
+    if args.stand_in_router:
+        server = FakeChatServer(answer="This is a stand-in answer. It has two sentences.", router_reply=stand_in_router(script),
+                                router_delay=args.router_delay, token_delay=0.01).start()
+        url = server.url
+    elif not config.FIREWORKS_API_KEY or config.FIREWORKS_API_KEY.startswith("YOUR_"):
+        print("[Headless] Set FIREWORKS_API_KEY in config.py, or use --stand-in-router.")
+        return 1
+
+    try:
+        # Fresh interpreters (spawn) on every platform: each session starts with its own dialogue state
+        with ProcessPoolExecutor(max_workers=args.sessions, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(run_session, i, script, url, args.repeat, not args.no_local_router, args.verbose)
+                       for i in range(args.sessions)]
+            sessions = [future.result() for future in futures]
+    finally:
+        if server:
+            server.stop()
+
+    accuracy = report(sessions, script, args)
+    if args.min_accuracy is not None and accuracy is not None and accuracy < args.min_accuracy:
+        print(f"❌ Intent accuracy {accuracy:.1%} is below {args.min_accuracy:.1%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
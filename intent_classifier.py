@@ -0,0 +1,288 @@
+# intent_classifier.py (Local intent classifier trained from logged router decisions)
+# Evaluate offline with:  python -m <package>.intent_classifier evaluate
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from . import config
+from .log import get_logger
+
+logger = get_logger("classifier")
+
+# Slots whose value is copied from the user's words. A decision that needs one of
+# these (other than "query") cannot be answered from a label alone.
+FREE_TEXT_SLOTS = {"contact", "message", "query", "target", "search_query"}
+# Intents whose only free slot is the transcript itself
+QUERY_INTENTS = {"GENERAL_QUERY", "CONFIRM", "CANCEL"}
+
+
+# --- LABELS: intent + fixed slots ---
+def decision_to_label(intent_data):
+    """
+    Maps a router decision to a class label such as "SPOTIFY_CONTROL|action=pause".
+    Returns None for decisions that carry free text (a contact name, a search
+    query, a numeric value) which the classifier could not reproduce.
+    """
+    intent = intent_data.get("intent")
+    slots = intent_data.get("slots") or {}
+    if not intent:
+        return None
+    if intent in QUERY_INTENTS:
+        return intent
+
+    parts = []
+    for key in sorted(slots):
+        value = slots[key]
+        if value in (None, "", "None"):
+            continue
+        if key in FREE_TEXT_SLOTS or str(value).strip().isdigit():
+            return None
+        parts.append(f"{key}={value}")
+    return "|".join([intent] + parts)
+
+def label_to_decision(label, text):
+    intent, *parts = label.split("|")
+    if intent in QUERY_INTENTS:
+        return {"intent": intent, "slots": {"query": text}}
+    slots = dict(part.split("=", 1) for part in parts)
+    if intent == "SYSTEM_CONTROL":
+        slots.setdefault("value", None)
+    return {"intent": intent, "slots": slots}
+
+
+# --- FEATURES: character n-grams ---
+def _char_ngrams(text, sizes=(2, 3, 4)):
+    normalized = " " + " ".join(text.lower().split()) + " "
+    grams = Counter()
+    for n in sizes:
+        for i in range(len(normalized) - n + 1):
+            grams[normalized[i:i + n]] += 1
+    return grams
+
+
+class LocalIntentClassifier:
+    """
+    TF-IDF weighted character n-grams with a cosine k-nearest-neighbour vote.
+    Pure Python with an inverted index, so prediction over a few thousand
+    logged turns takes well under a millisecond.
+    """
+    def __init__(self, k=5):
+        self.k = k
+        self.idf = {}
+        self.labels = []
+        self.index = defaultdict(list) # ngram -> [(example_id, weight)]
+
+    def _vectorize(self, text):
+        grams = _char_ngrams(text)
+        vector = {g: (1 + math.log(c)) * self.idf[g] for g, c in grams.items() if g in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {g: w / norm for g, w in vector.items()}
+
+    def train(self, examples):
+        """examples: iterable of (text, label)."""
+        examples = list(examples)
+        doc_freq = Counter()
+        for text, _ in examples:
+            doc_freq.update(set(_char_ngrams(text)))
+        total = len(examples) or 1
+        self.idf = {g: math.log((1 + total) / (1 + df)) + 1 for g, df in doc_freq.items()}
+
+        self.labels = []
+        self.index = defaultdict(list)
+        for example_id, (text, label) in enumerate(examples):
+            self.labels.append(label)
+            for gram, weight in self._vectorize(text).items():
+                self.index[gram].append((example_id, weight))
+        return self
+
+    def predict(self, text):
+        """Returns (label, confidence) or (None, 0.0). Confidence is the similarity-weighted vote share."""
+        if not self.labels:
+            return None, 0.0
+        scores = defaultdict(float)
+        for gram, weight in self._vectorize(text).items():
+            for example_id, other in self.index.get(gram, ()):
+                scores[example_id] += weight * other
+        if not scores:
+            return None, 0.0
+
+        neighbours = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:self.k]
+        votes = defaultdict(float)
+        for example_id, similarity in neighbours:
+            votes[self.labels[example_id]] += similarity
+        label, weight = max(votes.items(), key=lambda item: item[1])
+        # Scale by the best similarity so a unanimous vote of distant neighbours is still unsure
+        confidence = (weight / sum(votes.values())) * neighbours[0][1]
+        return label, confidence
+
+
+# --- DECISION LOG ---
+def read_decision_log(path=None):
+    path = path or config.ROUTER_LOG_PATH
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+def training_examples(records):
+    """(text, label) pairs from LLM decisions only, so local answers never train the model."""
+    for record in records:
+        if record.get("source") != "llm":
+            continue
+        label = decision_to_label(record.get("decision", {}))
+        if label:
+            yield record["text"], label
+
+
+class IntentClassifier:
+    """
+    Logs every router decision and answers locally when the classifier is
+    confident. Retrains in the background after CLASSIFIER_RETRAIN_EVERY new
+    LLM decisions.
+    """
+    def __init__(self, log_path=None):
+        self.log_path = log_path or config.ROUTER_LOG_PATH
+        self.model = None
+        self.log_lock = threading.Lock()
+        self.pending = 0
+        self.training = threading.Event()
+        self._retrain_async()
+
+    def classify(self, text):
+        """Returns a router decision dict when confident, else None (use the LLM)."""
+        model = self.model
+        if model is None:
+            return None
+        started = time.perf_counter()
+        label, confidence = model.predict(text)
+        if label is None or confidence < config.CLASSIFIER_MIN_CONFIDENCE:
+            return None
+        decision = label_to_decision(label, text)
+        self.record(text, decision, source="local", latency_ms=(time.perf_counter() - started) * 1000, confidence=confidence)
+        return decision
+
+    def record(self, text, decision, source, latency_ms, **extra):
+        entry = {"ts": time.time(), "text": text, "decision": decision, "source": source, "latency_ms": round(latency_ms, 2)}
+        entry.update(extra)
+        try:
+            with self.log_lock:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning("⚠️ Could not write router log: %s", e)
+            return
+
+        if source == "llm":
+            with self.log_lock: # Server mode: every session records into this one classifier
+                self.pending += 1
+                if self.pending >= config.CLASSIFIER_RETRAIN_EVERY:
+                    self._retrain_async()
+
+    def _retrain_async(self):
+        """Starts a retrain unless one is running. Called with log_lock held, or from __init__."""
+        if self.training.is_set():
+            return
+        self.training.set()
+        self.pending = 0
+        threading.Thread(target=self._retrain, daemon=True).start()
+
+    def _retrain(self):
+        try:
+            examples = list(training_examples(read_decision_log(self.log_path)))
+            if len(examples) >= config.CLASSIFIER_MIN_EXAMPLES:
+                self.model = LocalIntentClassifier().train(examples)
+                logger.info("Local intent classifier trained on %d router decisions.", len(examples))
+        except Exception as e:
+            logger.warning("⚠️ Local intent classifier training failed: %s", e)
+        finally:
+            self.training.clear()
+
+
+# --- OFFLINE EVALUATION ---
+def summarize_router_calls(records):
+    """Average LLM router latency and token counts per schema version (logged as "legacy" before versioning)."""
+    groups = defaultdict(list)
+    for record in records:
+        if record.get("source") == "llm":
+            groups[record.get("schema", "legacy")].append(record)
+    for schema, calls in sorted(groups.items()):
+        def mean(key):
+            values = [c[key] for c in calls if c.get(key) is not None]
+            return sum(values) / len(values) if values else float("nan")
+        print(f"router schema {schema}: {len(calls)} calls, {mean('latency_ms'):.0f} ms, "
+              f"prompt {mean('prompt_tokens'):.0f} tok, output {mean('output_tokens'):.0f} tok")
+
+def evaluate(log_path=None, holdout=0.2, threshold=None):
+    """
+    Trains on the oldest (1 - holdout) of the LLM decisions and replays the rest.
+    Reports agreement with the LLM router and the latency saved per turn.
+    """
+    threshold = config.CLASSIFIER_MIN_CONFIDENCE if threshold is None else threshold
+    records = [r for r in read_decision_log(log_path) if r.get("source") == "llm"]
+    if len(records) < 10:
+        print(f"Not enough LLM router decisions to evaluate ({len(records)} logged).")
+        return None
+
+    split = int(len(records) * (1 - holdout))
+    model = LocalIntentClassifier().train(training_examples(records[:split]))
+    test = records[split:]
+
+    answered = agreed = intent_agreed = 0
+    local_ms = []
+    for record in test:
+        started = time.perf_counter()
+        label, confidence = model.predict(record["text"])
+        local_ms.append((time.perf_counter() - started) * 1000)
+        if label is None or confidence < threshold:
+            continue
+        answered += 1
+        expected = record["decision"]
+        predicted = label_to_decision(label, record["text"])
+        if predicted["intent"] == expected.get("intent"):
+            intent_agreed += 1
+            if label == decision_to_label(expected):
+                agreed += 1
+
+    llm_ms = sum(r.get("latency_ms", 0) for r in test) / len(test)
+    mean_local_ms = sum(local_ms) / len(local_ms)
+    coverage = answered / len(test)
+    saved_ms = coverage * (llm_ms - mean_local_ms)
+
+    print("--- Local intent classifier vs LLM router ---")
+    print(f"train: {split}  test: {len(test)}  threshold: {threshold}")
+    print(f"answered locally: {answered}/{len(test)} ({coverage:.0%})")
+    if answered:
+        print(f"agreement (intent): {intent_agreed / answered:.1%}   agreement (intent+slots): {agreed / answered:.1%}")
+    print(f"router latency: LLM {llm_ms:.0f} ms  local {mean_local_ms:.2f} ms")
+    print(f"latency saved per turn (average): {saved_ms:.0f} ms")
+    summarize_router_calls(records)
+    return {"coverage": coverage, "agreement": agreed / answered if answered else 0.0, "saved_ms": saved_ms}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local intent classifier tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("evaluate", help="Report agreement with the LLM router and latency saved.")
+    p.add_argument("--log", default=None, help="Router decision log (default: config.ROUTER_LOG_PATH).")
+    p.add_argument("--holdout", type=float, default=0.2)
+    p.add_argument("--threshold", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "evaluate":
+        evaluate(args.log, args.holdout, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
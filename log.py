@@ -0,0 +1,112 @@
+# log.py (Queue-based structured logging: callers never touch stdout)
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from . import config
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+_listener = None
+_setup_lock = threading.Lock()
+dropped_records = 0
+
+
+def get_logger(name):
+    return logging.getLogger(f"assistant.{name}")
+
+
+# --- FORMATTING (Runs on the writer thread) ---
+class StructuredFormatter(logging.Formatter):
+    """Text ("12:00:01.123 INFO audio: msg key=value") or one JSON object per line."""
+    def __init__(self, as_json=False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = {k: v for k, v in vars(record).items() if k not in _STANDARD_ATTRS}
+        message = record.getMessage()
+        if self.as_json:
+            entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                     "thread": record.threadName, "msg": message}
+            entry.update(fields)
+            return json.dumps(entry, default=str, ensure_ascii=False)
+        clock = time.strftime("%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}"
+        name = record.name.split(".", 1)[-1]
+        extra = "".join(f" {k}={v}" for k, v in fields.items())
+        return f"{clock} {record.levelname:<5} {name}: {message}{extra}"
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues the record without formatting it and never blocks: when the
+    writer falls behind, records are dropped and counted instead of stalling
+    the audio or streaming thread.
+    """
+    def prepare(self, record):
+        return record # Formatting happens on the writer thread
+
+    def enqueue(self, record):
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+def setup_logging(level=None, as_json=None):
+    """Routes every "assistant.*" logger through a bounded queue to a background writer. Idempotent."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = level or config.LOG_LEVEL
+        as_json = config.LOG_JSON if as_json is None else as_json
+
+        record_queue = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+        writer = logging.StreamHandler(sys.stdout)
+        writer.setFormatter(StructuredFormatter(as_json=as_json))
+        _listener = logging.handlers.QueueListener(record_queue, writer, respect_handler_level=False)
+        _listener.start()
+
+        root = logging.getLogger("assistant")
+        root.setLevel(level)
+        root.handlers[:] = [_DroppingQueueHandler(record_queue)]
+        root.propagate = False
+
+def shutdown_logging():
+    """Flushes pending records. Call once on exit."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+# --- RATE-LIMITED DEBUG STREAMS (Interim transcripts, LLM tokens) ---
+class StreamDebugLog:
+    """
+    Debug output for per-frame/per-token events. Off unless LOG_STREAM_DEBUG is
+    set and the logger is at DEBUG; then at most `max_per_second` records are
+    emitted and the rest are skipped. When off, a call is one boolean check.
+    """
+    def __init__(self, logger, max_per_second=None):
+        self.logger = logger
+        self.interval = 1.0 / (max_per_second or config.LOG_STREAM_MAX_PER_S)
+        self.next_allowed = 0.0
+
+    @property
+    def enabled(self):
+        return config.LOG_STREAM_DEBUG and self.logger.isEnabledFor(logging.DEBUG)
+
+    def __call__(self, msg, **fields):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if now < self.next_allowed:
+            return
+        self.next_allowed = now + self.interval
+        self.logger.debug(msg, extra=fields)
@@ -1,40 +1,76 @@
+import time
+_PROCESS_STARTED = time.perf_counter() # Startup-to-listening clock; taken before the imports below
+
 import threading
+from collections import deque
 import queue
-import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 import json
 import requests
-import websocket
 import pvporcupine
 import pyaudio
-from elevenlabs.client import ElevenLabs
-from elevenlabs import stream
 import sys
-import subprocess
-import shutil
-import webbrowser 
-import pyautogui 
+import logging
 import winsound
-import spotipy 
 import webrtcvad # <-- NEW IMPORT
 
 # --- Import configuration and state from local files ---
 from . import config
 from . import state
-from .skills import (
-    ROUTER_PROMPT, 
-    handle_whatsapp_action, 
-    handle_system_action, 
-    handle_spotify_fallback, 
-    handle_launch_target_action,
-    handle_browser_navigation
-)
+from . import skills
+from .skills import match_basic_command, match_dialogue_reply, SKILLS
 from .config import CONTACT_BOOK 
 from . import spotify_api 
+from . import metrics
+from .log import get_logger, setup_logging, shutdown_logging, StreamDebugLog
+from .startup import StartupOrchestrator
+from .flight_recorder import recorder
+from .transcribers import TranscriberFailover
+from .endpointer import AdaptiveEndpointer
+from .wake_gate import WakeWordGate
+from .playback import PcmPlayer
+from .sentence_queue import EndOfTurn
+from .skill_registry import SkillContext
+from .tts_engines import ElevenLabsTTS, PcmResampler, Reply, TTSRouter, TTSStream, create_elevenlabs_client, create_local_tts
+from .intent_classifier import IntentClassifier
+from .conversation_memory import ConversationMemory, estimate_tokens
+from .answer_cache import AnswerCache, is_context_dependent
+from .router_protocol import ROUTER_PROMPT, ROUTER_RESPONSE_FORMAT, ROUTER_SCHEMA_VERSION, RouterParseError, parse_router_reply
+
+logger = get_logger("main")
+
+
+# --- BARGE-IN (Wake word during a turn) ---
+def barge_in(speaker):
+    """
+    Cancels the running turn: closes the LLM/TTS streams registered on the turn's
+    token, drops pending sentences and kills playback.
+    Returns the interrupt-to-silence latency in milliseconds.
+    """
+    started = time.perf_counter()
+    state.interruption_event.set()
+    state.CURRENT_TURN.cancel()
+    state.tts_sentence_queue.drop_sentences()
+    speaker.stop_playback()
+    state.follow_up.close("interrupted")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.BARGE_IN_LATENCY.observe(elapsed_ms / 1000)
+
+    level = logging.INFO if elapsed_ms <= config.BARGE_IN_TARGET_MS else logging.WARNING
+    logger.log(level, "Barge-in: silence after %.1f ms (target %d ms)", elapsed_ms, config.BARGE_IN_TARGET_MS)
+    return elapsed_ms
 
 
 # --- AUDIO HANDLER (MODIFIED) ---
 class AudioHandler(threading.Thread):
+    CANCEL_COMMANDS = {"stop listening", "never mind", "cancel"}
+    CONFIRM_COMMANDS = {"yes", "send it", "confirm", "go ahead", "yep"}
+    VAD_AGGRESSIVENESS = 3 # Most aggressive filtering
+    # FRAME_DURATION_MS must be 10, 20, or 30 for WebRTC VAD.
+    # We will process audio in smaller VAD frames but read in larger Porcupine chunks.
+    VAD_FRAME_DURATION_MS = 30
+
     def __init__(self, porcupine, speaker):
         super().__init__(daemon=True)
         self.porcupine = porcupine
@@ -51,66 +87,71 @@ class AudioHandler(threading.Thread):
         )
         
         # --- VAD Settings ---
-        self.vad = webrtcvad.Vad(3) # Aggressiveness 3 (most aggressive filtering)
-        # FRAME_DURATION_MS must be 10, 20, or 30 for WebRTC VAD.
-        # We will process audio in smaller VAD frames but read in larger Porcupine chunks.
-        self.VAD_FRAME_DURATION_MS = 30
+        self.vad = webrtcvad.Vad(self.VAD_AGGRESSIVENESS)
         self.VAD_FRAME_SIZE = int(config.SAMPLE_RATE * self.VAD_FRAME_DURATION_MS / 1000)
         self.MIN_VOICE_FRAMES = 1 # Minimum number of voice frames to send
-        self.MAX_SILENCE_FRAMES = int(1000 / self.VAD_FRAME_DURATION_MS) * 1.5 # 1 second of silence detection
+        self.MAX_SILENCE_FRAMES = int(1000 / self.VAD_FRAME_DURATION_MS) * 1.5 # Silence frames still streamed to the transcriber
         # --------------------
         
-        self.ws = None
-        self.ws_thread = None
-        self.ws_connected = threading.Event()
-        self.CANCEL_COMMANDS = {"stop listening", "never mind", "cancel"}
-        self.CONFIRM_COMMANDS = {"yes", "send it", "confirm", "go ahead", "yep"}
+        self.transcriber = None
+        self.failover = TranscriberFailover(on_text=self._on_transcript)
+        self._connector = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcriber-connect")
+        self._preopened = None # Future of a session connected while a dialogue prompt plays
+        self.first_speech_time = None
+        self.interim_log = StreamDebugLog(logger)
         self.last_transcript_time = None
         self.transcript_buffer = ""
         self.pause_threshold = 2.0 # Increased for better distance listening
+        self.wake_gate = WakeWordGate(self.porcupine.frame_length)
+        self.listening = threading.Event() # Set once the capture loop runs (startup metric)
+        self.endpointer = AdaptiveEndpointer(complete_phrases=self.CANCEL_COMMANDS | self.CONFIRM_COMMANDS)
+        self._overflow_check = None # (monotonic time, frames buffered) after the previous read
 
         state.LISTENING_INTERFACE['stream'] = self.stream
         state.LISTENING_INTERFACE['start_transcriber'] = self._start_transcriber_session
         state.LISTENING_INTERFACE['stop_transcriber'] = self._stop_transcriber_session
-        state.LISTENING_INTERFACE['ws_connected_event'] = self.ws_connected
 
     def _start_transcriber_session(self):
-        print("\nConnecting to transcriber...")
-        self.ws_connected.clear()
-        url = (f"wss://audio-streaming-v2.api.fireworks.ai/v1/audio/transcriptions/streaming"
-               f"?authorization=Bearer {config.FIREWORKS_API_KEY}&language=en")
-        self.ws = websocket.WebSocketApp(url, on_message=self._on_message, on_open=self._on_open, on_error=self._on_error, on_close=self._on_close)
-        self.ws_thread = threading.Thread(target=self.ws.run_forever, daemon=True)
-        self.ws_thread.start()
+        """Opens a cloud session, or the local engine if the cloud is down. Returns True when ready."""
+        self.first_speech_time = None
+        pending, self._preopened = self._preopened, None
+        self.transcriber = pending.result() if pending else self.failover.open_session()
+        return self.transcriber is not None
+
+    def _preopen_transcriber_session(self):
+        """Connects the next session in the background, so the follow-up answer does not wait for the handshake."""
+        if self._preopened is None and self.transcriber is None:
+            self._preopened = self._connector.submit(self.failover.open_session)
+
+    def _discard_preopened_session(self):
+        pending, self._preopened = self._preopened, None
+        if pending:
+            pending.add_done_callback(self._stop_discarded_session)
+
+    @staticmethod
+    def _stop_discarded_session(future):
+        # A session that failed to open has nothing to stop (and result() would raise again)
+        if future.exception() is None and future.result():
+            future.result().stop()
 
     def _stop_transcriber_session(self):
-        if self.ws:
-            print("[Transcriber] Closing connection.")
-            try:
-                self.ws.close()
-            except Exception as e:
-                print(f"[Transcriber] Error closing websocket: {e}")
-            self.ws = None
-            self.ws_thread = None
-
-    def _on_open(self, ws):
-        print("...now listening for your command...")
-        self.ws_connected.set()
-
-    def _on_error(self, ws, error):
-        print(f"[Transcriber Error] {error}")
-        self.ws_connected.set() 
-
-    def _on_close(self, ws, status, msg):
-        print("[Transcriber] Connection closed.")
-
-    def _on_message(self, ws, message):
-        response = json.loads(message)
-        transcript = response.get("text", "")
-        if transcript:
-            self.transcript_buffer = transcript
-            self.last_transcript_time = time.time()
-            print(f"🎤 Interim: {self.transcript_buffer}\r", end="", flush=True)
+        if self.transcriber:
+            self.transcriber.stop()
+            self.transcriber = None
+
+    def _send_frame(self, frame):
+        if self.transcriber:
+            if self.first_speech_time is None:
+                self.first_speech_time = time.time()
+            self.transcriber.send(frame)
+
+    def _on_transcript(self, transcript):
+        if self.first_speech_time and self.last_transcript_time is None and self.transcriber:
+            self.failover.report_latency(self.transcriber, time.time() - self.first_speech_time)
+        self.transcript_buffer = transcript
+        self.last_transcript_time = time.time()
+        recorder.event("transcript", text=transcript)
+        self.interim_log("🎤 Interim transcript", transcript=transcript)
             
     def _play_wake_sound(self):
         """Plays the wake word confirmation sound."""
@@ -123,36 +164,71 @@ class AudioHandler(threading.Thread):
             winsound.PlaySound(wake_file_path, flags)
             
         except RuntimeError as e:
-            print(f"⚠️ Wake sound failed: {e}")
+            logger.warning("⚠️ Wake sound failed: %s", e)
         except Exception as e:
-            print(f"⚠️ Wake sound error: {e}")
+            logger.warning("⚠️ Wake sound error: %s", e)
             pass
 
+    def _count_overflows(self):
+        """
+        Counts an overflow when PortAudio dropped samples since the previous
+        read. The device produced SAMPLE_RATE samples per second of wall time;
+        whatever was neither read (one frame) nor is still buffered was lost.
+        Checked read to read, so the drift between the sound card's clock and
+        ours never adds up.
+        """
+        now = time.monotonic()
+        try:
+            buffered = self.stream.get_read_available()
+        except OSError:
+            self._overflow_check = None
+            return
+        if self._overflow_check is not None:
+            then, buffered_before = self._overflow_check
+            produced = (now - then) * config.SAMPLE_RATE
+            dropped = produced - (self.porcupine.frame_length + buffered - buffered_before)
+            # Audio arrives in host-buffer blocks, so allow a couple of frames of timing jitter
+            if dropped > 2 * self.porcupine.frame_length:
+                metrics.AUDIO_OVERFLOWS.inc()
+                logger.debug("Microphone overflow: about %d samples dropped.", dropped)
+        self._overflow_check = (now, buffered)
+
     def run(self):
-        global STATE
-        print(f"🎤 Live Mode: Ready and listening. Say '{config.WAKE_WORD.capitalize()}' to begin.")
+        logger.info("🎤 Live Mode: Ready and listening. Say '%s' to begin.", config.WAKE_WORD.capitalize())
         
         # --- VAD Buffer State Variables ---
         silence_frame_count = 0
         voice_frame_count = 0
         vad_buffer = bytes()
+        self.listening.set()
         
         while True:
             try:
+                # An overflow must not cost the frame too: it is counted from the clock instead (_count_overflows)
                 pcm = self.stream.read(self.porcupine.frame_length, exception_on_overflow=False)
+                self._count_overflows()
                 
-                with state.state_lock:
-                    current_state = state.STATE
+                current_state = state.state_machine.current # Lock-free read
 
                 if current_state in [state.AssistantState.IDLE, state.AssistantState.SPEAKING]:
+                    # A dialogue prompt is playing: connect the transcriber for the answer now
+                    if state.follow_up.armed():
+                        self._preopen_transcriber_session()
+                    elif self._preopened:
+                        self._discard_preopened_session()
+                    
                     # --- WAKE WORD DETECTION PHASE ---
-                    pcm_unpacked = memoryview(pcm).cast('h')
-                    if self.porcupine.process(pcm_unpacked) >= 0:
-                        print("\n🚨 WAKE WORD DETECTED! 🚨")
+                    # The energy gate skips Porcupine in a silent room and replays its look-back when sound starts
+                    detected = False
+                    for frame in self.wake_gate.admit(pcm):
+                        if self.porcupine.process(memoryview(frame).cast('h')) >= 0:
+                            detected = True
+                            break
+                    if detected:
+                        logger.info("🚨 WAKE WORD DETECTED! 🚨")
                         self._play_wake_sound()
                         
-                        state.interruption_event.set()
-                        self.speaker.stop_playback() 
+                        barge_in(self.speaker)
                         time.sleep(0.1) 
                         
                         self.transcript_buffer = ""
@@ -160,26 +236,48 @@ class AudioHandler(threading.Thread):
                         
                         state.interruption_event.clear()
 
-                        self._start_transcriber_session()
-                        
-                        print("Waiting for connection...")
-                        is_ready = self.ws_connected.wait(timeout=5)
+                        self.wake_gate.reset()
+                        recorder.begin_turn(pauses=list(self.endpointer.pauses))
+                        is_ready = self._start_transcriber_session()
                         
-                        if is_ready:
-                            with state.state_lock:
-                                state.STATE = state.AssistantState.LISTENING
+                        if is_ready and not state.state_machine.transition(state.AssistantState.LISTENING, expected={state.AssistantState.IDLE, state.AssistantState.SPEAKING}, reason="wake word"):
+                            # Another worker moved on (e.g. a queued command started THINKING) while we connected
+                            self._stop_transcriber_session()
+                        elif is_ready:
                             # Reset VAD state for the new command
                             silence_frame_count = 0
                             voice_frame_count = 0
                             vad_buffer = bytes()
                         else:
-                            print("[FATAL] Could not connect to transcriber. Returning to idle.")
+                            logger.error("No transcriber available (cloud unreachable, no local model). Returning to idle.")
                             self._stop_transcriber_session()
-                            with state.state_lock:
-                                state.STATE = state.AssistantState.IDLE
+                            state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.SPEAKING}, reason="no transcriber")
                     
                 elif current_state == state.AssistantState.LISTENING:
                     
+                    # --- FOLLOW-UP: the speaker handed over after a dialogue prompt; listen without the wake word ---
+                    if self.transcriber is None and state.follow_up.is_open():
+                        self.transcript_buffer = ""
+                        self.last_transcript_time = None
+                        recorder.begin_turn(pauses=list(self.endpointer.pauses))
+                        if not self._start_transcriber_session():
+                            logger.error("No transcriber available for the follow-up. Say WAKE WORD to continue.")
+                            state.follow_up.close("timeout")
+                            state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.LISTENING}, reason="no transcriber")
+                            continue
+                        silence_frame_count = 0
+                        voice_frame_count = 0
+                        vad_buffer = bytes()
+                        continue # This chunk was captured while connecting; the answer starts with the next one
+                    
+                    if voice_frame_count == 0 and state.follow_up.expired():
+                        self._stop_transcriber_session()
+                        state.follow_up.close("timeout")
+                        recorder.event("end_of_utterance", text="", reason="follow-up timeout")
+                        logger.info("👂 No answer. Say WAKE WORD to continue.")
+                        state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.LISTENING}, reason="follow-up timeout")
+                        continue
+                    
                     # --- VAD & STREAMING PHASE ---
                     
                     # Add current pcm chunk to the VAD buffer
@@ -189,40 +287,47 @@ class AudioHandler(threading.Thread):
                     while len(vad_buffer) >= self.VAD_FRAME_SIZE * 2: # *2 because paInt16 is 2 bytes
                         vad_frame = vad_buffer[:self.VAD_FRAME_SIZE * 2]
                         vad_buffer = vad_buffer[self.VAD_FRAME_SIZE * 2:]
+                        recorder.audio(vad_frame)
                         
                         is_speech = self.vad.is_speech(vad_frame, config.SAMPLE_RATE)
                         
                         if is_speech:
+                            if voice_frame_count > 0 and silence_frame_count > 0:
+                                self.endpointer.observe_pause(silence_frame_count * self.VAD_FRAME_DURATION_MS / 1000)
                             silence_frame_count = 0
                             voice_frame_count += 1
                             
-                            if self.ws and self.ws.sock and self.ws.sock.connected:
-                                self.ws.send(vad_frame, opcode=websocket.ABNF.OPCODE_BINARY)
+                            self._send_frame(vad_frame)
                                 
                         else: # is silence
                             silence_frame_count += 1
                             
                             # Only send the silence frame if we are already in the middle of a command 
                             # (i.e., we have heard some speech already) AND the silence is brief.
-                            if voice_frame_count > 0 and self.ws and self.ws.sock and self.ws.sock.connected and silence_frame_count <= self.MAX_SILENCE_FRAMES:
-                                self.ws.send(vad_frame, opcode=websocket.ABNF.OPCODE_BINARY)
+                            if voice_frame_count > 0 and silence_frame_count <= self.MAX_SILENCE_FRAMES:
+                                self._send_frame(vad_frame)
                             
-                            # If we detect prolonged silence after hearing speech, end the command
-                            if voice_frame_count > 0 and silence_frame_count >= self.MAX_SILENCE_FRAMES:
+                            # End the command once the silence is longer than the endpointer's window for this transcript
+                            silence_s = silence_frame_count * self.VAD_FRAME_DURATION_MS / 1000
+                            window_s, reason = self.endpointer.window(self.transcript_buffer)
+                            if voice_frame_count > 0 and silence_s >= window_s:
+                                self.endpointer.end_utterance(silence_s, reason)
                                 
                                 # Process the transcript
                                 self._stop_transcriber_session()
-                                print(" " * 80 + "\r", end="", flush=True)
                                 final_transcript = self.transcript_buffer.strip().lower()
                                 
                                 self.transcript_buffer = ""
                                 self.last_transcript_time = None
                                 voice_frame_count = 0 # Reset VAD counter
+                                recorder.event("end_of_utterance", text=final_transcript, silence_s=silence_s, window_s=window_s, reason=reason)
                                 
                                 if final_transcript:
-                                    print(f"💬 You said: {final_transcript}")
+                                    logger.info("💬 You said: %s", final_transcript)
+                                    state.follow_up.close("answered")
+                                    state.state_machine.transition(state.AssistantState.THINKING, expected={state.AssistantState.LISTENING}, reason="command heard")
                                     
-                                    is_confirmation = any(cmd in final_transcript for cmd in self.CONFIRM_COMMANDS)
+                                    is_confirmation = match_dialogue_reply(final_transcript) == "CONFIRM"
                                     
                                     if state.DIALOGUE_CONTEXT['active'] and state.DIALOGUE_CONTEXT['slots'].get('awaiting_confirmation') and is_confirmation:
                                         state.command_queue.put("CONFIRM_SEND")
@@ -230,36 +335,36 @@ class AudioHandler(threading.Thread):
                                         state.command_queue.put(final_transcript)
                                 
                                 else:
-                                    print("[Assistant] No command heard. Returning to idle.")
+                                    logger.info("No command heard. Returning to idle.")
+                                    state.follow_up.close("timeout")
+                                    state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.LISTENING}, reason="silence")
                                 
-                                with state.state_lock:
-                                    state.STATE = state.AssistantState.IDLE
                                 break # Exit the listening loop, return to waiting for wake word
 
                     # Fallback on pause_threshold (if VAD somehow missed it, or transcriber gave no interim text)
-                    if self.last_transcript_time and (time.time() - self.last_transcript_time > self.pause_threshold * 2): # Use a longer timeout here
+                    if self.last_transcript_time and (time.time() - self.last_transcript_time > self.pause_threshold + self.endpointer.window(self.transcript_buffer)[0]):
                         self._stop_transcriber_session()
-                        print(" " * 80 + "\r", end="", flush=True)
                         final_transcript = self.transcript_buffer.strip().lower()
                         
                         self.transcript_buffer = ""
                         self.last_transcript_time = None
+                        recorder.event("end_of_utterance", text=final_transcript, reason="timeout")
 
                         if final_transcript:
-                            print(f"💬 You said: {final_transcript} (Timeout)")
+                            logger.info("💬 You said: %s (Timeout)", final_transcript)
+                            state.follow_up.close("answered")
+                            state.state_machine.transition(state.AssistantState.THINKING, expected={state.AssistantState.LISTENING}, reason="command heard (timeout)")
                             state.command_queue.put(final_transcript)
                         else:
-                            print("[Assistant] No command heard (Timeout). Returning to idle.")
-                        
-                        with state.state_lock:
-                            state.STATE = state.AssistantState.IDLE
+                            logger.info("No command heard (Timeout). Returning to idle.")
+                            state.follow_up.close("timeout")
+                            state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.LISTENING}, reason="timeout")
                         
             except Exception as e:
-                print(f"--- [FATAL ERROR in AudioHandler] ---")
-                print(f"An unexpected error occurred: {e}")
+                logger.exception("Unexpected error in AudioHandler: %s", e)
                 
-                with state.state_lock:
-                    state.STATE = state.AssistantState.IDLE
+                state.state_machine.reset(reason="audio error")
+                state.follow_up.close("interrupted")
                 self._stop_transcriber_session()
                 time.sleep(1)
 
@@ -268,6 +373,7 @@ class AudioHandler(threading.Thread):
         if self.stream: self.stream.close()
         if self.pa: self.pa.terminate()
         self._stop_transcriber_session()
+        self._discard_preopened_session()
 
 # --- INTENT ROUTING RESPONDER (UNCHANGED) ---
 class FireworksResponder(threading.Thread):
@@ -275,50 +381,116 @@ class FireworksResponder(threading.Thread):
 # ...
 # ...
 
-    def __init__(self):
+    def __init__(self, http=None, intent_classifier=None, answer_cache=None):
         super().__init__(daemon=True)
         self.url = config.FIREWORKS_URL
         self.headers = {"Accept": "text/event-stream", "Content-Type": "application/json", "Authorization": f"Bearer {config.FIREWORKS_API_KEY}"}
+        # Keep-alive: router, answer and summary requests reuse one TLS connection.
+        # Server mode passes one HTTP pool, classifier and answer cache to every session's responder.
+        self.session = requests.Session() if http is None else http
         
         self.llm_model = config.LLM_MODEL
         self.router_model = config.ROUTER_MODEL
+        self.intent_classifier = IntentClassifier() if intent_classifier is None else intent_classifier
+        self.memory = ConversationMemory(summarize=self._summarize_conversation)
+        self.answer_cache = AnswerCache() if answer_cache is None else answer_cache
+
+    def warm_up(self):
+        """Opens the Fireworks connection ahead of the first command (any HTTP reply will do)."""
+        try:
+            self.session.head(self.url, headers=self.headers, timeout=5)
+        except requests.RequestException as e:
+            logger.warning("⚠️ Could not pre-connect to Fireworks: %s", e)
+
+    def _summarize_conversation(self, previous_summary, turns):
+        """Folds evicted turns into the rolling summary. Runs on the memory's background thread."""
+        transcript = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in turns)
+        prompt = (f"Previous summary: {previous_summary or '(none)'}\n\nNew exchanges:\n{transcript}\n\n"
+                  f"Write an updated summary of the conversation in at most {config.CONVERSATION_SUMMARY_MAX_TOKENS} tokens. "
+                  "Keep names, numbers and open questions.")
+        payload = {"model": self.llm_model, "max_tokens": config.CONVERSATION_SUMMARY_MAX_TOKENS,
+                   "messages": [{"role": "user", "content": prompt}]}
+        headers = dict(self.headers, Accept="application/json")
+        response = self.session.post(self.url, headers=headers, data=json.dumps(payload), timeout=30)
+        response.raise_for_status()
+        return response.json()['choices'][0]['message']['content'].strip()
 
     def _get_intent(self, query):
-        """Calls LLM to get a JSON intent and slots."""
-        print("🔍 Routing command...")
+        """Calls LLM to get a JSON intent and slots, unless the local classifier is confident."""
+        started = time.perf_counter()
+        intent_data = self._route(query)
+        recorder.event("router", query=query, result=intent_data, seconds=round(time.perf_counter() - started, 4))
+        return intent_data
+
+    def _route(self, query):
+        with metrics.ROUTER_LATENCY.time(source="local"):
+            local_intent = self.intent_classifier.classify(query)
+        if local_intent:
+            logger.info("⚡ Routed locally: %s", local_intent['intent'])
+            return local_intent
+
+        logger.debug("🔍 Routing command...")
         
         payload = { 
             "model": self.router_model, 
-            "max_tokens": 256, 
+            # Free-text slots (a WhatsApp message) repeat the command: a fixed cap would cut long ones mid-JSON
+            "max_tokens": config.ROUTER_MAX_TOKENS + estimate_tokens(query) * 2, 
+            "temperature": 0,
             "messages": [
                 {"role": "system", "content": ROUTER_PROMPT},
                 {"role": "user", "content": query}
             ]
         }
+        if config.ROUTER_STRUCTURED_OUTPUT:
+            payload["response_format"] = ROUTER_RESPONSE_FORMAT
         
         try:
-            response = requests.post(self.url, headers=self.headers, data=json.dumps(payload))
+            started = time.perf_counter()
+            response = self.session.post(self.url, headers=self.headers, data=json.dumps(payload), timeout=config.ROUTER_TIMEOUT_S)
             response.raise_for_status()
+            latency_ms = (time.perf_counter() - started) * 1000
+            metrics.ROUTER_LATENCY.observe(latency_ms / 1000, source="llm")
             
-            raw_json = response.json()['choices'][0]['message']['content'].strip()
+            body = response.json()
+            intent_data = parse_router_reply(body['choices'][0]['message']['content'], query)
             
-            if raw_json.startswith("```json"):
-                raw_json = raw_json.strip('`').strip('json').strip()
+            usage = body.get('usage') or {}
+            prompt_tokens = usage.get('prompt_tokens')
+            output_tokens = usage.get('completion_tokens')
+            logger.info("🔍 Routed: %s in %.0f ms", intent_data['intent'], latency_ms,
+                        extra={"prompt_tokens": prompt_tokens, "output_tokens": output_tokens, "schema": ROUTER_SCHEMA_VERSION})
             
-            return json.loads(raw_json)
+            self.intent_classifier.record(query, intent_data, source="llm", latency_ms=latency_ms,
+                                          prompt_tokens=prompt_tokens, output_tokens=output_tokens, schema=ROUTER_SCHEMA_VERSION)
+            return intent_data
             
+        except RouterParseError as e:
+            logger.warning("Router reply could not be parsed: %s", e)
+            basic = match_basic_command(query)
+            if basic:
+                return basic
+            # Ask again instead of paying for a full LLM answer to what was probably a command
+            return {"intent": "CLARIFY", "slots": {"query": query}}
         except Exception as e:
-            print(f"\n[Router Error] Failed to get/parse intent: {e}")
+            logger.warning("Router failed to get/parse intent: %s", e)
+            # Keep basic commands working offline
+            basic = match_basic_command(query)
+            if basic:
+                logger.info("Router using offline match: %s", basic['intent'])
+                return basic
             return {"intent": "GENERAL_QUERY", "slots": {"query": query}} 
 
     def run(self):
-        global STATE
         while True:
             command = state.command_queue.get()
+            if command is None:
+                return # The session was closed (server mode: the client disconnected)
+            turn = state.new_turn()
+            recorder.event("command", text=command)
             
-            with state.state_lock:
-                state.STATE = state.AssistantState.THINKING
-            print("🧠 Thinking...")
+            # Never pull the audio loop out of LISTENING: a new turn being spoken wins
+            state.state_machine.transition(state.AssistantState.THINKING, expected={state.AssistantState.IDLE, state.AssistantState.THINKING, state.AssistantState.SPEAKING}, reason="command")
+            logger.info("🧠 Thinking...")
             state.interruption_event.clear()
             
             final_response_text = None
@@ -333,24 +505,28 @@ class FireworksResponder(threading.Thread):
                     is_awaiting_conf = state.DIALOGUE_CONTEXT['slots'].get('awaiting_confirmation')
                     
                     if is_awaiting_conf:
-                        confirmation_intent = self._get_intent(command_text) 
+                        # Yes/no is recognized locally; only other answers go to the router
+                        reply = "CONFIRM" if command_text == "CONFIRM_SEND" else match_dialogue_reply(command_text)
+                        metrics.DIALOGUE_REPLIES.inc(source="local" if reply else "router")
+                        if reply is None:
+                            reply = self._get_intent(command_text)['intent']
                         
-                        if confirmation_intent['intent'] == "CONFIRM" or command_text == "CONFIRM_SEND":
-                            slots = state.DIALOGUE_CONTEXT['slots']
-                            contact_name = slots['contact']
-                            message = slots['message']
-                            phone_number = config.CONTACT_BOOK[contact_name.lower()]
-                            
-                            final_response_text = handle_whatsapp_action(contact_name, message, phone_number, action="send")
-                            state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}}
+                        if reply == "CONFIRM":
+                            intent = "SEND_WHATSAPP"
+                            slots = dict(state.DIALOGUE_CONTEXT['slots'], action="send")
                             
-                        elif confirmation_intent['intent'] == "CANCEL":
+                        elif reply == "CANCEL":
                             final_response_text = "Message cancelled. Returning to idle."
-                            state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}}
+                            state.end_dialogue()
                             
                         else:
                             final_response_text = "I'm sorry, I didn't understand. Should I send the message or cancel?"
                         
+                    elif match_dialogue_reply(command_text, exact=True) == "CANCEL":
+                        # "Never mind" instead of a contact name or message body
+                        final_response_text = "Message cancelled."
+                        state.end_dialogue()
+                        
                     elif state.DIALOGUE_CONTEXT['intent'] == "SEND_WHATSAPP":
                         slots = state.DIALOGUE_CONTEXT['slots']
                         
@@ -369,154 +545,127 @@ class FireworksResponder(threading.Thread):
 
 
                 # --- PHASE 3: EXECUTION LOGIC ---
-                
-                if intent == "SEND_WHATSAPP":
-                    current_slots = slots
-                    contact_name = current_slots.get('contact', '').title()
-                    message = current_slots.get('message', '')
-                    
-                    if not contact_name or not message:
-                        state.DIALOGUE_CONTEXT.update({"active": True, "intent": intent, "slots": current_slots})
-                        
-                        if not contact_name:
-                            final_response_text = "Who should I send that message to?"
-                        elif not message:
-                            final_response_text = f"What should the message to {contact_name} say?"
-
-                    else:
-                        phone_number = config.CONTACT_BOOK.get(contact_name.lower())
-                        
-                        if not phone_number:
-                            final_response_text = f"I could not find a number for {contact_name}. Please try a different name."
-                            state.DIALOGUE_CONTEXT['active'] = False
-                        else:
-                            final_response_text = handle_whatsapp_action(contact_name, message, phone_number, action="prepare")
-                            
-                            state.DIALOGUE_CONTEXT.update({"active": True, "intent": intent, "slots": current_slots})
-                            state.DIALOGUE_CONTEXT['slots']['contact'] = contact_name
-                            state.DIALOGUE_CONTEXT['slots']['message'] = message
-                            state.DIALOGUE_CONTEXT['slots']['awaiting_confirmation'] = True 
-
-                # --- SYSTEM CONTROL LOGIC (UNCHANGED) ---
-                elif intent == "SYSTEM_CONTROL":
-                    action = slots.get('action')
-                    value = slots.get('value')
-                    
-                    if not action:
-                        final_response_text = "I received a system command but I'm not sure what action to take."
-                    else:
-                        final_response_text = handle_system_action(action, value)
-                        
-                        # --- NEW SLEEP LOGIC ---
-                        if action == "sleep":
-                            # Stop any current transcription session immediately
-                            state.LISTENING_INTERFACE['stop_transcriber']()
-                            with state.state_lock:
-                                state.STATE = state.AssistantState.IDLE
-                                print("😴 Assistant is now in IDLE/SLEEP mode.")
-                            
-                        state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}} 
-                            
-                # --- SPOTIFY CONTROL LOGIC (UNCHANGED) ---
-                elif intent == "SPOTIFY_CONTROL":
-                    action = slots.get('action')
-                    query = slots.get('query')
-                    
-                    if not action:
-                        final_response_text = "I received a Spotify command but I'm not sure which action to take."
+                # Skills run on their own worker pools (skills.SKILLS). Their context takes the reply's place on
+                # the sentence queue, so the speaker answers turns in order while the responder moves on.
+                skill = SKILLS.get(intent, slots.get('action')) if intent else None
+                if skill:
+                    ctx = SKILLS.submit(skill, slots, turn)
+                    if state.DIALOGUE_CONTEXT['active'] or not skill.ends_dialogue:
+                        # The next command is read against this dialogue: wait for the skill to update it
+                        final_response_text = ctx.wait()
+                        if skill.ends_dialogue:
+                            state.end_dialogue()
                     else:
-                        api_response = spotify_api.api_control_playback(spotify_api.SPOTIFY_CLIENT, action, query)
-                        
-                        if api_response:
-                            final_response_text = api_response
-                        else:
-                            final_response_text = handle_spotify_fallback(action, query)
-                            
-                        state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}} 
+                        state.tts_sentence_queue.put(ctx, turn)
                             
-                # --- LAUNCH TARGET LOGIC (UNCHANGED) ---
-                elif intent == "LAUNCH_TARGET":
-                    target = slots.get('target')
-                    target_type = slots.get('target_type')
-                    search_query = slots.get('search_query')
-                    
-                    if not target or not target_type:
-                        final_response_text = "I'm sorry, what exactly would you like me to open?"
-                    else:
-                        final_response_text = handle_launch_target_action(target, target_type, search_query)
-                        
-                    state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}}
-
-                # --- NEW: BROWSER NAVIGATOR LOGIC (UNCHANGED) ---
-                elif intent == "BROWSER_NAVIGATOR":
-                    action = slots.get('action')
+                elif intent == "CLARIFY":
+                    final_response_text = "Sorry, I didn't catch that. Could you say it again?"
                     
-                    if not action:
-                        final_response_text = "I'm not sure what navigation action you want me to perform in the browser."
-                    else:
-                        final_response_text = handle_browser_navigation(action)
-                        
-                    state.DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}}
-                            
                 elif intent == "GENERAL_QUERY":
                     query = slots.get('query', command_text)
+                    cacheable = not is_context_dependent(query)
+                    
+                    # --- Cached answer: straight to TTS, no network call ---
+                    cached_sentences = self.answer_cache.lookup(query) if cacheable else None
+                    if cacheable:
+                        metrics.ANSWER_CACHE_LOOKUPS.inc(result="hit" if cached_sentences else "miss")
+                    if cached_sentences:
+                        state.state_machine.transition(state.AssistantState.SPEAKING, expected={state.AssistantState.THINKING}, reason="cached answer")
+                        logger.info("🗣️ AI Response (cached, speaking)...")
+                        recorder.event("answer_cache", query=query, sentences=cached_sentences)
+                        for sentence in cached_sentences:
+                            state.tts_sentence_queue.put(sentence, turn)
+                        self.memory.add_turn(query, " ".join(cached_sentences))
+                        logger.info("AI: %s", " ".join(cached_sentences))
+                        continue
                     
-                    payload = { "model": self.llm_model, "max_tokens": 150, "stream": True, "messages": [{"role": "user", "content": query}] }
+                    messages = self.memory.build_messages(query)
+                    payload = { "model": self.llm_model, "max_tokens": 150, "stream": True, "messages": messages }
                     
-                    response_stream = requests.post(self.url, headers=self.headers, data=json.dumps(payload), stream=True)
+                    llm_started = time.perf_counter()
+                    first_token_seen = False
+                    response_stream = self.session.post(self.url, headers=self.headers, data=json.dumps(payload), stream=True)
+                    # Barge-in closes the socket under iter_lines() instead of waiting for the next line
+                    turn.register(response_stream.close)
                     response_stream.raise_for_status()
                     
-                    with state.state_lock:
-                        state.STATE = state.AssistantState.SPEAKING
-                    print("🗣️ AI Response (speaking)...")
+                    state.state_machine.transition(state.AssistantState.SPEAKING, expected={state.AssistantState.THINKING}, reason="llm stream")
+                    logger.info("🗣️ AI Response (speaking)...")
                     
+                    token_log = StreamDebugLog(logger)
                     sentence_buffer = []
-                    for line in response_stream.iter_lines():
-                        if state.interruption_event.is_set(): break
-                        if line:
-                            decoded_line = line.decode('utf-8')
-                            if decoded_line.startswith('data: '):
-                                json_str = decoded_line[len('data: '):]
-                                if json_str.strip() == "[DONE]": break
-                                
-                                data = json.loads(json_str)
-                                if 'content' in data['choices'][0]['delta']:
-                                    token = data['choices'][0]['delta']['content']
-                                    print(token, end="", flush=True)
-                                    sentence_buffer.append(token)
+                    answer_tokens = []
+                    token_times = [] # Seconds since the request, per token (flight recorder)
+                    answer_sentences = []
+                    completed = False
+                    try:
+                        for line in response_stream.iter_lines():
+                            if turn.is_cancelled() or state.interruption_event.is_set(): break
+                            if line:
+                                decoded_line = line.decode('utf-8')
+                                if decoded_line.startswith('data: '):
+                                    json_str = decoded_line[len('data: '):]
+                                    if json_str.strip() == "[DONE]":
+                                        completed = True
+                                        metrics.LLM_TOTAL.observe(time.perf_counter() - llm_started)
+                                        break
                                     
-                                    if any(c in token for c in ".?!"):
-                                        sentence = "".join(sentence_buffer).strip()
-                                        if sentence: state.tts_sentence_queue.put(sentence)
-                                        sentence_buffer.clear()
+                                    data = json.loads(json_str)
+                                    if 'content' in data['choices'][0]['delta']:
+                                        token = data['choices'][0]['delta']['content']
+                                        if not first_token_seen:
+                                            first_token_seen = True
+                                            metrics.LLM_FIRST_TOKEN.observe(time.perf_counter() - llm_started)
+                                        token_log("LLM token", token=token)
+                                        sentence_buffer.append(token)
+                                        answer_tokens.append(token)
+                                        token_times.append(round(time.perf_counter() - llm_started, 4))
+                                        
+                                        if any(c in token for c in ".?!"):
+                                            sentence = "".join(sentence_buffer).strip()
+                                            # Blocks while the speaker is behind: the stream is read no faster than it is spoken
+                                            if sentence and state.tts_sentence_queue.put(sentence, turn):
+                                                answer_sentences.append(sentence)
+                                            sentence_buffer.clear()
+                    except Exception:
+                        # Reading from a response closed by barge-in raises; anything else is a real error
+                        if not turn.is_cancelled(): raise
+                        logger.info("LLM stream closed by barge-in.")
+                    finally:
+                        response_stream.close()
                                     
-                    if not state.interruption_event.is_set() and sentence_buffer:
+                    if not turn.is_cancelled() and not state.interruption_event.is_set() and sentence_buffer:
                         sentence = "".join(sentence_buffer).strip()
-                        if sentence: state.tts_sentence_queue.put(sentence + '.')
-                        
-                    print("\n")
-                    state.tts_sentence_queue.put(None) 
+                        if sentence and state.tts_sentence_queue.put(sentence + '.', turn):
+                            answer_sentences.append(sentence + '.')
+                    
+                    recorder.event("llm", query=query, tokens=answer_tokens, token_times=token_times, completed=completed, cancelled=turn.is_cancelled())
+                    self.memory.add_turn(query, "".join(answer_tokens).strip())
+                    # Only complete answers are cached; a barge-in leaves a truncated one
+                    if cacheable and completed and not turn.is_cancelled():
+                        self.answer_cache.store(query, answer_sentences)
+                    logger.info("AI: %s", "".join(answer_tokens).strip())
                     continue
 
                 # Fallback for all non-streaming paths
                 if final_response_text:
-                    state.tts_sentence_queue.put(final_response_text)
-                    
-                    if state.DIALOGUE_CONTEXT['active']:
-                           time.sleep(1.5) 
-                           
-                           state.LISTENING_INTERFACE['stop_transcriber']() 
-                           
-                           with state.state_lock:
-                               state.STATE = state.AssistantState.IDLE
-                               print("👂 Dialogue turn complete. Say WAKE WORD to continue.")
+                    self._speak_reply(final_response_text, turn)
                 
             except Exception as e:
-                print(f"\n[Responder Fatal Error]: {e}")
+                logger.exception("Responder fatal error: %s", e)
                 final_response_text = "I'm sorry, I encountered a critical error while processing your request."
-                state.tts_sentence_queue.put(final_response_text)
+                state.tts_sentence_queue.put(Reply(final_response_text), turn)
             finally:
-                state.tts_sentence_queue.put(None)
+                state.command_queue.task_done()
+                state.tts_sentence_queue.end_turn(turn)
+
+    def _speak_reply(self, text, turn):
+        state.tts_sentence_queue.put(Reply(text), turn)
+        
+        # A dialogue prompt: the answer is heard right after it plays, without the wake word
+        if state.DIALOGUE_CONTEXT['active'] and not state.follow_up.arm(turn):
+            logger.info("👂 Dialogue turn complete. Say WAKE WORD to continue.")
+
 
 # --- ELEVENLABS SPEAKER (UNCHANGED) ---
 class ElevenLabsSpeaker(threading.Thread):
@@ -524,95 +673,161 @@ class ElevenLabsSpeaker(threading.Thread):
 # ...
 # ...
 
-    def __init__(self, client):
+    def __init__(self, client=None, player=None, local_tts=None):
         super().__init__(daemon=True)
-        self.client = client
-        self.player_command = self._find_player()
-        self.playback_process = None
-        self.process_lock = threading.Lock()
-        self.is_interrupted = False 
-
-    def _find_player(self):
-        for player in ["mpv", "ffplay"]:
-            if shutil.which(player):
-                print(f"✅ Audio player found: {player}")
-                return player
-        print("⚠️ WARNING: No audio player (mpv or ffplay) found in PATH. Audio will not play.")
-        return None
+        self.client_ready = threading.Event() # The ElevenLabs client is created in the background at startup
+        self.player = player or PcmPlayer()
+        self.cloud = ElevenLabsTTS(sample_rate=self.player.sample_rate)
+        self.router = TTSRouter(self.cloud, local_tts)
+        if client is not None:
+            self.set_client(client)
+        self.first_sample_latencies = deque(maxlen=100) # (seconds, queued behind playing audio), most recent sentences
+        self.last_turn = None
+
+    def set_client(self, client):
+        self.cloud.client = client
+        self.client_ready.set()
+
+    def set_local_tts(self, engine):
+        self.router.local = engine
 
     def stop_playback(self):
-        with self.process_lock:
-            self.is_interrupted = True 
-            
-            if self.playback_process and self.playback_process.poll() is None:
-                print("\n[Speaker] Killing audio playback process...")
-                try:
-                    if self.playback_process.stdin:
-                        self.playback_process.stdin.close() 
-                    
-                    self.playback_process.kill() 
-                    self.playback_process.wait(timeout=1)
-                except Exception as e:
-                    print(f"[Speaker] Error during kill: {e}")
-            self.playback_process = None 
+        self.player.stop()
 
     def run(self):
-        global STATE
+        try:
+            self.player.open()
+        except Exception as e:
+            logger.error("🚨 Could not open the audio output: %s. Audio will not play.", e)
+
         while True:
             sentence = state.tts_sentence_queue.get()
-            
             if sentence is None:
-                if not state.interruption_event.is_set():
-                    with state.state_lock: state.STATE = state.AssistantState.IDLE
+                self.player.close() # The session was closed
+                return
+            
+            if isinstance(sentence, EndOfTurn):
+                # A late end of an older turn (e.g. a skill that outlived it) must not end the current one
+                if sentence.turn is state.CURRENT_TURN and not state.interruption_event.is_set():
+                    self.player.drain() # The turn is over once its last sentence has played
+                    recorder.event("speech_end")
+                    # After a dialogue prompt the audio loop listens for the answer instead of the wake word
+                    if state.follow_up.open(sentence.turn):
+                        if state.state_machine.transition(state.AssistantState.LISTENING, expected={state.AssistantState.SPEAKING}, reason="follow-up"):
+                            continue
+                        state.follow_up.close("interrupted")
+                    state.state_machine.transition(state.AssistantState.IDLE, expected={state.AssistantState.SPEAKING, state.AssistantState.THINKING}, reason="end of turn")
+                else:
+                    state.follow_up.close("interrupted", turn=sentence.turn) # A prompt that was cut off or superseded
                 continue
             
-            if state.interruption_event.is_set() or not self.player_command: continue
+            if isinstance(sentence, SkillContext):
+                sentence = self._skill_reply(sentence)
+                if sentence is None: continue
             
-            self.is_interrupted = False 
+            if state.interruption_event.is_set() or not self.player.is_open(): continue
             
-            try:
-                audio_stream = self.client.text_to_speech.stream(text=sentence, voice_id="pNInz6obpgDQGcFmaJgB", model_id="eleven_turbo_v2")
-                
-                if self.player_command == "mpv":
-                    command = [self.player_command, "--no-cache", "--audio-buffer=0.1", "-", "--no-msg-color"]
-                else:
-                    command = [self.player_command, "-autoexit", "-", "-nodisp"]
-                
-                with self.process_lock:
-                    if self.is_interrupted: continue 
-                    self.playback_process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                
-                for chunk in audio_stream:
-                    if self.is_interrupted: 
-                        break 
-
-                    if self.playback_process and self.playback_process.stdin:
-                        try:
-                            self.playback_process.stdin.write(chunk)
-                        except (BrokenPipeError, OSError):
-                            break 
-                
-                if self.playback_process and self.playback_process.stdin: self.playback_process.stdin.close()
-                if self.playback_process: self.playback_process.wait()
-                
-            except Exception as e:
-                print(f"\n[Speaker Error] {e}")
-            finally:
-                self.is_interrupted = False 
-                with self.process_lock: self.playback_process = None
+            turn = state.CURRENT_TURN
+            if turn.is_cancelled(): continue
+            first_in_turn, self.last_turn = turn is not self.last_turn, turn
+            engines = self.router.route(sentence, self.client_ready.is_set(), first_in_turn)
+            # Skill replies go straight from THINKING to the speaker; this makes them interruptible too
+            state.state_machine.transition(state.AssistantState.SPEAKING, expected={state.AssistantState.THINKING}, reason="playback")
+            generation = self.player.generation
+            turn.register(self.stop_playback)
+            
+            # Next engine only if this one failed before producing any audio
+            for engine in engines:
+                if engine is self.cloud and not self.client_ready.wait(timeout=10):
+                    logger.error("ElevenLabs client is not ready. Skipping: %s", sentence)
+                    continue
+                if self._speak(engine, sentence, turn, generation) or turn.is_cancelled():
+                    break
+
+    def _skill_reply(self, ctx):
+        """Waits for a skill queued ahead of later turns. Returns its reply, or None if there is nothing to say."""
+        state.CURRENT_TURN.register(ctx.turn.cancel) # Barge-in also gives up on an older turn's skill
+        reply = ctx.wait()
+        if ctx.outcome == "sleep" and not ctx.turn.is_cancelled():
+            # Stop any current transcription session immediately; the end of the turn goes IDLE
+            state.LISTENING_INTERFACE['stop_transcriber']()
+            logger.info("😴 Assistant is now in IDLE/SLEEP mode.")
+        return Reply(reply) if reply else None
+
+    def _speak(self, engine, sentence, turn, generation):
+        """Streams one sentence from `engine` into the player. Returns False if the engine failed before any audio."""
+        audio_stream = None
+        wrote_audio = False
+        first_chunk_s = None
+        audio_bytes = 0
+        tts_started = time.perf_counter()
+        on_first_sample = None
+        try:
+            # A sentence requested while earlier audio is playing waits behind it; that wait is not latency
+            queued = self.player.is_playing()
+            on_first_sample = lambda started=tts_started, queued=queued, name=engine.name: self._first_sample(started, queued, name)
+            self.player.mark(on_first_sample)
+            resampler = PcmResampler(engine.sample_rate, self.player.sample_rate)
+            audio_stream = TTSStream(engine.stream(sentence))
+            # Barge-in closes the HTTP stream under the read instead of waiting for the next chunk
+            turn.register(audio_stream.close)
+            
+            # Playback of this sentence starts as soon as the jitter buffer has its pre-roll;
+            # the next sentence is fetched while the end of this one is still playing
+            for chunk in audio_stream:
+                if not wrote_audio:
+                    first_chunk_s = time.perf_counter() - tts_started
+                    metrics.TTS_FIRST_CHUNK.observe(first_chunk_s, engine=engine.name)
+                audio_bytes += len(chunk)
+                chunk = resampler.process(chunk)
+                if turn.is_cancelled() or not self.player.write(chunk, generation):
+                    break 
+                wrote_audio = True
+            return True
+            
+        except Exception as e:
+            logger.error("Speaker error (%s): %s", engine.name, e)
+            if engine is self.cloud:
+                self.router.mark_cloud_down(f"failed ({e})")
+            return wrote_audio
+        finally:
+            # No audio from this engine: the next engine's first sample is not this one's
+            if not wrote_audio and on_first_sample is not None:
+                self.player.unmark(on_first_sample)
+            # Closing the stream aborts the HTTP stream (or the local synthesis) instead of draining it
+            if audio_stream is not None:
+                try:
+                    audio_stream.close()
+                except Exception:
+                    pass
+            recorder.event("tts", text=sentence, engine=engine.name, first_chunk_s=first_chunk_s, bytes=audio_bytes,
+                           seconds=round(time.perf_counter() - tts_started, 4), sample_rate=engine.sample_rate)
+
+    def _first_sample(self, tts_started, queued, engine):
+        elapsed = time.perf_counter() - tts_started + self.player.output_latency
+        self.first_sample_latencies.append((elapsed, queued))
+        recorder.event("tts_first_sample", seconds=round(elapsed, 4), queued=queued, engine=engine)
+        metrics.TTS_FIRST_SAMPLE.observe(elapsed, queued=str(queued).lower(), engine=engine)
 
 
 # --- MAIN EXECUTION BLOCK (MODIFIED) ---
 if __name__ == "__main__":
+    if config.TEST_MODE:
+        # Headless: commands from stdin through the router, dialogue and skills, with stand-in backends
+        from .headless import main as headless_main
+        sys.exit(headless_main(["-"]))
+
+    setup_logging()
     if not (config.FIREWORKS_API_KEY and config.PICOVOICE_ACCESS_KEY and config.ELEVENLABS_API_KEY):
-        print("CRITICAL ERROR: Please ensure all API keys in config.py are set correctly.")
+        logger.critical("CRITICAL ERROR: Please ensure all API keys in config.py are set correctly.")
+        shutdown_logging()
         sys.exit(1)
     
-    # NOTE: The Spotify client ID and Secret are still placeholders in config.py. 
-    # You should replace them with the full values if you want the API control to work.
-    elevenlabs_client = ElevenLabs(api_key=config.ELEVENLABS_API_KEY)
-    
-    spotify_api.SPOTIFY_CLIENT = spotify_api.get_spotify_client()
+    # Audio path first: network clients and rarely used imports come up in parallel in the background
+    startup = StartupOrchestrator(process_started=_PROCESS_STARTED)
+
+    def _set_spotify_client(client):
+        spotify_api.SPOTIFY_CLIENT = client
 
     try:
         # --- ADJUSTED WAKE WORD SENSITIVITY ---
@@ -620,28 +835,49 @@ if __name__ == "__main__":
         # -------------------------------------
         porcupine = pvporcupine.create(access_key=config.PICOVOICE_ACCESS_KEY, keywords=[config.WAKE_WORD],sensitivities=[SENSITIVITY])
     except Exception as e:
-        print(f"Error initializing Porcupine: {e}")
+        logger.critical("Error initializing Porcupine: %s", e)
+        shutdown_logging()
         sys.exit(1)
 
+    speaker = ElevenLabsSpeaker()
+    speaker.start()
+    metrics.register_thread("speaker", speaker)
+    metrics.register_health_check("tts_player", speaker.player.is_open)
+    metrics.register_health_check("tts_client", speaker.client_ready.is_set)
+    metrics.register_health_check("tts_local", lambda: speaker.router.local is not None, required=False)
+
     responder = FireworksResponder()
-    speaker = ElevenLabsSpeaker(client=elevenlabs_client)
-    
     responder.start()
-    speaker.start()
+    metrics.register_thread("responder", responder)
 
-    if config.TEST_MODE:
-        print("Test Mode is not implemented in this final version. Set TEST_MODE = False.")
-    else:
-        audio_handler = AudioHandler(porcupine=porcupine, speaker=speaker)
-        audio_handler.start()
-        try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            print("\nStopping assistant.")
+    # NOTE: The Spotify client ID and Secret are still placeholders in config.py. 
+    # You should replace them with the full values if you want the API control to work.
+    startup.background("spotify", spotify_api.get_spotify_client, on_done=_set_spotify_client)
+    startup.background("elevenlabs", lambda: create_elevenlabs_client(config.ELEVENLABS_API_KEY), on_done=speaker.set_client)
+    startup.background("local_tts", create_local_tts, on_done=speaker.set_local_tts)
+    startup.background("fireworks", responder.warm_up)
+    metrics.register_health_check("spotify_api", lambda: spotify_api.SPOTIFY_CLIENT is not None, required=False)
+    metrics.start_metrics_server()
+
+    audio_handler = AudioHandler(porcupine=porcupine, speaker=speaker)
+    audio_handler.start()
+    metrics.register_thread("audio", audio_handler)
+    metrics.register_health_check("microphone", lambda: audio_handler.stream.is_active())
+    metrics.register_health_check("transcriber", audio_handler.failover.is_available)
+    if audio_handler.listening.wait(timeout=30):
+        startup.mark_listening()
+    # GUI automation libraries are only needed by skills; load them once listening has started
+    startup.background("skill_imports", skills.preload)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping assistant.")
 
     speaker.stop_playback()
+    speaker.player.close()
     if 'audio_handler' in locals() and audio_handler.is_alive():
         audio_handler.stop()
     porcupine.delete()
-    print("Cleanup complete. Exiting.")
\ No newline at end of file
+    logger.info("Cleanup complete. Exiting.")
+    shutdown_logging()
\ No newline at end of file
@@ -0,0 +1,289 @@
+# metrics.py (Prometheus-format metrics and a /healthz endpoint, standard library only)
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config
+from .log import get_logger
+
+logger = get_logger("metrics")
+
+# Seconds; covers a 30 ms audio hop up to a slow 20 s Spotify device retry
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+# --- METRIC TYPES ---
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        super().__init__(name, help_text)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _samples(self):
+        with self.lock:
+            return [f"{self.name}{_format_labels(dict(k))} {v}" for k, v in self.values.items()]
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time from `callback() -> {labels_tuple: value}`."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.values = {}
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[tuple(sorted(labels.items()))] = value
+
+    def _samples(self):
+        if self.callback:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [f"{self.name}{_format_labels(dict(k))} {v}" for k, v in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+        self.series = {} # labels -> [bucket_counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        lines = []
+        with self.lock:
+            for key, (counts, total, count) in self.series.items():
+                labels = dict(key)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=bound))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le='+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class _Timer:
+    """`with HISTOGRAM.time(): ...` observes the block's duration in seconds."""
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def render_all():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- ASSISTANT METRICS ---
+ROUTER_LATENCY = Histogram("assistant_router_latency_seconds", "Intent routing latency by source (llm/local).")
+LLM_FIRST_TOKEN = Histogram("assistant_llm_first_token_seconds", "Time from GENERAL_QUERY request to first streamed token.")
+LLM_TOTAL = Histogram("assistant_llm_response_seconds", "Time from GENERAL_QUERY request to end of stream.")
+TTS_FIRST_CHUNK = Histogram("assistant_tts_first_chunk_seconds", "Time from TTS request to first audio chunk per sentence, by engine.")
+TTS_FIRST_SAMPLE = Histogram("assistant_tts_first_sample_seconds", "Time from TTS request to the sentence's first sample leaving the output device, by engine and whether it queued behind playing audio.")
+TTS_ROUTES = Counter("assistant_tts_routes_total", "Sentences by first-choice TTS engine and routing reason.")
+PLAYBACK_UNDERRUNS = Counter("assistant_playback_underruns_total", "Times the playback jitter buffer ran dry mid-turn.")
+COMMANDS = Counter("assistant_commands_total", "Commands by priority class and result (queued/collapsed/preempted/expired/overflow).")
+QUEUE_OVERFLOWS = Counter("assistant_queue_overflows_total", "Items dropped or refused by a full bounded queue, by queue and overflow policy.")
+QUEUE_BACKPRESSURE = Histogram("assistant_queue_backpressure_seconds", "Time a producer waited for room in a full queue, by queue.")
+TURN_ENDS = Counter("assistant_turn_ends_total", "End-of-turn markers given to the sentence queue by result (queued/duplicate).")
+COMMAND_QUEUE_WAIT = Histogram("assistant_command_queue_wait_seconds", "Time a command waited in the command queue, by priority class.")
+SKILL_LATENCY = Histogram("assistant_skill_seconds", "Skill latency from dispatch to reply, by skill and result (ok/error/timeout/cancelled).")
+SPOTIFY_LATENCY = Histogram("assistant_spotify_api_seconds", "Spotify API command latency by action.")
+SPOTIFY_TOKEN_REFRESH = Histogram("assistant_spotify_token_refresh_seconds", "Background Spotify token refreshes by result (ok/error).")
+SPOTIFY_KEEPALIVES = Counter("assistant_spotify_keepalives_total", "Spotify keep-alive calls by result (ok/error).")
+STATE_SECONDS = Counter("assistant_state_seconds_total", "Time spent in each AssistantState.")
+STATE_TRANSITIONS = Counter("assistant_state_transitions_total", "AssistantState transitions.")
+STATE_ILLEGAL_TRANSITIONS = Counter("assistant_state_illegal_transitions_total", "Refused transitions not declared in the state machine.")
+STATE_STALE_TRANSITIONS = Counter("assistant_state_stale_transitions_total", "Refused transitions whose expected source state had already changed.")
+STARTUP_TO_LISTENING = Gauge("assistant_startup_listening_seconds", "Seconds from process start until the wake-word loop was listening.")
+STARTUP_STEP_SECONDS = Gauge("assistant_startup_step_seconds", "Duration of each background startup step.")
+TRANSCRIBER_SESSIONS = Counter("assistant_transcriber_sessions_total", "Transcriber session attempts by engine and result.")
+TRANSCRIBER_FAILOVERS = Counter("assistant_transcriber_failovers_total", "Cloud transcriber marked down (connect failure or latency).")
+UPLINK_FRAMES = Counter("assistant_uplink_frames_total", "Audio frames given to the transcriber uplink by result (sent/dropped) and drop reason.")
+UPLINK_MESSAGES = Counter("assistant_uplink_messages_total", "WebSocket messages sent by the transcriber uplink (batched frames).")
+UPLINK_BYTES = Counter("assistant_uplink_bytes_total", "Bytes sent to the transcriber by uplink codec.")
+UPLINK_SEND_SECONDS = Histogram("assistant_uplink_send_seconds", "Time one uplink WebSocket send blocked the sender thread.")
+WAKE_GATE_FRAMES = Counter("assistant_wake_gate_frames_total", "Microphone frames given to or skipped before the wake-word engine.")
+RECORDER_RECORDS = Counter("assistant_flight_recorder_records_total", "Flight recorder records by result (written/dropped).")
+RECORDER_BYTES = Counter("assistant_flight_recorder_bytes_total", "Bytes written to the flight recorder ring.")
+AUDIO_OVERFLOWS = Counter("assistant_audio_input_overflows_total", "Microphone input overflows (samples dropped by PortAudio, detected from the read clock).")
+BARGE_IN_LATENCY = Histogram("assistant_barge_in_seconds", "Interrupt-to-silence latency.")
+ENDPOINT_SILENCE = Histogram("assistant_endpoint_silence_seconds", "Trailing silence that ended a command, by endpointer reason.")
+ENDPOINT_SAVED = Counter("assistant_endpoint_saved_seconds_total", "End-of-speech latency saved against the fixed silence window.")
+ENDPOINT_ADDED = Counter("assistant_endpoint_added_seconds_total", "Extra silence waited (mid-sentence) against the fixed silence window.")
+ANSWER_CACHE_LOOKUPS = Counter("assistant_answer_cache_lookups_total", "GENERAL_QUERY answer cache lookups by result.")
+CONTACT_LOOKUPS = Counter("assistant_contact_lookups_total", "WhatsApp contact lookups by result (exact/alias/phonetic/fuzzy/ambiguous/none).")
+FOLLOW_UPS = Counter("assistant_follow_up_windows_total", "Follow-up listening windows after a dialogue prompt, by result (answered/timeout/interrupted).")
+DIALOGUE_REPLIES = Counter("assistant_dialogue_replies_total", "Answers to confirmation prompts, by who recognized them (local/router).")
+SERVER_SESSIONS = Gauge("assistant_server_sessions", "Clients connected in server mode.")
+SERVER_CONNECTIONS = Counter("assistant_server_connections_total", "Server-mode WebSocket connections by result (accepted/refused/closed).")
+SERVER_REPLY_LATENCY = Histogram("assistant_server_reply_seconds", "Server mode: end of a client's utterance to the first reply audio sent back.")
+
+
+# --- QUEUES, THREADS & HEALTH ---
+_queues = {} # (queue name, session name) -> queue
+_threads = {}
+_health_checks = {} # name -> (callable returning bool, required)
+
+def register_queue(name, q, session=None):
+    """Exports q.qsize() as assistant_queue_depth{queue, session}. `session` defaults to the caller's session."""
+    if session is None:
+        from . import state
+        session = state.current_session().name
+    _queues[(name, session)] = q
+
+def unregister_queues(session):
+    """Stops exporting a closed session's queues (server mode: the client disconnected)."""
+    for key in [key for key in list(_queues) if key[1] == session]:
+        _queues.pop(key, None)
+
+def register_thread(name, thread):
+    _threads[name] = thread
+
+def register_health_check(name, check, required=True):
+    _health_checks[name] = (check, required)
+
+QUEUE_DEPTH = Gauge("assistant_queue_depth", "Items waiting in each queue.",
+                    callback=lambda: {(("queue", n), ("session", s)): q.qsize() for (n, s), q in list(_queues.items())})
+
+def _current_state():
+    from . import state
+    return {(("state", state.state_machine.current),): 1}
+
+CURRENT_STATE = Gauge("assistant_state", "1 for the current AssistantState.", callback=_current_state)
+THREAD_ALIVE = Gauge("assistant_thread_alive", "1 if the worker thread is alive.",
+                     callback=lambda: {(("thread", n),): int(t.is_alive()) for n, t in list(_threads.items())})
+
+def _log_dropped():
+    from . import log
+    return {(): log.dropped_records}
+
+LOG_DROPPED = Gauge("assistant_log_records_dropped", "Log records dropped because the writer queue was full.", callback=_log_dropped)
+
+def _spotify_token_age():
+    from . import spotify_api
+    token_age_s = getattr(spotify_api.SPOTIFY_CLIENT, "token_age_s", None)
+    age = token_age_s() if token_age_s else None
+    return {(): round(age, 1)} if age is not None else {}
+
+SPOTIFY_TOKEN_AGE = Gauge("assistant_spotify_token_age_seconds", "Seconds since the Spotify access token was issued.", callback=_spotify_token_age)
+
+def health_report():
+    """Returns (all_required_ready, {subsystem: {"ready": bool, "required": bool}})."""
+    report = {}
+    for name, thread in list(_threads.items()):
+        report[f"thread:{name}"] = {"ready": thread.is_alive(), "required": True}
+    for name, (check, required) in list(_health_checks.items()):
+        try:
+            ready = bool(check())
+        except Exception:
+            ready = False
+        report[name] = {"ready": ready, "required": required}
+    healthy = all(item["ready"] for item in report.values() if item["required"])
+    return healthy, report
+
+
+# --- HTTP ENDPOINT ---
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            self._send(200, render_all(), "text/plain; version=0.0.4")
+        elif self.path == "/healthz":
+            healthy, report = health_report()
+            self._send(200 if healthy else 503, json.dumps({"healthy": healthy, "subsystems": report}), "application/json")
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+def start_metrics_server(host=None, port=None):
+    """Starts the endpoint on a daemon thread if METRICS_ENABLED. Returns the server or None."""
+    if not config.METRICS_ENABLED:
+        return None
+    host = host or config.METRICS_HOST
+    port = port if port is not None else config.METRICS_PORT
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        logger.warning("⚠️ Metrics endpoint could not start on %s:%s: %s", host, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bound_host, bound_port = server.server_address[:2]
+    logger.info("📈 Metrics on http://%s:%s/metrics (health: /healthz)", bound_host, bound_port)
+    return server
@@ -0,0 +1,173 @@
+# playback.py (In-process PCM playback: one long-lived output stream fed through a jitter buffer)
+import threading
+import time
+from collections import deque
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("playback")
+
+SAMPLE_WIDTH = 2 # 16-bit mono PCM
+
+
+def _open_pyaudio(sample_rate, frames_per_buffer, callback):
+    import pyaudio # Imported here: the stand-in output in standins.py needs no sound card
+    pa = pyaudio.PyAudio()
+    stream = pa.open(format=pyaudio.paInt16, channels=1, rate=sample_rate, output=True,
+                     frames_per_buffer=frames_per_buffer,
+                     stream_callback=lambda in_data, frame_count, time_info, status: (callback(frame_count), pyaudio.paContinue))
+    stream.start_stream()
+    stream.pa = pa # Terminated together with the stream in close()
+    return stream
+
+
+class PcmPlayer:
+    """
+    Plays 16-bit mono PCM written by the speaker thread on a single output
+    stream that stays open for the whole session.
+
+    The output callback pulls fixed blocks from a jitter buffer. A sentence
+    starts once PLAYBACK_PREROLL_MS of audio is buffered (or drain() says the
+    turn is over). After an underrun the buffer fills up to the pre-roll again. Audio
+    written while earlier audio is still playing is simply appended, so
+    consecutive sentences play without a gap.
+
+    stop() empties the buffer. The next callback outputs silence, so audio stops
+    within one PLAYBACK_BLOCK_MS block, on a sample boundary. mark() reports when
+    the next written byte actually reaches the output (time-to-first-sample).
+    """
+    def __init__(self, sample_rate=None, open_output=_open_pyaudio):
+        self.sample_rate = sample_rate or config.TTS_SAMPLE_RATE
+        self.bytes_per_s = self.sample_rate * SAMPLE_WIDTH
+        self.block_frames = max(1, int(self.sample_rate * config.PLAYBACK_BLOCK_MS / 1000))
+        self.preroll_bytes = int(self.bytes_per_s * config.PLAYBACK_PREROLL_MS / 1000) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.max_bytes = int(self.bytes_per_s * config.PLAYBACK_MAX_BUFFER_S)
+        self.open_output = open_output
+        self.stream = None
+        self.output_latency = 0.0
+
+        self._cond = threading.Condition()
+        self._buffer = bytearray()
+        self._marks = deque() # (byte offset, on_first_sample)
+        self._written = 0 # Bytes ever appended / handed to the output, for the marks
+        self._played = 0
+        self._primed = False # Pre-roll reached; cleared by an underrun or stop()
+        self._ending = False # drain(): no more audio is on its way, play the tail without waiting for pre-roll
+        self.generation = 0 # Bumped by stop(); writes from before a stop are discarded
+        self.underruns = 0
+
+    def open(self):
+        if self.stream is None:
+            self.stream = self.open_output(self.sample_rate, self.block_frames, self._next_block)
+            if hasattr(self.stream, "get_output_latency"):
+                self.output_latency = self.stream.get_output_latency()
+            logger.info("🔊 Output stream open: %d Hz, %d ms blocks.", self.sample_rate, config.PLAYBACK_BLOCK_MS)
+        return self
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            if hasattr(self.stream, "pa"):
+                self.stream.pa.terminate()
+            self.stream = None
+
+    def is_open(self):
+        return self.stream is not None
+
+    def is_playing(self):
+        with self._cond:
+            return self._primed and bool(self._buffer)
+
+    def buffered_seconds(self):
+        with self._cond:
+            return len(self._buffer) / self.bytes_per_s
+
+    def mark(self, on_first_sample):
+        """Calls `on_first_sample()` (from the output thread) when the next byte written is played."""
+        with self._cond:
+            self._marks.append((self._written, on_first_sample))
+
+    def unmark(self, on_first_sample):
+        """Drops a mark() whose audio never came (e.g. the engine failed before its first chunk)."""
+        with self._cond:
+            self._marks = deque(mark for mark in self._marks if mark[1] is not on_first_sample)
+
+    def write(self, pcm, generation=None):
+        """
+        Appends PCM, waiting while more than PLAYBACK_MAX_BUFFER_S is queued.
+        Returns False (and drops the audio) if stop() was called since `generation`.
+        """
+        generation = self.generation if generation is None else generation
+        with self._cond:
+            while len(self._buffer) > self.max_bytes and generation == self.generation:
+                self._cond.wait(0.1)
+            if generation != self.generation:
+                return False
+            self._buffer += pcm
+            self._written += len(pcm)
+            self._ending = False
+        if hasattr(self.stream, "wake"): # An output that only runs while there is audio (server mode)
+            self.stream.wake()
+        return True
+
+    def drain(self, timeout=None):
+        """Waits until everything written has been played (or stop() was called). Returns True if it was."""
+        with self._cond:
+            self._ending = True
+            if timeout is None:
+                timeout = len(self._buffer) / self.bytes_per_s + 1.0 # A stalled output must not hang the speaker
+            deadline = time.monotonic() + timeout
+            while self._buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.1))
+        time.sleep(self.output_latency) # The last block is still in the device buffer
+        return True
+
+    def stop(self):
+        """Silences output from the next block on and discards everything buffered."""
+        with self._cond:
+            self.generation += 1
+            self._buffer.clear()
+            self._marks.clear()
+            self._played = self._written
+            self._primed = False
+            self._ending = False
+            self._cond.notify_all()
+
+    def _next_block(self, frame_count):
+        """Output callback: the next `frame_count` frames, padded with silence."""
+        wanted = frame_count * SAMPLE_WIDTH
+        reached = []
+        with self._cond:
+            if not self._primed and self._buffer and (len(self._buffer) >= self.preroll_bytes or self._ending):
+                self._primed = True
+            if self._primed:
+                # Whole samples only: a network chunk may end half-way through one
+                size = min(wanted, len(self._buffer) // SAMPLE_WIDTH * SAMPLE_WIDTH)
+                block = bytes(self._buffer[:size])
+                del self._buffer[:size]
+                self._played += size
+                while self._marks and self._marks[0][0] < self._played:
+                    reached.append(self._marks.popleft()[1])
+                if len(self._buffer) < SAMPLE_WIDTH:
+                    if self._ending:
+                        self._buffer.clear() # A stray half sample at the very end
+                    else:
+                        self.underruns += 1
+                        metrics.PLAYBACK_UNDERRUNS.inc()
+                    self._primed = False
+                    self._cond.notify_all()
+                elif len(self._buffer) <= self.max_bytes:
+                    self._cond.notify_all()
+            else:
+                block = b""
+        for on_first_sample in reached:
+            try:
+                on_first_sample()
+            except Exception as e:
+                logger.warning("Playback mark callback failed: %s", e)
+        return block + b"\x00" * (wanted - len(block))
@@ -0,0 +1,219 @@
+# replay.py (Re-runs a flight-recorded turn against the local stand-ins in standins.py)
+# Run as a module from the parent directory, e.g.:  python -m <package>.replay --list
+#                                                   python -m <package>.replay --turn 1712345678901 --runs 5
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from . import config
+from . import state
+from .flight_recorder import load_turns, recorder
+from .log import setup_logging, shutdown_logging
+from .playback import PcmPlayer
+from .skill_registry import SkillRegistry
+from .standins import FakeChatServer, FakeOutputStream, FakeTTSClient, NullIntentClassifier
+
+FRAME_BYTES = 2
+
+
+def _events(turn, kind):
+    return [e for e in turn["events"] if e["kind"] == kind]
+
+def _first(turn, kind):
+    found = _events(turn, kind)
+    return found[0] if found else None
+
+
+def summarize(turn):
+    """The timings (seconds) worth comparing between a recorded turn and its replay."""
+    timings = {}
+    end = _first(turn, "end_of_utterance")
+    if end and end.get("silence_s") is not None:
+        timings["end-of-utterance silence"] = end["silence_s"]
+    router = _first(turn, "router")
+    if router:
+        timings["router"] = router["seconds"]
+    skill = _first(turn, "skill_result")
+    if skill:
+        timings["skill"] = skill["seconds"]
+    llm = _first(turn, "llm")
+    if llm and llm["token_times"]:
+        timings["LLM first token"] = llm["token_times"][0]
+        timings["LLM last token"] = llm["token_times"][-1]
+    tts = _events(turn, "tts")
+    if tts and tts[0].get("first_chunk_s") is not None:
+        timings["TTS first chunk"] = tts[0]["first_chunk_s"]
+    command = _first(turn, "command")
+    if command:
+        first_sample = _first(turn, "tts_first_sample")
+        if first_sample:
+            timings["command -> first sample"] = first_sample["t"] - command["t"]
+        speech_end = _first(turn, "speech_end")
+        if speech_end:
+            timings["command -> speech end"] = speech_end["t"] - command["t"]
+    return timings
+
+
+def describe(turn_id, turn):
+    command = _first(turn, "command")
+    router = _first(turn, "router")
+    session = (_first(turn, "turn_start") or command or {}).get("session", "local") # Server mode records one per client
+    intent = router["result"].get("intent") if router else "-"
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(turn_id / 1000))
+    audio_s = len(turn["audio"]) / FRAME_BYTES / config.SAMPLE_RATE
+    total = summarize(turn).get("command -> speech end")
+    total = f"{total:.2f}s" if total is not None else "-"
+    return f"{turn_id}  {started}  {session:<10} audio {audio_s:4.1f}s  {intent:<17} {total:>7}  {command['text'] if command else '-'}"
+
+
+# --- END OF UTTERANCE: the capture loop's VAD + endpointer over the recorded audio ---
+def replay_endpoint(turn):
+    """Returns (silence_s, reason) at which the recorded audio ends the command, or None."""
+    import webrtcvad
+    from .endpointer import AdaptiveEndpointer
+    from .main import AudioHandler
+
+    start = _first(turn, "turn_start")
+    endpointer = AdaptiveEndpointer(complete_phrases=AudioHandler.CANCEL_COMMANDS | AudioHandler.CONFIRM_COMMANDS, stats_path="")
+    for pause in (start or {}).get("pauses", []):
+        endpointer.observe_pause(pause)
+    vad = webrtcvad.Vad(AudioHandler.VAD_AGGRESSIVENESS)
+    frame_s = AudioHandler.VAD_FRAME_DURATION_MS / 1000
+    frame_bytes = int(config.SAMPLE_RATE * frame_s) * FRAME_BYTES
+
+    # Interim transcripts arrive at their recorded offsets from the first captured frame
+    transcripts = [(e["t"] - turn["audio_started"], e["text"]) for e in _events(turn, "transcript")]
+    transcript = ""
+    voice = silence = 0
+    audio = bytes(turn["audio"])
+    for i in range(len(audio) // frame_bytes):
+        now = (i + 1) * frame_s
+        while transcripts and transcripts[0][0] <= now:
+            transcript = transcripts.pop(0)[1]
+        if vad.is_speech(audio[i * frame_bytes:(i + 1) * frame_bytes], config.SAMPLE_RATE):
+            if voice > 0 and silence > 0:
+                endpointer.observe_pause(silence * frame_s)
+            silence = 0
+            voice += 1
+        else:
+            silence += 1
+            window_s, reason = endpointer.window(transcript)
+            if voice > 0 and silence * frame_s >= window_s:
+                return silence * frame_s, reason
+    return None
+
+
+# --- RESPONDER AND SPEAKER: recorded router, LLM, skill and TTS timings from stand-ins ---
+def _stand_in_skills(turn):
+    registry = SkillRegistry()
+    call, result, router = _first(turn, "skill_call"), _first(turn, "skill_result"), _first(turn, "router")
+    if call and result and router:
+        @registry.skill(call["skill"], intents=[router["result"].get("intent")], timeout_s=max(10.0, result["seconds"] * 2))
+        def recorded_skill(slots, ctx):
+            ctx.sleep(result["seconds"])
+            return result["reply"]
+    return registry
+
+
+def replay_pipeline(turn, runs, directory):
+    from . import main
+    from .answer_cache import AnswerCache
+
+    config.ANSWER_CACHE_SEMANTIC = False # Exact-match cache only: no model download, no background load
+    router = _first(turn, "router")
+    llm = _first(turn, "llm") or {"tokens": [], "token_times": []}
+    server = FakeChatServer(router_reply=lambda query: router["result"] if router else {"intent": "GENERAL_QUERY", "slots": {"query": query}},
+                            router_delay=router["seconds"] if router else 0.0,
+                            tokens=llm["tokens"], token_times=llm["token_times"]).start()
+    tts = FakeTTSClient(timings={e["text"]: (e["first_chunk_s"] or 0.0, e["seconds"], e["bytes"]) for e in _events(turn, "tts")})
+
+    main.SKILLS = _stand_in_skills(turn)
+    responder = main.FireworksResponder()
+    responder.url = server.url
+    responder.intent_classifier = NullIntentClassifier() # Every command takes the recorded router time
+    speaker = main.ElevenLabsSpeaker(client=tts, player=PcmPlayer(sample_rate=config.TTS_SAMPLE_RATE, open_output=FakeOutputStream))
+    responder.start()
+    speaker.start()
+
+    idle = threading.Event()
+    state.state_machine.subscribe(lambda previous, new: new == state.AssistantState.IDLE and idle.set())
+    recorder.start(directory)
+    command = _first(turn, "command")
+    cached = _first(turn, "answer_cache")
+
+    replayed = []
+    for _ in range(runs):
+        responder.answer_cache = AnswerCache()
+        if cached:
+            responder.answer_cache.store(cached["query"], cached["sentences"])
+        state.state_machine.reset(reason="replay")
+        idle.clear()
+        turn_id = recorder.begin_turn()
+        state.command_queue.put(command["text"])
+        if not idle.wait(timeout=120):
+            print(f"[Replay] Turn {turn_id} did not finish.")
+        recorder.flush()
+        replayed.append(load_turns(directory).get(turn_id))
+    server.stop()
+    return [r for r in replayed if r]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List or replay turns from the flight recorder.")
+    parser.add_argument("--dir", default=config.FLIGHT_RECORDER_DIR)
+    parser.add_argument("--list", action="store_true", help="List the recorded turns.")
+    parser.add_argument("--turn", type=int, help="Turn id to replay (default: the slowest recorded turn).")
+    parser.add_argument("--runs", type=int, default=3, help="Replays of the turn, to check they agree.")
+    args = parser.parse_args(argv)
+    setup_logging()
+    try:
+        turns = load_turns(args.dir)
+        if not turns:
+            print(f"[Replay] No recorded turns in {args.dir} (set FLIGHT_RECORDER_ENABLED = True).")
+            return 1
+        if args.list:
+            for turn_id in sorted(turns):
+                print(describe(turn_id, turns[turn_id]))
+            return 0
+
+        if args.turn is None:
+            args.turn = max(turns, key=lambda t: summarize(turns[t]).get("command -> speech end", 0.0))
+        turn = turns.get(args.turn)
+        if turn is None or not _first(turn, "command"):
+            print(f"[Replay] Turn {args.turn} is not on disk or has no command.")
+            return 1
+        print(describe(args.turn, turn))
+
+        recorded = summarize(turn)
+        endpoint = None
+        if turn["audio"]:
+            try:
+                endpoint = replay_endpoint(turn)
+                if endpoint:
+                    print(f"end of utterance (replayed VAD + endpointer): {endpoint[0]:.2f}s of silence ({endpoint[1]})")
+            except ImportError as e:
+                print(f"[Replay] Skipping end-of-utterance replay: {e}")
+
+        with tempfile.TemporaryDirectory() as directory:
+            replays = [summarize(r) for r in replay_pipeline(turn, args.runs, directory)]
+        if endpoint:
+            for replayed in replays:
+                replayed["end-of-utterance silence"] = endpoint[0]
+
+        print(f"\n{'timing':<26} {'recorded':>9} {'replay p50':>11} {'spread':>8}")
+        for name, value in recorded.items():
+            values = [r[name] for r in replays if name in r]
+            if values:
+                print(f"{name:<26} {value:>8.3f}s {statistics.median(values):>10.3f}s {max(values) - min(values):>7.3f}s")
+            else:
+                print(f"{name:<26} {value:>8.3f}s {'-':>11} {'-':>8}")
+        return 0
+    finally:
+        shutdown_logging()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
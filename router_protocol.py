@@ -0,0 +1,117 @@
+# router_protocol.py (Compact, versioned structured-output protocol for the intent router)
+import json
+
+from .skills import INTENT_DEFINITIONS
+
+# Bump when INTENT_DEFINITIONS changes shape, so logged decisions can be told apart.
+ROUTER_SCHEMA_VERSION = "v1"
+
+
+class RouterParseError(ValueError):
+    """The router reply is not valid JSON or does not match the intent schema."""
+
+
+def _slot_spec(spec):
+    """Returns (allowed_values_or_None, optional)."""
+    if isinstance(spec, list):
+        return spec, False
+    return None, spec.endswith("?")
+
+
+# --- SCHEMA (Constrains the model's output) ---
+def build_router_schema():
+    """JSON schema with one branch per intent, generated from INTENT_DEFINITIONS."""
+    branches = []
+    for intent, definition in INTENT_DEFINITIONS.items():
+        properties, required = {}, []
+        for slot, spec in definition["slots"].items():
+            allowed, optional = _slot_spec(spec)
+            properties[slot] = {"enum": allowed} if allowed else {"type": ["string", "null"]}
+            if not optional:
+                required.append(slot)
+        branches.append({
+            "type": "object",
+            "properties": {
+                "intent": {"const": intent},
+                "slots": {"type": "object", "properties": properties, "required": required, "additionalProperties": False},
+            },
+            "required": ["intent", "slots"],
+        })
+    return {"anyOf": branches}
+
+
+# --- PROMPT (One line per intent instead of prose and examples) ---
+def build_router_prompt():
+    lines = [
+        f"Route the user's voice command. Reply with JSON only: {{\"intent\": ..., \"slots\": {{...}}}} (schema {ROUTER_SCHEMA_VERSION}).",
+    ]
+    for intent, definition in INTENT_DEFINITIONS.items():
+        slot_text = []
+        for slot, spec in definition["slots"].items():
+            allowed, optional = _slot_spec(spec)
+            name = slot + ("?" if optional else "")
+            slot_text.append(f"{name}={'|'.join(allowed)}" if allowed else name)
+        suffix = f" slots: {', '.join(slot_text)}" if slot_text else " slots: {}"
+        lines.append(f"{intent}: {definition['description']}.{suffix}")
+    return "\n".join(lines)
+
+
+ROUTER_PROMPT = build_router_prompt()
+ROUTER_SCHEMA = build_router_schema()
+ROUTER_RESPONSE_FORMAT = {"type": "json_object", "schema": ROUTER_SCHEMA}
+
+
+# --- VALIDATING PARSER ---
+def _extract_json_object(raw):
+    text = raw.strip()
+    if not text.startswith("{"):
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            raise RouterParseError(f"No JSON object in router reply: {raw[:80]!r}")
+        text = text[start:end + 1]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise RouterParseError(f"Invalid JSON from router: {e}") from e
+
+def parse_router_reply(raw, query):
+    """
+    Parses and validates a router reply against INTENT_DEFINITIONS.
+    Unknown slots are dropped, "None"/"" become None, and intents without
+    slots get the original query filled in. Raises RouterParseError.
+    """
+    data = _extract_json_object(raw)
+    if not isinstance(data, dict):
+        raise RouterParseError("Router reply is not a JSON object.")
+
+    intent = data.get("intent")
+    definition = INTENT_DEFINITIONS.get(intent)
+    if definition is None:
+        raise RouterParseError(f"Unknown intent: {intent!r}")
+
+    raw_slots = data.get("slots") or {}
+    if not isinstance(raw_slots, dict):
+        raise RouterParseError("'slots' is not an object.")
+
+    slots = {}
+    for slot, spec in definition["slots"].items():
+        allowed, optional = _slot_spec(spec)
+        value = raw_slots.get(slot)
+        if value in ("", "None", "null"):
+            value = None
+        if value is None:
+            if not optional and not allowed:
+                # Missing free-text slots are legal: the dialogue asks for them (e.g. WhatsApp contact)
+                slots[slot] = ""
+                continue
+            if allowed:
+                raise RouterParseError(f"{intent} is missing '{slot}'.")
+            slots[slot] = None
+            continue
+        if allowed and value not in allowed:
+            raise RouterParseError(f"{intent}.{slot}={value!r} is not one of {allowed}.")
+        slots[slot] = value if allowed else str(value)
+
+    if not definition["slots"]:
+        slots["query"] = raw_slots.get("query") or query
+    return {"intent": intent, "slots": slots}
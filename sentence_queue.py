@@ -0,0 +1,131 @@
+# sentence_queue.py (Bounded sentence queue from the responder to the speaker, framed per turn)
+import collections
+import queue
+import threading
+import time
+import weakref
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("sentences")
+
+
+class EndOfTurn:
+    """The last item of a turn on the sentence queue: the speaker drains playback and goes IDLE."""
+    __slots__ = ("turn",)
+
+    def __init__(self, turn):
+        self.turn = turn
+
+    def __repr__(self):
+        return "EndOfTurn()"
+
+
+class SentenceQueue:
+    """
+    Sentences (and templated replies) waiting for the speaker, at most
+    TTS_SENTENCE_QUEUE_SIZE of them.
+
+    put() is the backpressure point: while the queue is full the responder
+    waits, so it reads the LLM stream no faster than the speaker plays it. The
+    wait ends early when the turn is cancelled (barge-in flushes the queue
+    anyway), and after TTS_SENTENCE_PUT_TIMEOUT_S the sentence is dropped and
+    counted: a stuck speaker must not stall the responder forever.
+
+    end_turn() frames a turn. It never blocks and its marker is never dropped
+    for lack of room, but a turn can only be ended once: a second end_turn()
+    for the same turn is ignored and counted, so markers cannot pile up.
+    """
+    def __init__(self, maxsize=None, put_timeout_s=None):
+        self.maxsize = maxsize or config.TTS_SENTENCE_QUEUE_SIZE
+        self.put_timeout_s = config.TTS_SENTENCE_PUT_TIMEOUT_S if put_timeout_s is None else put_timeout_s
+        self._items = collections.deque()
+        self._sentences = 0 # Items in _items that are not EndOfTurn markers
+        self._cond = threading.Condition()
+        self._ended = weakref.WeakSet() # Turns that already have their end marker
+        self.closed = False
+        self.counts = collections.Counter() # result -> items (queued/waited/dropped/ended/duplicate_end)
+
+    def put(self, sentence, turn=None, timeout=None):
+        """Queues a sentence, waiting while the queue is full. Returns False if it was dropped."""
+        timeout = self.put_timeout_s if timeout is None else timeout
+        with self._cond:
+            if self._sentences >= self.maxsize:
+                started = time.monotonic()
+                deadline = started + timeout
+                while self._sentences >= self.maxsize:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (turn is not None and turn.is_cancelled()):
+                        self.counts["dropped"] += 1
+                        metrics.QUEUE_OVERFLOWS.inc(queue="tts_sentence_queue", policy="drop_newest")
+                        if remaining <= 0:
+                            logger.warning("⚠️ Speaker has not taken a sentence for %ss. Dropped: %s", timeout, sentence)
+                        return False
+                    self._cond.wait(min(remaining, 0.1)) # Short waits: a cancelled turn stops waiting promptly
+                self.counts["waited"] += 1
+                metrics.QUEUE_BACKPRESSURE.observe(time.monotonic() - started, queue="tts_sentence_queue")
+            self._items.append(sentence)
+            self._sentences += 1
+            self.counts["queued"] += 1
+            self._cond.notify_all()
+            return True
+
+    def end_turn(self, turn):
+        """Queues the end-of-turn marker for `turn`, once. Returns False for a duplicate."""
+        with self._cond:
+            if turn in self._ended:
+                self.counts["duplicate_end"] += 1
+                metrics.TURN_ENDS.inc(result="duplicate")
+                logger.warning("⚠️ Turn already ended; ignoring a second end-of-turn marker.")
+                return False
+            self._ended.add(turn)
+            self._items.append(EndOfTurn(turn))
+            self.counts["ended"] += 1
+            metrics.TURN_ENDS.inc(result="queued")
+            self._cond.notify_all()
+            return True
+
+    def get(self, block=True, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if not block:
+                    raise queue.Empty
+                if self.closed:
+                    return None
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self._cond.wait(remaining)
+            item = self._items.popleft()
+            if not isinstance(item, EndOfTurn):
+                self._sentences -= 1
+            self._cond.notify_all() # Room for a waiting put()
+            return item
+
+    def drop_sentences(self):
+        """Drops the pending sentences but keeps end-of-turn markers (a turn cannot be ended twice). Returns the number dropped."""
+        with self._cond:
+            dropped = self._sentences
+            self._items = collections.deque(item for item in self._items if isinstance(item, EndOfTurn))
+            self._sentences = 0
+            self._cond.notify_all()
+            return dropped
+
+    def close(self):
+        """Wakes the speaker: once the queue is empty, a blocking get() returns None (the session ended)."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
@@ -0,0 +1,565 @@
+# server.py (Server mode: the voice pipeline as a service, one isolated session per WebSocket client)
+# Run as a module from the parent directory, e.g.:  python -m <package>.server --port 8765
+# Load test:                                         python -m <package>.bench server --target-p95 2.5
+#
+# One WebSocket per client (a room's microphone and speaker, a phone...):
+#   client -> server  binary  microphone audio, 16-bit mono PCM at SAMPLE_RATE, streamed continuously
+#                     text    {"type": "wake"}: the client heard the wake word (or a push-to-talk button): barge in and listen
+#                             {"type": "text", "text": "..."}: a typed command
+#   server -> client  binary  reply audio, 16-bit mono PCM at TTS_SAMPLE_RATE, sent in real time as it plays
+#                     text    {"type": "ready", ...} once, {"type": "state", "state": ...} on every AssistantState change,
+#                             {"type": "heard", "text": ...} at the end of each utterance
+# The wake word runs on the client (Porcupine is licensed per device); audio that arrives while the
+# session is not listening is dropped, and reply audio is only paced out while there is some, so an
+# idle client costs the server a socket and a few threads that sleep until it speaks.
+import argparse
+import base64
+import hashlib
+import itertools
+import json
+import socketserver
+import struct
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+import requests
+import webrtcvad
+from requests.adapters import HTTPAdapter
+
+from . import config
+from . import metrics
+from . import skills
+from . import spotify_api
+from . import state
+from .answer_cache import AnswerCache
+from .endpointer import AdaptiveEndpointer
+from .flight_recorder import recorder
+from .intent_classifier import IntentClassifier
+from .log import get_logger, setup_logging, shutdown_logging
+from .main import AudioHandler, ElevenLabsSpeaker, FireworksResponder, barge_in
+from .playback import PcmPlayer
+from .skills import match_dialogue_reply
+from .startup import StartupOrchestrator
+from .transcribers import TranscriberFailover
+from .tts_engines import create_elevenlabs_client, create_local_tts
+
+logger = get_logger("server")
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+# --- WEBSOCKET (Server side, standard library only) ---
+class WebSocketConnection:
+    """One client's WebSocket (RFC 6455) on a socketserver stream handler. Sends are thread-safe."""
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.target = None # Request target of the handshake ("/?name=kitchen")
+        self.closed = False
+        self._key = None
+        self._send_lock = threading.Lock()
+
+    def handshake(self):
+        """Reads the opening handshake. Returns False (after answering 400) if it is not a WebSocket upgrade."""
+        request_line = self.rfile.readline().decode("latin-1")
+        headers = {}
+        while True:
+            line = self.rfile.readline().decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        parts = request_line.split()
+        self._key = headers.get("sec-websocket-key")
+        if len(parts) < 2 or not self._key or headers.get("upgrade", "").lower() != "websocket":
+            self.refuse("400 Bad Request")
+            return False
+        self.target = parts[1]
+        return True
+
+    def accept(self):
+        accept = base64.b64encode(hashlib.sha1((self._key + _WS_GUID).encode()).digest()).decode()
+        self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+    def refuse(self, status):
+        self.closed = True
+        try:
+            self.wfile.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        except OSError:
+            pass
+
+    def receive(self):
+        """The next message: str (text) or bytes (binary). None once the client has closed the connection."""
+        message, opcode = b"", None
+        while True:
+            try:
+                frame = self._read_frame()
+            except OSError:
+                frame = None
+            if frame is None:
+                self.closed = True
+                return None
+            fin, frame_opcode, payload = frame
+            if frame_opcode == 0x8: # Close
+                self._send_frame(0x8, payload[:2])
+                self.closed = True
+                return None
+            if frame_opcode == 0x9: # Ping
+                self._send_frame(0xA, payload)
+                continue
+            if frame_opcode == 0xA: # Pong
+                continue
+            if frame_opcode: # 0 continues a fragmented message
+                opcode = frame_opcode
+            message += payload
+            if fin:
+                return message.decode("utf-8") if opcode == 0x1 else message
+
+    def send_json(self, obj):
+        self._send_frame(0x1, json.dumps(obj).encode())
+
+    def send_audio(self, pcm):
+        self._send_frame(0x2, pcm)
+
+    def close(self):
+        if not self.closed:
+            self._send_frame(0x8, struct.pack(">H", 1000))
+            self.closed = True
+
+    def _read_frame(self):
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        fin, opcode = header[0] & 0x80, header[0] & 0x0F
+        masked, length = header[1] & 0x80, header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if masked else None
+        payload = self.rfile.read(length)
+        if len(payload) < length:
+            return None
+        if mask:
+            key = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+        return fin, opcode, payload
+
+    def _send_frame(self, opcode, payload):
+        if self.closed:
+            return
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            try:
+                self.wfile.write(header + payload)
+            except OSError:
+                self.closed = True
+
+
+class ClientAudioOutput:
+    """
+    PcmPlayer's output stream for a remote client: while the player has audio
+    buffered, pulls a block every PLAYBACK_BLOCK_MS, the way a sound card does,
+    and sends every block, silent ones included (pauses between sentences are
+    part of the reply). The jitter buffer, stop() within one block and the
+    first-sample marks work as on the desktop. Once the buffer is empty the
+    pacing thread sleeps until the player's next write() wakes it.
+    """
+    def __init__(self, client, player, sample_rate, frames_per_buffer, callback):
+        self.client = client
+        self.player = player
+        self.callback = callback
+        self.frames_per_buffer = frames_per_buffer
+        self.period = frames_per_buffer / sample_rate
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        # Bound to the session: first-sample marks fire on this thread and are recorded under it
+        threading.Thread(target=client.session.bind(self._run), name=f"output-{client.name}", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            next_at = time.perf_counter()
+            while not self._closed.is_set() and self.player.buffered_seconds() > 0:
+                self.client.on_reply_audio(self.callback(self.frames_per_buffer))
+                next_at += self.period
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+            if self._closed.is_set():
+                return
+
+    def wake(self):
+        """Called by PcmPlayer.write(): there is audio to pace out."""
+        self._wake.set()
+
+    def is_active(self):
+        return not self._closed.is_set()
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+
+
+# --- ONE CLIENT ---
+class ClientSession:
+    """
+    One connected client. Owns a state.Session (state machine, command and
+    sentence queues, turn token, dialogue, follow-up window) and the workers
+    that serve it: a responder, a speaker whose output goes back over the
+    socket, and the listening pipeline (VAD, adaptive endpointer, transcriber)
+    fed by the client's audio on the connection thread. All of them run with
+    the session current, so the code shared with the desktop assistant sees
+    this client's state only.
+    """
+    PAUSE_THRESHOLD_S = 2.0 # As AudioHandler.pause_threshold: fallback end of utterance after the last transcript
+
+    def __init__(self, server, connection, name):
+        self.server = server
+        self.connection = connection
+        self.name = name
+        self.session = state.Session(name)
+
+        self.vad = webrtcvad.Vad(AudioHandler.VAD_AGGRESSIVENESS)
+        self.vad_frame_ms = AudioHandler.VAD_FRAME_DURATION_MS
+        self.vad_frame_bytes = int(config.SAMPLE_RATE * self.vad_frame_ms / 1000) * 2
+        self.max_silence_frames = int(1000 / self.vad_frame_ms) * 1.5
+        # Pause statistics are learned per client, in memory (ENDPOINT_STATS_PATH is the desktop user's)
+        self.endpointer = AdaptiveEndpointer(complete_phrases=AudioHandler.CANCEL_COMMANDS | AudioHandler.CONFIRM_COMMANDS, stats_path="")
+        self.failover = TranscriberFailover(on_text=self._on_transcript, url=server.transcriber_url)
+        self.transcriber = None
+        self.first_speech_time = None
+        self.transcript = ""
+        self.last_transcript_time = None
+        self.heard_at = None # perf_counter at the end of the last utterance, until the first reply audio is sent
+        self._reset_vad()
+
+        self.responder = FireworksResponder(http=server.http, intent_classifier=server.intent_classifier, answer_cache=server.answer_cache)
+        if server.fireworks_url:
+            self.responder.url = server.fireworks_url
+        player = PcmPlayer(open_output=lambda rate, frames, callback: ClientAudioOutput(self, player, rate, frames, callback))
+        self.speaker = ElevenLabsSpeaker(client=server.tts_client, player=player, local_tts=server.local_tts)
+
+        self.session.listening_interface['start_transcriber'] = self._start_transcriber
+        self.session.listening_interface['stop_transcriber'] = self._stop_transcriber
+        self.session.state_machine.subscribe(lambda previous, new: self.connection.send_json({"type": "state", "state": new}))
+
+    def serve(self):
+        """Runs on the connection's thread until the client disconnects."""
+        self.connection.send_json({"type": "ready", "session": self.name, "sample_rate": config.SAMPLE_RATE,
+                                   "tts_sample_rate": self.speaker.player.sample_rate})
+        self.session.start(self.responder)
+        self.session.start(self.speaker)
+        try:
+            self.session.bind(self._receive_loop)()
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop_transcriber()
+        self.speaker.stop_playback()
+        self.session.close() # The responder and the speaker (and with it the output) stop
+        self.connection.close()
+
+    def _receive_loop(self):
+        while True:
+            message = self.connection.receive()
+            if message is None:
+                return
+            try:
+                if isinstance(message, bytes):
+                    self._on_audio(message)
+                else:
+                    self._on_control(message)
+            except Exception as e:
+                logger.exception("Unexpected error in session '%s': %s", self.name, e)
+                state.state_machine.reset(reason="session error")
+                state.follow_up.close("interrupted")
+                self._stop_transcriber()
+
+    # --- Transcriber ---
+    def _start_transcriber(self):
+        self.first_speech_time = None
+        self.transcriber = self.failover.open_session()
+        return self.transcriber is not None
+
+    def _stop_transcriber(self):
+        if self.transcriber:
+            self.transcriber.stop()
+            self.transcriber = None
+
+    def _send_frame(self, frame):
+        if self.transcriber:
+            if self.first_speech_time is None:
+                self.first_speech_time = time.time()
+            self.transcriber.send(frame)
+
+    def _on_transcript(self, transcript):
+        if self.first_speech_time and self.last_transcript_time is None and self.transcriber:
+            self.failover.report_latency(self.transcriber, time.time() - self.first_speech_time)
+        self.transcript = transcript
+        self.last_transcript_time = time.time()
+
+    def _reset_vad(self):
+        self.vad_buffer = b""
+        self.voice_frames = 0
+        self.silence_frames = 0
+
+    # --- Client messages ---
+    def _on_control(self, text):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            logger.warning("Session '%s' sent a message that is not JSON; ignored.", self.name)
+            return
+        kind = message.get("type")
+        if kind == "wake":
+            self._on_wake()
+        elif kind == "text" and str(message.get("text", "")).strip():
+            # A typed command ends any listening, e.g. the follow-up window of a dialogue prompt
+            self._stop_transcriber()
+            self._reset_vad()
+            state.state_machine.transition(state.AssistantState.THINKING, expected={state.AssistantState.LISTENING}, reason="typed command")
+            recorder.begin_turn(typed=True)
+            self._on_command(str(message["text"]).strip().lower())
+        else:
+            logger.warning("Session '%s' sent an unknown message type: %s", self.name, kind)
+
+    def _on_wake(self):
+        S = state.AssistantState
+        logger.info("🚨 Wake word from '%s'.", self.name)
+        barge_in(self.speaker)
+        self._stop_transcriber()
+        self.transcript = ""
+        self.last_transcript_time = None
+        state.interruption_event.clear()
+        recorder.begin_turn(pauses=list(self.endpointer.pauses))
+        if not self._start_transcriber():
+            logger.error("No transcriber available for '%s'. Returning to idle.", self.name)
+            state.state_machine.transition(S.IDLE, expected={S.SPEAKING}, reason="no transcriber")
+        elif state.state_machine.transition(S.LISTENING, expected={S.IDLE, S.SPEAKING}, reason="wake word"):
+            self._reset_vad()
+        else:
+            # A queued command started THINKING while we connected
+            self._stop_transcriber()
+
+    def _on_audio(self, pcm):
+        S = state.AssistantState
+        if state.state_machine.current != S.LISTENING:
+            return
+        if self.transcriber is None:
+            # The speaker handed over after a dialogue prompt: listen for the answer without the wake word
+            if not state.follow_up.is_open():
+                return
+            self.transcript = ""
+            self.last_transcript_time = None
+            recorder.begin_turn(pauses=list(self.endpointer.pauses))
+            if not self._start_transcriber():
+                state.follow_up.close("timeout")
+                state.state_machine.transition(S.IDLE, expected={S.LISTENING}, reason="no transcriber")
+                return
+            self._reset_vad()
+        if self.voice_frames == 0 and state.follow_up.expired():
+            self._stop_transcriber()
+            state.follow_up.close("timeout")
+            recorder.event("end_of_utterance", text="", reason="follow-up timeout")
+            state.state_machine.transition(S.IDLE, expected={S.LISTENING}, reason="follow-up timeout")
+            return
+
+        self.vad_buffer += pcm
+        while len(self.vad_buffer) >= self.vad_frame_bytes:
+            frame, self.vad_buffer = self.vad_buffer[:self.vad_frame_bytes], self.vad_buffer[self.vad_frame_bytes:]
+            recorder.audio(frame)
+            if self.vad.is_speech(frame, config.SAMPLE_RATE):
+                if self.voice_frames > 0 and self.silence_frames > 0:
+                    self.endpointer.observe_pause(self.silence_frames * self.vad_frame_ms / 1000)
+                self.silence_frames = 0
+                self.voice_frames += 1
+                self._send_frame(frame)
+                continue
+            self.silence_frames += 1
+            if self.voice_frames > 0 and self.silence_frames <= self.max_silence_frames:
+                self._send_frame(frame)
+            silence_s = self.silence_frames * self.vad_frame_ms / 1000
+            window_s, reason = self.endpointer.window(self.transcript)
+            if self.voice_frames > 0 and silence_s >= window_s:
+                self.endpointer.end_utterance(silence_s, reason)
+                self._end_utterance("silence")
+                return
+
+        # Fallback if the VAD never hears the silence (e.g. background noise)
+        if self.last_transcript_time and time.time() - self.last_transcript_time > self.PAUSE_THRESHOLD_S + self.endpointer.window(self.transcript)[0]:
+            self._end_utterance("timeout")
+
+    def _end_utterance(self, reason):
+        S = state.AssistantState
+        self._stop_transcriber()
+        text = self.transcript.strip().lower()
+        self.transcript = ""
+        self.last_transcript_time = None
+        self._reset_vad()
+        recorder.event("end_of_utterance", text=text, reason=reason)
+        if not text:
+            state.follow_up.close("timeout")
+            state.state_machine.transition(S.IDLE, expected={S.LISTENING}, reason=reason)
+            return
+        logger.info("💬 '%s' said: %s", self.name, text)
+        self.connection.send_json({"type": "heard", "text": text})
+        state.state_machine.transition(S.THINKING, expected={S.LISTENING}, reason="command heard")
+        self._on_command(text)
+
+    def _on_command(self, text):
+        state.follow_up.close("answered")
+        self.heard_at = time.perf_counter()
+        dialogue = state.DIALOGUE_CONTEXT
+        if dialogue['active'] and dialogue['slots'].get('awaiting_confirmation') and match_dialogue_reply(text) == "CONFIRM":
+            text = "CONFIRM_SEND"
+        state.command_queue.put(text)
+
+    def on_reply_audio(self, block):
+        """From the output thread: a block of reply audio is playing."""
+        heard_at, self.heard_at = self.heard_at, None
+        if heard_at is not None:
+            metrics.SERVER_REPLY_LATENCY.observe(time.perf_counter() - heard_at)
+        self.connection.send_audio(block)
+
+
+# --- SERVER ---
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class AssistantServer:
+    """
+    Accepts clients on a local WebSocket and gives each one a ClientSession,
+    at most `max_sessions` (SERVER_MAX_SESSIONS) at a time.
+
+    Shared by every session: one pooled HTTP session to Fireworks (sized so
+    each concurrent session keeps its connection), the intent classifier, the
+    answer cache, the TTS clients and the skill pools. Per session: the state
+    machine, queues, dialogue and follow-up window (state.Session), the
+    conversation memory, the endpointer's pause statistics and the transcriber.
+    """
+    def __init__(self, host=None, port=None, max_sessions=None, tts_client=None, local_tts=None,
+                 intent_classifier=None, fireworks_url=None, transcriber_url=None):
+        self.max_sessions = max_sessions or config.SERVER_MAX_SESSIONS
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=self.max_sessions)
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+        self.intent_classifier = IntentClassifier() if intent_classifier is None else intent_classifier
+        self.answer_cache = AnswerCache()
+        self.tts_client = tts_client
+        self.local_tts = local_tts
+        self.fireworks_url = fireworks_url # Overrides FIREWORKS_URL (stand-ins)
+        self.transcriber_url = transcriber_url
+        self.sessions = {} # name -> ClientSession
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        host = config.SERVER_HOST if host is None else host
+        port = config.SERVER_PORT if port is None else port
+        self._server = _ThreadingServer((host, port), self._make_handler())
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"ws://{host}:{port}/"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="server", daemon=True).start()
+        logger.info("🛰️ Server mode: listening on %s (at most %d sessions).", self.url, self.max_sessions)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        for client in list(self.sessions.values()):
+            client.close()
+
+    def _admit(self, connection):
+        """A ClientSession for the connection, or None when the server is full."""
+        requested = parse_qs(urlparse(connection.target).query).get("name", [""])[0]
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions:
+                metrics.SERVER_CONNECTIONS.inc(result="refused")
+                logger.warning("⚠️ Server full (%d sessions); refused a client.", self.max_sessions)
+                return None
+            name = requested or f"client-{next(self._ids)}"
+            if name in self.sessions:
+                name = f"{name}-{next(self._ids)}"
+            client = self.sessions[name] = ClientSession(self, connection, name)
+            metrics.SERVER_SESSIONS.set(len(self.sessions))
+        metrics.SERVER_CONNECTIONS.inc(result="accepted")
+        logger.info("🔌 Session '%s' connected (%d active).", name, len(self.sessions))
+        return client
+
+    def _release(self, client):
+        with self._lock:
+            self.sessions.pop(client.name, None)
+            metrics.SERVER_SESSIONS.set(len(self.sessions))
+        metrics.SERVER_CONNECTIONS.inc(result="closed")
+        logger.info("🔌 Session '%s' disconnected (%d active).", client.name, len(self.sessions))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                connection = WebSocketConnection(self.rfile, self.wfile)
+                if not connection.handshake():
+                    return
+                client = server._admit(connection)
+                if client is None:
+                    connection.refuse("503 Service Unavailable")
+                    return
+                try:
+                    connection.accept()
+                    client.serve()
+                finally:
+                    server._release(client)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the voice assistant to WebSocket clients, one isolated session each.")
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=config.SERVER_MAX_SESSIONS)
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    if not (config.FIREWORKS_API_KEY and config.ELEVENLABS_API_KEY):
+        logger.critical("CRITICAL ERROR: Please ensure FIREWORKS_API_KEY and ELEVENLABS_API_KEY in config.py are set correctly.")
+        shutdown_logging()
+        return 1
+
+    server = AssistantServer(args.host, args.port, args.max_sessions,
+                             tts_client=create_elevenlabs_client(config.ELEVENLABS_API_KEY), local_tts=create_local_tts())
+    startup = StartupOrchestrator(process_started=time.perf_counter())
+    startup.background("spotify", spotify_api.get_spotify_client, on_done=lambda client: setattr(spotify_api, "SPOTIFY_CLIENT", client))
+    startup.background("skill_imports", skills.preload)
+    metrics.register_health_check("spotify_api", lambda: spotify_api.SPOTIFY_CLIENT is not None, required=False)
+    metrics.start_metrics_server()
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Stopping server.")
+    server.stop()
+    shutdown_logging()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# skill_registry.py (Intent -> skill table with per-skill worker pools, timeouts and cancellation)
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .flight_recorder import recorder
+from .log import get_logger
+
+logger = get_logger("skills")
+
+
+class SkillCancelled(Exception):
+    """Raised inside a skill by SkillContext.sleep()/check() once its turn is cancelled or timed out."""
+
+
+class SkillContext:
+    """
+    Handed to every skill call: cancellation for the turn it belongs to, and
+    the result. The responder queues the context for the speaker in place of
+    the reply (or waits for it, while a dialogue is open). A skill never
+    changes the assistant state itself; it sets `outcome` (e.g. "sleep") for
+    the speaker to apply.
+    """
+    def __init__(self, turn):
+        self.turn = turn
+        self.cancelled = threading.Event()
+        self.done = threading.Event() # Set once the call has reported, or its turn was cancelled
+        self.reply = None
+        self.outcome = None
+        turn.register(self.cancelled.set) # Barge-in cancels the skill too
+        turn.register(self.done.set) # ...and ends the responder's wait()
+
+    def wait(self):
+        """Blocks until the skill replies, fails or times out; None if the turn was cancelled first."""
+        self.done.wait()
+        return None if self.turn.is_cancelled() else self.reply
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def check(self):
+        if self.cancelled.is_set():
+            raise SkillCancelled()
+
+    def sleep(self, seconds):
+        """time.sleep() that returns early, by raising SkillCancelled, when the turn is cancelled."""
+        if self.cancelled.wait(seconds):
+            raise SkillCancelled()
+
+
+class Skill:
+    def __init__(self, name, handler, pool, timeout_s, ends_dialogue):
+        self.name = name
+        self.handler = handler # handler(slots, ctx) -> reply text
+        self.pool = pool
+        self.timeout_s = timeout_s
+        self.ends_dialogue = ends_dialogue # Resets an open dialogue once it returns; False: the skill manages the dialogue
+
+
+class SkillRegistry:
+    """
+    Skills declare the intents (and optionally the slot actions) they serve.
+    Dispatch is a dict lookup on (intent, action), falling back to (intent, None).
+
+    Each skill runs on a worker pool (named after the skill unless it names a
+    shared one). Skills that share a single-worker pool run one at a time, e.g.
+    everything that drives the keyboard and mouse. A slow skill only delays its
+    own pool and the reply of the turn that called it: the responder queues
+    the call's context on the sentence queue and takes the next command, and
+    the speaker waits there for the reply, so replies are still spoken in turn
+    order. Only a skill that updates an open dialogue is waited for by the
+    responder, since the next command is read against that dialogue. A call
+    that outlives its timeout (counted from submission, so it includes waiting
+    for the pool) is reported, and its context is cancelled so a cooperative
+    skill stops; a late result is dropped.
+
+    The pools are shared by every session (server mode): a skill runs in a copy
+    of the submitting thread's context, so it sees the session that asked for it.
+    """
+    def __init__(self):
+        self.table = {}
+        self.pools = {}
+        self.pool_sizes = {}
+        self.skills = {}
+
+    def skill(self, name, intents, actions=None, pool=None, workers=1, timeout_s=10.0, ends_dialogue=True):
+        """Decorator registering `handler(slots, ctx)` for `intents` (and only `actions`, if given)."""
+        def register(handler):
+            skill = Skill(name, handler, pool or name, timeout_s, ends_dialogue)
+            self.pool_sizes.setdefault(skill.pool, workers)
+            self.skills[name] = skill
+            for intent in intents:
+                for action in (actions or (None,)):
+                    self.table[(intent, action)] = skill
+            return handler
+        return register
+
+    def get(self, intent, action=None):
+        return self.table.get((intent, action)) or self.table.get((intent, None))
+
+    def _executor(self, pool):
+        if pool not in self.pools:
+            self.pools[pool] = ThreadPoolExecutor(max_workers=self.pool_sizes.get(pool, 1), thread_name_prefix=f"skill-{pool}")
+        return self.pools[pool]
+
+    def submit(self, skill, slots, turn):
+        """
+        Runs the skill on its pool and returns its SkillContext immediately.
+        The call reports exactly once: with the skill's reply, a timeout/error
+        message, or None if the turn was cancelled. ctx.wait() returns it.
+        """
+        ctx = SkillContext(turn)
+        submitted = time.perf_counter()
+        recorder.event("skill_call", skill=skill.name, slots=slots)
+        reported = threading.Lock()
+
+        def report(reply, result):
+            if not reported.acquire(blocking=False):
+                return False
+            elapsed = time.perf_counter() - submitted
+            metrics.SKILL_LATENCY.observe(elapsed, skill=skill.name, result=result)
+            recorder.event("skill_result", skill=skill.name, result=result, reply=reply, seconds=round(elapsed, 4))
+            ctx.reply = reply
+            ctx.done.set()
+            return True
+
+        def call():
+            try:
+                ctx.check() # Cancelled or timed out while waiting for the pool
+                reply = skill.handler(slots, ctx)
+                if ctx.is_cancelled():
+                    raise SkillCancelled()
+            except SkillCancelled:
+                report(None, "cancelled")
+            except Exception as e:
+                logger.exception("Skill '%s' failed: %s", skill.name, e)
+                report(f"Sorry, something went wrong with the {skill.name} command.", "error")
+            else:
+                if not report(reply, "ok"):
+                    logger.info("Skill '%s' finished after its timeout; reply dropped: %s", skill.name, reply)
+            finally:
+                timer.cancel()
+
+        def on_timeout():
+            if report(f"The {skill.name} command is taking too long, so I stopped waiting.", "timeout"):
+                logger.warning("⚠️ Skill '%s' timed out after %ss.", skill.name, skill.timeout_s)
+                ctx.cancelled.set()
+
+        # One context copy each: a Context cannot be entered by two threads at once
+        timer = threading.Timer(skill.timeout_s, contextvars.copy_context().run, args=(on_timeout,))
+        timer.daemon = True
+        timer.start()
+        self._executor(skill.pool).submit(contextvars.copy_context().run, call)
+        return ctx
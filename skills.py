@@ -1,58 +1,190 @@
 import requests
 import json
 import time
-import pyautogui
+import importlib
 import webbrowser
-import screen_brightness_control as sbc
-from pynput.keyboard import Key, Controller
-import psutil
 from ctypes import cast, POINTER
-from comtypes import CLSCTX_ALL, CoInitialize, CoUninitialize 
-from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
 from . import config 
 from . import state 
+from . import metrics
+from . import spotify_api
+from .contacts import contact_index
+from .skill_registry import SkillRegistry
+from .log import get_logger
 
-# --- ROUTER PROMPT (Updated for 'sleep' action) ---
-ROUTER_PROMPT = """
-You are an Intent Router for a voice assistant. Your task is to analyze the user's query and classify their intent into one of the provided categories.
+logger = get_logger("skills")
 
-Output your response ONLY as a single JSON object. DO NOT include any explanatory text or markdown formatting.
 
-Available Intents:
-1. SEND_WHATSAPP: Use this if the user is asking to send a message to a person (e.g., "tell Bob I'll be late in 5 minutes").
-2. SYSTEM_CONTROL: Use this if the user is asking to control volume, screen brightness, check battery status, or **manage the overall desktop environment (minimize, maximize, switch apps, or tell the assistant to go to sleep)**.
-3. SPOTIFY_CONTROL: Use this if the user is asking to control Spotify music playback.
-4. LAUNCH_TARGET: Use this if the user is asking to open or search for any application or website.
-5. BROWSER_NAVIGATOR: Use this if the user is asking to perform an action *inside* the currently active web browser (e.g., "close this tab", "go back", "click the first link").
-6. GENERAL_QUERY: Use this for any question, fact retrieval, or general conversation.
-7. CONFIRM: Use this if the user is affirmatively confirming a previous step or action.
-8. CANCEL: Use this if the user is canceling the previous action or dialogue.
+# --- LAZY IMPORTS (GUI/OS automation libraries load on first use, not at startup) ---
+class _LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+    def __init__(self, name):
+        self._name = name
+        self._module = None
 
-Output Schema:
-If intent is SEND_WHATSAPP:
-{"intent": "SEND_WHATSAPP", "slots": {"contact": "contact_name", "message": "full_message_content"}}
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
 
-If intent is SYSTEM_CONTROL:
-{"intent": "SYSTEM_CONTROL", "slots": {"action": "volume_up/volume_down/set_volume/brightness_up/brightness_down/set_brightness/check_status/minimize_window/maximize_window/close_window/switch_app/sleep", "value": "numeric_percentage_or_None/battery/volume/brightness/None"}}
+pyautogui = _LazyModule("pyautogui")
+sbc = _LazyModule("screen_brightness_control")
+psutil = _LazyModule("psutil")
+LAZY_MODULES = ("pyautogui", "screen_brightness_control", "psutil", "pynput.keyboard", "comtypes", "pycaw.pycaw")
 
-If intent is SPOTIFY_CONTROL:
-{"intent": "SPOTIFY_CONTROL", "slots": {"action": "play/pause/next/previous/search_and_play", "query": "optional_song_or_artist_or_playlist_name"}}
+# Waits for the desktop to react (Start menu, page loads). The fake desktop in headless mode sets this to 0.
+UI_PAUSE_SCALE = 1.0
 
-If intent is LAUNCH_TARGET:
-{"intent": "LAUNCH_TARGET", "slots": {"target": "name_of_app_or_website", "target_type": "app/website", "search_query": "optional_query_if_user_asked_to_search_something_on_the_target"}}
+def _ui_pause(seconds, sleep=time.sleep):
+    sleep(seconds * UI_PAUSE_SCALE)
 
-If intent is BROWSER_NAVIGATOR:
-{"intent": "BROWSER_NAVIGATOR", "slots": {"action": "back/forward/close_tab/new_tab/switch_tab_next/switch_tab_prev/click_link_1"}}
-
-If intent is GENERAL_QUERY, CONFIRM, or CANCEL:
-{"intent": "INTENT_NAME", "slots": {"query": "original_user_query"}}
-
-Analyze the following user query:
-"""
+def preload():
+    """Imports the lazily loaded skill dependencies (run in the background after startup)."""
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e: # e.g. pycaw off Windows; the skill reports it when used
+            logger.warning("⚠️ Could not preload %s: %s", name, e)
+
+# --- INTENT DEFINITIONS (Source for the router schema and prompt, see router_protocol.py) ---
+# Slot spec: a list is an enum, "string" is free text; a trailing "?" marks the slot optional.
+INTENT_DEFINITIONS = {
+    "SEND_WHATSAPP": {
+        "description": "send a message to a person (\"tell Bob I'll be late\")",
+        "slots": {"contact": "string", "message": "string"},
+    },
+    "SYSTEM_CONTROL": {
+        "description": "volume, screen brightness, battery/status checks, window management, or put the assistant to sleep; value is a percentage, or battery/volume/brightness for check_status",
+        "slots": {
+            "action": ["volume_up", "volume_down", "set_volume", "brightness_up", "brightness_down", "set_brightness",
+                       "check_status", "minimize_window", "maximize_window", "close_window", "switch_app", "sleep"],
+            "value": "string?",
+        },
+    },
+    "SPOTIFY_CONTROL": {
+        "description": "Spotify music playback",
+        "slots": {"action": ["play", "pause", "next", "previous", "search_and_play"], "query": "string?"},
+    },
+    "LAUNCH_TARGET": {
+        "description": "open or search an application or website",
+        "slots": {"target": "string", "target_type": ["app", "website"], "search_query": "string?"},
+    },
+    "BROWSER_NAVIGATOR": {
+        "description": "act inside the current browser tab (close tab, go back, click first link)",
+        "slots": {"action": ["back", "forward", "close_tab", "new_tab", "switch_tab_next", "switch_tab_prev", "click_link_1"]},
+    },
+    # The router does not echo the query for these; the parser fills it from the transcript.
+    "GENERAL_QUERY": {"description": "any question, fact or conversation", "slots": {}},
+    "CONFIRM": {"description": "confirm the previous step", "slots": {}},
+    "CANCEL": {"description": "cancel the previous action or dialogue", "slots": {}},
+}
+
+# --- OFFLINE BASIC COMMANDS (Used when the router LLM is unreachable) ---
+# Exact phrases (after lowercasing/stripping punctuation) -> (intent, slots)
+BASIC_COMMANDS = {
+    "pause": ("SPOTIFY_CONTROL", {"action": "pause"}),
+    "pause music": ("SPOTIFY_CONTROL", {"action": "pause"}),
+    "stop music": ("SPOTIFY_CONTROL", {"action": "pause"}),
+    "play": ("SPOTIFY_CONTROL", {"action": "play"}),
+    "play music": ("SPOTIFY_CONTROL", {"action": "play"}),
+    "resume": ("SPOTIFY_CONTROL", {"action": "play"}),
+    "next": ("SPOTIFY_CONTROL", {"action": "next"}),
+    "next song": ("SPOTIFY_CONTROL", {"action": "next"}),
+    "skip": ("SPOTIFY_CONTROL", {"action": "next"}),
+    "previous": ("SPOTIFY_CONTROL", {"action": "previous"}),
+    "previous song": ("SPOTIFY_CONTROL", {"action": "previous"}),
+    "volume up": ("SYSTEM_CONTROL", {"action": "volume_up", "value": None}),
+    "louder": ("SYSTEM_CONTROL", {"action": "volume_up", "value": None}),
+    "volume down": ("SYSTEM_CONTROL", {"action": "volume_down", "value": None}),
+    "quieter": ("SYSTEM_CONTROL", {"action": "volume_down", "value": None}),
+    "brightness up": ("SYSTEM_CONTROL", {"action": "brightness_up", "value": None}),
+    "brightness down": ("SYSTEM_CONTROL", {"action": "brightness_down", "value": None}),
+    "battery": ("SYSTEM_CONTROL", {"action": "check_status", "value": "battery"}),
+    "minimize": ("SYSTEM_CONTROL", {"action": "minimize_window", "value": None}),
+    "maximize": ("SYSTEM_CONTROL", {"action": "maximize_window", "value": None}),
+    "switch app": ("SYSTEM_CONTROL", {"action": "switch_app", "value": None}),
+    "go to sleep": ("SYSTEM_CONTROL", {"action": "sleep", "value": None}),
+    "sleep": ("SYSTEM_CONTROL", {"action": "sleep", "value": None}),
+    "go back": ("BROWSER_NAVIGATOR", {"action": "back"}),
+    "close tab": ("BROWSER_NAVIGATOR", {"action": "close_tab"}),
+    "new tab": ("BROWSER_NAVIGATOR", {"action": "new_tab"}),
+    "yes": ("CONFIRM", {}),
+    "send it": ("CONFIRM", {}),
+    "cancel": ("CANCEL", {}),
+    "never mind": ("CANCEL", {}),
+}
+
+def normalize_command(text):
+    cleaned = "".join(c for c in text.lower() if c.isalnum() or c.isspace())
+    return " ".join(cleaned.split())
+
+# Answers to "Should I send it?", recognized without the router
+CONFIRM_REPLIES = {"yes", "yeah", "yep", "yes please", "sure", "send it", "send", "confirm", "go ahead", "do it", "ok", "okay"}
+CANCEL_REPLIES = {"no", "nope", "cancel", "never mind", "dont", "do not", "dont send it", "do not send it", "stop", "forget it", "stop listening"}
+# Words that can surround a confirmation without changing it ("yes please, send it now")
+CONFIRM_FILLER = {"please", "now", "it", "then", "thanks", "thank", "you", "just", "right", "away", "sure"}
+
+def _strip_phrases(padded, phrases):
+    """Removes whole-word `phrases` (longest first) from a space-padded answer. Returns (what is left, whether any matched)."""
+    matched = False
+    for phrase in sorted(phrases, key=len, reverse=True): # "send it" before "send"
+        while f" {phrase} " in padded:
+            padded = padded.replace(f" {phrase} ", " ")
+            matched = True
+    return padded, matched
+
+def _only_confirmation(normalized):
+    """True if the answer is confirmation phrases and filler only: "send it to Bob instead" is not."""
+    rest, matched = _strip_phrases(f" {normalized} ", CONFIRM_REPLIES)
+    return matched and set(rest.split()) <= CONFIRM_FILLER
+
+def match_dialogue_reply(text, exact=False):
+    """
+    "CONFIRM", "CANCEL" or None. A cancel phrase counts only at the start of
+    the answer ("no, don't send it"); a confirmation only when nothing else is
+    said ("ok wait, change it" is not one). An answer holding both ("yes, no
+    problem") is left to the router. With `exact`, either must be the whole answer.
+    """
+    normalized = normalize_command(text)
+    if normalized in CANCEL_REPLIES:
+        return "CANCEL"
+    if normalized in CONFIRM_REPLIES:
+        return "CONFIRM"
+    if exact:
+        return None
+    rest, cancelled = _strip_phrases(f" {normalized} ", CANCEL_REPLIES)
+    if cancelled and _strip_phrases(rest, CONFIRM_REPLIES)[1]:
+        return None
+    words = normalized.split()
+    while words and words[0] in CONFIRM_FILLER: # "please cancel"
+        words.pop(0)
+    start = " ".join(words) + " "
+    if any(start.startswith(f"{phrase} ") for phrase in CANCEL_REPLIES):
+        return "CANCEL"
+    if _only_confirmation(normalized):
+        return "CONFIRM"
+    return None
+
+def strip_command_prefix(normalized):
+    """ "please pause" -> "pause" (a normalized command without its politeness prefix)."""
+    for prefix in ("please ", "can you ", "hey "):
+        if normalized.startswith(prefix):
+            normalized = normalized[len(prefix):]
+    return normalized
+
+def match_basic_command(text):
+    """Returns {"intent", "slots"} for a known basic command, or None."""
+    match = BASIC_COMMANDS.get(strip_command_prefix(normalize_command(text)))
+    if not match:
+        return None
+    intent, slots = match
+    return {"intent": intent, "slots": dict(slots, query=text)}
 
 # ----------------- VOLUME HELPER FUNCTIONS -----------------
 
 def _get_volume_controller():
+    from comtypes import CLSCTX_ALL, CoInitialize
+    from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume
     CoInitialize()
     devices = AudioUtilities.GetSpeakers()
     interface = devices.Activate(IAudioEndpointVolume._iid_, CLSCTX_ALL, None)
@@ -65,6 +197,7 @@ def _set_volume_percentage(percent):
         normalized_volume = max(0.0, min(1.0, percent / 100.0))
         controller.SetMasterVolumeLevelScalar(normalized_volume, None)
     finally:
+        from comtypes import CoUninitialize
         CoUninitialize()
 
 def _get_volume_percentage():
@@ -76,184 +209,182 @@ def _get_volume_percentage():
     except Exception:
         raise
     finally:
+        from comtypes import CoUninitialize
         CoUninitialize()
 
 # ----------------- SYSTEM CONTROL EXECUTION (Updated for 'sleep') --------------------
+# Each action is one entry in SYSTEM_ACTIONS: action -> fn(step, value) returning the reply.
 
-def handle_system_action(action, value=None):
-    
+def _volume_up(step, value):
     try:
-        step = int(value) if value is not None and str(value).isdigit() else 10
-        step = max(1, min(100, step)) 
-    except ValueError:
-        step = 10 
-        
-    if action == "volume_up":
-        try:
-            current_vol = _get_volume_percentage()
-            new_vol = min(100, current_vol + step) 
-            _set_volume_percentage(new_vol)
-            return f"Volume increased by {step} percent to {new_vol} percent."
-        except Exception as e:
-            return f"I had trouble adjusting the volume with pycaw: {e}"
+        current_vol = _get_volume_percentage()
+        new_vol = min(100, current_vol + step) 
+        _set_volume_percentage(new_vol)
+        return f"Volume increased by {step} percent to {new_vol} percent."
+    except Exception as e:
+        return f"I had trouble adjusting the volume with pycaw: {e}"
+
+def _volume_down(step, value):
+    try:
+        current_vol = _get_volume_percentage()
+        new_vol = max(0, current_vol - step)
+        _set_volume_percentage(new_vol)
+        return f"Volume decreased by {step} percent to {new_vol} percent."
+    except Exception as e:
+        return f"I had trouble adjusting the volume with pycaw: {e}"
+
+def _set_volume(step, value):
+    try:
+        val = int(value)
+        val = max(0, min(100, val)) 
+        _set_volume_percentage(val)
+        return f"Volume set accurately to {val} percent."
+    except (TypeError, ValueError):
+        return "I need a valid number between 0 and 100 to set the volume."
+    except Exception as e:
+        return f"I had trouble setting the volume with pycaw: {e}"
+
+def _brightness_up(step, value):
+    try:
+        current = sbc.get_brightness()[0]
+        new_brightness = min(100, current + step)
+        sbc.set_brightness(new_brightness)
+        return f"Brightness increased by {step} percent to {new_brightness} percent."
+    except Exception:
+        return "Sorry, I couldn't increase the screen brightness."
 
-    elif action == "volume_down":
-        try:
-            current_vol = _get_volume_percentage()
-            new_vol = max(0, current_vol - step)
-            _set_volume_percentage(new_vol)
-            return f"Volume decreased by {step} percent to {new_vol} percent."
-        except Exception as e:
-            return f"I had trouble adjusting the volume with pycaw: {e}"
+def _brightness_down(step, value):
+    try:
+        current = sbc.get_brightness()[0]
+        new_brightness = max(0, current - step)
+        sbc.set_brightness(new_brightness)
+        return f"Brightness decreased by {step} percent to {new_brightness} percent."
+    except Exception:
+        return "Sorry, I couldn't decrease the screen brightness."
 
-    elif action == "set_volume":
-        try:
-            val = int(value)
-            val = max(0, min(100, val)) 
-            _set_volume_percentage(val)
-            return f"Volume set accurately to {val} percent."
-        except (TypeError, ValueError):
-            return "I need a valid number between 0 and 100 to set the volume."
-        except Exception as e:
-            return f"I had trouble setting the volume with pycaw: {e}"
-            
-    elif action == "brightness_up":
+def _set_brightness(step, value):
+    try:
+        val = int(value)
+        val = max(0, min(100, val)) 
+        sbc.set_brightness(val)
+        return f"Screen brightness set to {val} percent."
+    except (TypeError, ValueError):
+        return "I need a valid number between 0 and 100 to set the brightness."
+
+def _check_status(step, value):
+    status_target = str(value).lower()
+    
+    if "volume" in status_target:
         try:
-            current = sbc.get_brightness()[0]
-            new_brightness = min(100, current + step)
-            sbc.set_brightness(new_brightness)
-            return f"Brightness increased by {step} percent to {new_brightness} percent."
+            current = _get_volume_percentage()
+            return f"The current volume is {current} percent."
         except Exception:
-            return "Sorry, I couldn't increase the screen brightness."
-
-    elif action == "brightness_down":
+            return "I had trouble checking the volume percentage."
+    
+    elif "brightness" in status_target:
         try:
             current = sbc.get_brightness()[0]
-            new_brightness = max(0, current - step)
-            sbc.set_brightness(new_brightness)
-            return f"Brightness decreased by {step} percent to {new_brightness} percent."
+            return f"The current screen brightness is {current} percent."
         except Exception:
-            return "Sorry, I couldn't decrease the screen brightness."
-
-    elif action == "set_brightness":
+            return "I had trouble checking the screen brightness."
+    
+    elif "battery" in status_target:
         try:
-            val = int(value)
-            val = max(0, min(100, val)) 
-            sbc.set_brightness(val)
-            return f"Screen brightness set to {val} percent."
-        except (TypeError, ValueError):
-            return "I need a valid number between 0 and 100 to set the brightness."
+            battery = psutil.sensors_battery()
+            if battery is None:
+                return "I cannot detect the battery status on this device."
             
-    elif action == "check_status":
-        status_target = str(value).lower()
-        
-        if "volume" in status_target:
-            try:
-                current = _get_volume_percentage()
-                return f"The current volume is {current} percent."
-            except Exception:
-                return "I had trouble checking the volume percentage."
-        
-        elif "brightness" in status_target:
-            try:
-                current = sbc.get_brightness()[0]
-                return f"The current screen brightness is {current} percent."
-            except Exception:
-                return "I had trouble checking the screen brightness."
-        
-        elif "battery" in status_target:
-            try:
-                battery = psutil.sensors_battery()
-                if battery is None:
-                    return "I cannot detect the battery status on this device."
-                
-                percent = int(battery.percent)
-                plugged = "and is currently charging" if battery.power_plugged else "and running on battery"
-                
-                return f"The battery is at {percent} percent, {plugged}."
-            except Exception:
-                return "I had trouble checking the battery status."
-
-        else:
-            return "I'm not sure what status you want me to check."
+            percent = int(battery.percent)
+            plugged = "and is currently charging" if battery.power_plugged else "and running on battery"
             
-    # --- WINDOW MANAGEMENT (NEW LOGIC) ---
-    elif action == "minimize_window":
-        pyautogui.hotkey('win', 'down') 
-        return "Minimizing the active window."
-        
-    elif action == "maximize_window":
-        pyautogui.hotkey('win', 'up') 
-        return "Maximizing the active window."
-        
-    elif action == "close_window":
-        pyautogui.hotkey('alt', 'f4')
-        return "Closing the active window or application."
-        
-    elif action == "switch_app":
-        pyautogui.hotkey('alt', 'tab')
-        return "Switching to the previous application."
-
+            return f"The battery is at {percent} percent, {plugged}."
+        except Exception:
+            return "I had trouble checking the battery status."
+
+    return "I'm not sure what status you want me to check."
+
+def _hotkey_action(keys, reply):
+    def run(*args):
+        pyautogui.hotkey(*keys)
+        return reply
+    return run
+
+# --- WINDOW MANAGEMENT (Hotkeys; these drive the keyboard, see the "gui" skill pool) ---
+WINDOW_ACTIONS = {
+    "minimize_window": _hotkey_action(('win', 'down'), "Minimizing the active window."),
+    "maximize_window": _hotkey_action(('win', 'up'), "Maximizing the active window."),
+    "close_window": _hotkey_action(('alt', 'f4'), "Closing the active window or application."),
+    "switch_app": _hotkey_action(('alt', 'tab'), "Switching to the previous application."),
+}
+
+SYSTEM_ACTIONS = {
+    "volume_up": _volume_up,
+    "volume_down": _volume_down,
+    "set_volume": _set_volume,
+    "brightness_up": _brightness_up,
+    "brightness_down": _brightness_down,
+    "set_brightness": _set_brightness,
+    "check_status": _check_status,
     # --- NEW: GO TO SLEEP ACTION ---
-    elif action == "sleep": 
-        # The actual state change is handled in the FireworksResponder thread.
-        return "Going to sleep mode now. Say the wake word to wake me up."
+    # The actual state change is handled by the system skill (see SKILL REGISTRY below).
+    "sleep": lambda step, value: "Going to sleep mode now. Say the wake word to wake me up.",
+    **WINDOW_ACTIONS,
+}
+
+def handle_system_action(action, value=None):
+    
+    try:
+        step = int(value) if value is not None and str(value).isdigit() else 10
+        step = max(1, min(100, step)) 
+    except ValueError:
+        step = 10 
 
-    return "I'm not sure how to perform that system action."
+    handler = SYSTEM_ACTIONS.get(action)
+    if handler is None:
+        return "I'm not sure how to perform that system action."
+    return handler(step, value)
 
 # --- BROWSER NAVIGATION EXECUTION (NEW FEATURE) ---
 
-def handle_browser_navigation(action):
-    """
-    Performs actions specific to the current browser tab/window using hotkeys and clicks.
-    """
-    
-    if action == "back":
-        pyautogui.hotkey('alt', 'left') 
-        return "Going back in the browser history."
-        
-    elif action == "forward":
-        pyautogui.hotkey('alt', 'right') 
-        return "Going forward in the browser history."
+def _click_first_link():
+    # --- ROBUST JAVASCRIPT HACK ---
+    try:
+        # 1. JavaScript to find and click the first main link on a Google/Bing/DuckDuckGo page.
+        # This targets the anchor tag inside a main result block.
+        js_script = "javascript:(function(){var a=document.querySelector('div.g a, #rso a, .b_algo a, .web-result a'); if(a) {a.click();}})();"
+
+        # 2. Use the Chrome hotkey (Ctrl+L) to focus the address bar.
+        pyautogui.hotkey('ctrl', 'l')
+        _ui_pause(0.2)
         
-    elif action == "close_tab":
-        pyautogui.hotkey('ctrl', 'w')
-        return "Closing the current tab."
+        # 3. Type the JavaScript into the address bar and press Enter.
+        pyautogui.write(js_script, interval=0.001) 
+        pyautogui.press('enter')
         
-    elif action == "new_tab":
-        pyautogui.hotkey('ctrl', 't')
-        return "Opening a new browser tab."
-
-    elif action == "switch_tab_next":
-        pyautogui.hotkey('ctrl', 'tab')
-        return "Switching to the next browser tab."
-
-    elif action == "switch_tab_prev":
-        pyautogui.hotkey('ctrl', 'shift', 'tab')
-        return "Switching to the previous browser tab."
+        return "Executing script to click the top search result."
         
-    elif action == "click_link_1":
-        # --- ROBUST JAVASCRIPT HACK ---
-        try:
-            # 1. JavaScript to find and click the first main link on a Google/Bing/DuckDuckGo page.
-            # This targets the anchor tag inside a main result block.
-            js_script = "javascript:(function(){var a=document.querySelector('div.g a, #rso a, .b_algo a, .web-result a'); if(a) {a.click();}})();"
+    except Exception as e:
+        print(f"[JavaScript Click Error]: {e}")
+        return "I could not execute the script to click the link."
+
+BROWSER_ACTIONS = {
+    "back": _hotkey_action(('alt', 'left'), "Going back in the browser history."),
+    "forward": _hotkey_action(('alt', 'right'), "Going forward in the browser history."),
+    "close_tab": _hotkey_action(('ctrl', 'w'), "Closing the current tab."),
+    "new_tab": _hotkey_action(('ctrl', 't'), "Opening a new browser tab."),
+    "switch_tab_next": _hotkey_action(('ctrl', 'tab'), "Switching to the next browser tab."),
+    "switch_tab_prev": _hotkey_action(('ctrl', 'shift', 'tab'), "Switching to the previous browser tab."),
+    "click_link_1": _click_first_link,
+}
 
-            # 2. Use the Chrome hotkey (Ctrl+L) to focus the address bar.
-            pyautogui.hotkey('ctrl', 'l')
-            time.sleep(0.2)
-            
-            # 3. Type the JavaScript into the address bar and press Enter.
-            pyautogui.write(js_script, interval=0.001) 
-            pyautogui.press('enter')
-            
-            return "Executing script to click the top search result."
-            
-        except Exception as e:
-            print(f"[JavaScript Click Error]: {e}")
-            return "I could not execute the script to click the link."
-        
-    return "I am unable to perform that browser action."
+def handle_browser_navigation(action):
+    """
+    Performs actions specific to the current browser tab/window using hotkeys and clicks.
+    """
+    handler = BROWSER_ACTIONS.get(action)
+    if handler is None:
+        return "I am unable to perform that browser action."
+    return handler()
 
 
 # --- APPLICATION/BROWSER LAUNCH EXECUTION (EXISTING) ---
@@ -269,10 +400,10 @@ def handle_launch_target_action(target_query, target_type, search_query=None):
     if target_type_lower == "app":
         try:
             pyautogui.press('win') 
-            time.sleep(1) 
+            _ui_pause(1) 
             
             pyautogui.write(target_query, interval=0.05) 
-            time.sleep(1) 
+            _ui_pause(1) 
             
             pyautogui.press('enter')
             
@@ -335,9 +466,15 @@ def handle_launch_target_action(target_query, target_type, search_query=None):
 
 # --- SPOTIFY FALLBACK CONTROL EXECUTION (EXISTING) ---
 
-keyboard = Controller()
+_keyboard = None
 
 def handle_spotify_fallback(action, query=None):
+    global _keyboard
+    from pynput.keyboard import Key, Controller
+    if _keyboard is None:
+        _keyboard = Controller()
+    keyboard = _keyboard
+
     if action == "play" or action == "pause":
         keyboard.press(Key.media_play_pause)
         keyboard.release(Key.media_play_pause)
@@ -360,8 +497,9 @@ def handle_spotify_fallback(action, query=None):
 
 
 # --- WHATSAPP EXECUTION (EXISTING) ---
-def handle_whatsapp_action(contact_name, message, phone_number, action="prepare"):
-    
+def handle_whatsapp_action(contact_name, message, phone_number, action="prepare", sleep=time.sleep):
+    """`sleep` lets the skill registry pass a cancellable sleep (SkillContext.sleep)."""
+
     whatsapp_url = f"[https://web.whatsapp.com/send?phone=](https://web.whatsapp.com/send?phone=){phone_number}"
     
     try:
@@ -383,10 +521,10 @@ def handle_whatsapp_action(contact_name, message, phone_number, action="prepare"
         
         if not state.DIALOGUE_CONTEXT['slots'].get('opened'):
             chrome_browser.open_new_tab(whatsapp_url)
-            time.sleep(5) 
+            _ui_pause(5, sleep) 
             state.DIALOGUE_CONTEXT['slots']['opened'] = True
             
-        time.sleep(1) 
+        _ui_pause(1, sleep) 
 
         message_box_x = config.MESSAGE_BOX_X 
         message_box_y = config.MESSAGE_BOX_Y
@@ -404,12 +542,104 @@ def handle_whatsapp_action(contact_name, message, phone_number, action="prepare"
     elif action == "send":
         pyautogui.click(config.MESSAGE_BOX_X, config.MESSAGE_BOX_Y) 
         
-        time.sleep(1) 
+        _ui_pause(1, sleep) 
         pyautogui.press('enter')
         
-        time.sleep(0.5)
+        _ui_pause(0.5, sleep)
         pyautogui.hotkey('ctrl', 'w')
         
         print(f"\n[ACTION] 🟢 MESSAGE SENT to {contact_name}. Window switched.")
         
-        return f"The message has been sent to {contact_name}."
\ No newline at end of file
+        return f"The message has been sent to {contact_name}."
+
+
+# --- SKILL REGISTRY (Intent/action -> skill; the responder dispatches through SKILLS) ---
+# Skills on the "gui" pool drive the keyboard and mouse, so they run one at a time.
+SKILLS = SkillRegistry()
+
+# Skills return a reply and leave the assistant state to others: the responder resets an open dialogue after
+# every skill that ends_dialogue, and the speaker applies ctx.outcome (e.g. "sleep") when it plays the reply.
+@SKILLS.skill("whatsapp", intents={"SEND_WHATSAPP"}, pool="gui", timeout_s=20, ends_dialogue=False)
+def _whatsapp_skill(slots, ctx):
+    contact_name = slots.get('contact', '').title()
+    message = slots.get('message', '')
+    
+    if not contact_name or not message:
+        state.DIALOGUE_CONTEXT.update({"active": True, "intent": "SEND_WHATSAPP", "slots": slots})
+        if not contact_name:
+            return "Who should I send that message to?"
+        return f"What should the message to {contact_name} say?"
+
+    # Misheard names ("Jayne", "Bobby") resolve through the contact index; the "Should I send it?"
+    # confirmation that follows doubles as the check that the right contact was picked
+    suggested = slots.pop('suggested', None)
+    if suggested and match_dialogue_reply(contact_name, exact=True) == "CONFIRM":
+        contact_name = suggested # "Did you mean Jane?" -> "Yes"
+    match, candidates = contact_index.resolve(contact_name)
+    if not match:
+        if candidates:
+            names = [c.name.title() for c in candidates]
+            slots = dict(slots, contact="", suggested=names[0] if len(names) == 1 else None)
+            state.DIALOGUE_CONTEXT.update({"active": True, "intent": "SEND_WHATSAPP", "slots": slots})
+            if len(names) == 1:
+                return f"I could not find {contact_name}. Did you mean {names[0]}?"
+            return f"Did you mean {', '.join(names[:-1])} or {names[-1]}?"
+        state.DIALOGUE_CONTEXT['active'] = False
+        return f"I could not find a number for {contact_name}. Please try a different name."
+
+    heard, contact_name = contact_name, match.name.title()
+    state.DIALOGUE_CONTEXT.update({"active": True, "intent": "SEND_WHATSAPP", "slots": slots})
+    reply = handle_whatsapp_action(contact_name, message, match.number, action="prepare", sleep=ctx.sleep)
+    ctx.check() # Timed out while typing: the responder has moved on, leave its dialogue alone
+    state.DIALOGUE_CONTEXT['slots']['contact'] = contact_name
+    state.DIALOGUE_CONTEXT['slots']['number'] = match.number
+    state.DIALOGUE_CONTEXT['slots']['message'] = message
+    state.DIALOGUE_CONTEXT['slots']['awaiting_confirmation'] = True 
+    if match.reason in ("phonetic", "fuzzy"):
+        reply = f"I took {heard} to mean {contact_name}. {reply}"
+    return reply
+
+@SKILLS.skill("whatsapp send", intents={"SEND_WHATSAPP"}, actions={"send"}, pool="gui", timeout_s=10)
+def _whatsapp_send_skill(slots, ctx):
+    contact_name = slots['contact']
+    phone_number = slots.get('number') or contact_index.resolve(contact_name)[0].number
+    return handle_whatsapp_action(contact_name, slots['message'], phone_number, action="send", sleep=ctx.sleep)
+
+@SKILLS.skill("system", intents={"SYSTEM_CONTROL"}, timeout_s=5)
+def _system_skill(slots, ctx):
+    action = slots.get('action')
+    if not action:
+        return "I received a system command but I'm not sure what action to take."
+    if action == "sleep":
+        ctx.outcome = "sleep"
+    return handle_system_action(action, slots.get('value'))
+
+@SKILLS.skill("window", intents={"SYSTEM_CONTROL"}, actions=set(WINDOW_ACTIONS), pool="gui", timeout_s=5)
+def _window_skill(slots, ctx):
+    return handle_system_action(slots['action'], slots.get('value'))
+
+@SKILLS.skill("spotify", intents={"SPOTIFY_CONTROL"}, timeout_s=25) # Device activation can retry for ~15 s
+def _spotify_skill(slots, ctx):
+    action = slots.get('action')
+    query = slots.get('query')
+    if not action:
+        return "I received a Spotify command but I'm not sure which action to take."
+    with metrics.SPOTIFY_LATENCY.time(action=action):
+        api_response = spotify_api.api_control_playback(spotify_api.SPOTIFY_CLIENT, action, query)
+    ctx.check()
+    return api_response or handle_spotify_fallback(action, query)
+
+@SKILLS.skill("launch", intents={"LAUNCH_TARGET"}, pool="gui", timeout_s=10)
+def _launch_skill(slots, ctx):
+    target = slots.get('target')
+    target_type = slots.get('target_type')
+    if not target or not target_type:
+        return "I'm sorry, what exactly would you like me to open?"
+    return handle_launch_target_action(target, target_type, slots.get('search_query'))
+
+@SKILLS.skill("browser", intents={"BROWSER_NAVIGATOR"}, pool="gui", timeout_s=5)
+def _browser_skill(slots, ctx):
+    action = slots.get('action')
+    if not action:
+        return "I'm not sure what navigation action you want me to perform in the browser."
+    return handle_browser_navigation(action)
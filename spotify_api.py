@@ -1,6 +1,4 @@
 # spotify_api.py (Aggressive Match & No Ambiguous Fallback)
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 from . import config
 import os
 import json
@@ -90,18 +88,27 @@ def get_spotify_client():
         return None
 
     try:
+        # Imported here: spotipy is only needed once the background startup step logs in
+        import spotipy
+        from spotipy.oauth2 import SpotifyOAuth
+
+        from .spotify_session import SpotifySession, token_cache
+
         # Client initialization (Authorization)
-        client = spotipy.Spotify(auth_manager=SpotifyOAuth(
+        auth_manager = SpotifyOAuth(
             client_id=config.SPOTIFY_CLIENT_ID,
             client_secret=config.SPOTIFY_CLIENT_SECRET,
             redirect_uri=config.SPOTIFY_REDIRECT_URI,
             scope=SCOPE,
-            cache_path=CACHE_FILE,
+            cache_handler=token_cache(CACHE_FILE),
             show_dialog=False
-        ))
+        )
+        # Token refresh and keep-alive run in the background, so commands find a valid token and a warm connection
+        client = SpotifySession(spotipy.Spotify(auth_manager=auth_manager), auth_manager)
         
-        # Test basic connection without affecting playback state
+        # Test basic connection without affecting playback state (the user is cached for Liked Songs)
         client.current_user()
+        client.start()
         print("✅ Spotify API authentication successful. Device check will happen on first command.")
         return client
             
@@ -119,6 +126,10 @@ def api_control_playback(client, action, query=None):
     """
     if not client:
         return None 
+    try:
+        from spotipy import SpotifyException # Already loaded by get_spotify_client()
+    except ImportError: # The stand-in client of headless mode needs no spotipy
+        SpotifyException = ()
 
     # *** ACTIVATE DEVICE ON DEMAND ***
     device_id = _find_and_activate_device(client)
@@ -156,7 +167,7 @@ def api_control_playback(client, action, query=None):
                     # To play Liked Songs, we use the saved tracks context
                     # The URI for "Liked Songs" is typically spotify:user:<user_id>:collection:tracks
                     # However, simply playing the user's saved tracks is the most reliable method
-                    current_user_id = client.current_user()['id']
+                    current_user_id = client.current_user()['id'] # Cached by SpotifySession
                     liked_songs_uri = f"spotify:user:{current_user_id}:collection"
                     
                     client.start_playback(device_id=device_id, context_uri=liked_songs_uri)
@@ -188,7 +199,7 @@ def api_control_playback(client, action, query=None):
                     # Attempting to play the specific context URI
                     client.start_playback(device_id=device_id, context_uri=uri_to_play)
                     return f"Playing your playlist '{item_name}' via API."
-                except spotipy.SpotifyException as se:
+                except SpotifyException as se:
                     # If playing the user playlist fails, give explicit error message
                     print(f"❌ Failed to play user playlist '{item_name}' (SpotifyException). Error: {se}")
                     return f"I found your playlist '{item_name}' but the Spotify service failed to start playback on the device. Please check the Spotify app status."
@@ -213,7 +224,7 @@ def api_control_playback(client, action, query=None):
 
         return None 
         
-    except spotipy.SpotifyException as se:
+    except SpotifyException as se:
         print(f"🚨 Spotify API Playback Error (General): {se}")
         return None 
     except Exception as e:
@@ -0,0 +1,136 @@
+# spotify_session.py (Spotify login kept warm: background token refresh, keep-alive and cached user)
+import threading
+import time
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("spotify")
+
+
+def token_cache(cache_path):
+    """
+    A spotipy cache handler that answers from memory. spotipy asks for the
+    cached token before every API call, and the file handler re-reads and
+    parses the cache file each time; saves still go to the file.
+    """
+    from spotipy.cache_handler import CacheFileHandler
+
+    class WriteThroughCache(CacheFileHandler):
+        token_info = None
+
+        def get_cached_token(self):
+            if self.token_info is None:
+                self.token_info = super().get_cached_token()
+            return self.token_info
+
+        def save_token_to_cache(self, token_info):
+            self.token_info = token_info
+            super().save_token_to_cache(token_info)
+
+    return WriteThroughCache(cache_path=cache_path)
+
+
+class SpotifySession:
+    """
+    Drop-in for spotipy.Spotify (other attributes are passed through to
+    `client`) that keeps the login warm between commands:
+
+      - the access token is refreshed on a background thread
+        SPOTIFY_REFRESH_MARGIN_S before it expires, instead of by spotipy
+        inside whichever command first finds it expired (retried every
+        SPOTIFY_REFRESH_RETRY_S on failure);
+      - every SPOTIFY_KEEPALIVE_S a cheap call (the current user) keeps the
+        pooled HTTPS connection to the Web API open, so a command does not pay
+        a new TCP/TLS handshake;
+      - current_user() is fetched once and then served from memory.
+
+    Refresh latency is exported, and the token's age is computed at scrape time.
+    """
+    def __init__(self, client, auth_manager, refresh_margin_s=None, keepalive_s=None, retry_s=None):
+        self.client = client
+        self.auth = auth_manager
+        self.refresh_margin_s = config.SPOTIFY_REFRESH_MARGIN_S if refresh_margin_s is None else refresh_margin_s
+        self.keepalive_s = config.SPOTIFY_KEEPALIVE_S if keepalive_s is None else keepalive_s
+        self.retry_s = config.SPOTIFY_REFRESH_RETRY_S if retry_s is None else retry_s
+        self.refreshes = 0
+        self._user = None
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="spotify-session", daemon=True)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def current_user(self):
+        """The logged-in user's profile; fetched once per session."""
+        user = self._user
+        if user is None:
+            user = self._user = self.client.current_user()
+        return user
+
+    def token_info(self):
+        return self.auth.cache_handler.get_cached_token()
+
+    def token_age_s(self):
+        """Seconds since the current access token was issued, or None before login."""
+        info = self.token_info()
+        if not info or "expires_at" not in info:
+            return None
+        return time.time() - (info["expires_at"] - info.get("expires_in", 3600))
+
+    def refresh(self):
+        """Refreshes the access token now. Returns False if Spotify did not answer."""
+        info = self.token_info()
+        if not info or not info.get("refresh_token"):
+            return False
+        started = time.perf_counter()
+        try:
+            self.auth.refresh_access_token(info["refresh_token"])
+        except Exception as e:
+            metrics.SPOTIFY_TOKEN_REFRESH.observe(time.perf_counter() - started, result="error")
+            logger.warning("⚠️ Spotify token refresh failed: %s. Retrying in %ss.", e, self.retry_s)
+            return False
+        elapsed = time.perf_counter() - started
+        self.refreshes += 1
+        metrics.SPOTIFY_TOKEN_REFRESH.observe(elapsed, result="ok")
+        logger.info("🔑 Spotify token refreshed in the background (%.0f ms).", elapsed * 1000)
+        return True
+
+    def _keepalive(self):
+        started = time.perf_counter()
+        try:
+            self._user = self.client.current_user()
+        except Exception as e:
+            metrics.SPOTIFY_KEEPALIVES.inc(result="error")
+            logger.debug("Spotify keep-alive failed: %s", e)
+            return
+        metrics.SPOTIFY_KEEPALIVES.inc(result="ok")
+        logger.debug("Spotify keep-alive in %.0f ms.", (time.perf_counter() - started) * 1000)
+
+    def _run(self):
+        next_keepalive = time.monotonic() + self.keepalive_s
+        retry_at = 0.0
+        while not self._stop.is_set():
+            info = self.token_info()
+            refresh_in = info["expires_at"] - time.time() - self.refresh_margin_s if info and "expires_at" in info else None
+            if refresh_in is not None and refresh_in <= 0 and time.monotonic() >= retry_at:
+                if not self.refresh():
+                    retry_at = time.monotonic() + self.retry_s
+                continue
+
+            waits = [self.retry_s if refresh_in is None or refresh_in <= 0 else refresh_in]
+            if self.keepalive_s > 0:
+                waits.append(next_keepalive - time.monotonic())
+            if self._stop.wait(max(0.05, min(waits))):
+                return
+            if self.keepalive_s > 0 and time.monotonic() >= next_keepalive:
+                self._keepalive()
+                next_keepalive = time.monotonic() + self.keepalive_s
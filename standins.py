@@ -0,0 +1,489 @@
+# standins.py (Local stand-ins for the cloud services and the desktop, used by bench.py, replay.py and headless.py)
+import base64
+import hashlib
+import io
+import json
+import socketserver
+import struct
+import threading
+import time
+import webbrowser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+from . import config
+
+
+# --- FIREWORKS CHAT-COMPLETION STAND-IN ---
+class FakeChatServer:
+    """
+    Local HTTP server speaking the subset of the chat-completions API the assistant uses.
+    Non-streaming requests (the router) get `router_reply` after `router_delay`
+    seconds; streaming requests get `answer` as SSE tokens, one every
+    `token_delay` seconds. For a replay, `tokens` and `token_times` (seconds since
+    the request, per token) reproduce a recorded stream exactly.
+    """
+    def __init__(self, answer=None, router_reply=None, token_delay=0.02, port=0, router_delay=0.0, tokens=None, token_times=None):
+        self.answer = answer or ("This is a long answer from the stand-in model. " * 20).strip()
+        self.router_reply = router_reply or (lambda query: {"intent": "GENERAL_QUERY", "slots": {"query": query}})
+        self.token_delay = token_delay
+        self.router_delay = router_delay
+        self.tokens = tokens
+        self.token_times = token_times
+        self.closed_streams = 0
+        self.completed_streams = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True # Headers and body go out at once, not 40 ms apart (delayed ACK)
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if payload.get("stream"):
+                    self._stream(payload)
+                else:
+                    self._complete(payload)
+
+            def _complete(self, payload):
+                query = payload["messages"][-1]["content"]
+                time.sleep(fake.router_delay)
+                content = json.dumps(fake.router_reply(query))
+                body = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, payload):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked") # Each token reaches iter_lines() as it is sent
+                self.send_header("Connection", "close")
+                self.end_headers()
+                started = time.perf_counter()
+                if fake.tokens is not None:
+                    tokens, times = fake.tokens, fake.token_times
+                else:
+                    tokens = [word + " " for word in fake.answer.split(" ")]
+                    times = [i * fake.token_delay for i in range(len(tokens))]
+                try:
+                    for token, at in zip(tokens, times):
+                        time.sleep(max(0.0, started + at - time.perf_counter()))
+                        chunk = {"choices": [{"delta": {"content": token}}]}
+                        self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._send_chunk(b"")
+                    with fake._lock:
+                        fake.completed_streams += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    with fake._lock:
+                        fake.closed_streams += 1
+                self.close_connection = True
+
+            def _send_chunk(self, data):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+
+class NullIntentClassifier:
+    """Stands in for the responder's IntentClassifier: sends every command to the router and logs nothing to disk."""
+    def classify(self, text):
+        return None
+
+    def record(self, *args, **kwargs):
+        pass
+
+
+# --- FIREWORKS STREAMING TRANSCRIBER STAND-IN ---
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def _decode_audio_ms(encoding, message, decoder_state):
+    """Milliseconds of audio in one uplink message, decoded the way a real endpoint would."""
+    if encoding == "flac":
+        import soundfile
+        samples = len(soundfile.read(io.BytesIO(message), dtype="int16")[0])
+    elif encoding == "opus":
+        import opuslib
+        if "opus" not in decoder_state:
+            decoder_state["opus"] = opuslib.Decoder(config.SAMPLE_RATE, 1)
+        samples = len(decoder_state["opus"].decode(message, config.SAMPLE_RATE * 60 // 1000)) // 2
+    else:
+        samples = len(message) // 2
+    return samples * 1000 / config.SAMPLE_RATE
+
+
+class FakeTranscriberServer:
+    """
+    Minimal WebSocket server (standard library only) in place of the streaming
+    transcription endpoint. Binary messages are decoded according to the
+    `encoding` query parameter (pcm/flac/opus) and every message is answered
+    with {"text": "<total decoded audio ms>"}, so a client can measure
+    end-to-end latency per message. Counts bytes and messages received.
+    """
+    def __init__(self, port=0):
+        self.bytes_received = 0
+        self.messages_received = 0
+        self.decode_errors = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"ws://{host}:{port}/v1/audio/transcriptions/streaming"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request_line = self.rfile.readline().decode("latin-1")
+                headers = {}
+                while True:
+                    line = self.rfile.readline().decode("latin-1").strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                # "GET <target> HTTP/1.1"; the target may contain a raw space ("Bearer <key>")
+                target = request_line.split(" ", 1)[1].rsplit(" ", 1)[0]
+                query = parse_qs(urlparse(target).query)
+                encoding = query.get("encoding", ["pcm"])[0]
+
+                accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + _WS_GUID).encode()).digest()).decode()
+                self.wfile.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                                  f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+                decoder_state, decoded_ms, message = {}, 0.0, b""
+                while True:
+                    frame = self._read_frame()
+                    if frame is None:
+                        return
+                    fin, opcode, payload = frame
+                    if opcode == 0x8: # Close
+                        self._send_frame(0x8, payload[:2])
+                        return
+                    if opcode == 0x9: # Ping
+                        self._send_frame(0xA, payload)
+                        continue
+                    message += payload
+                    if not fin:
+                        continue
+                    with fake._lock:
+                        fake.bytes_received += len(message)
+                        fake.messages_received += 1
+                    try:
+                        decoded_ms += _decode_audio_ms(encoding, message, decoder_state)
+                    except Exception:
+                        with fake._lock:
+                            fake.decode_errors += 1
+                    message = b""
+                    self._send_frame(0x1, json.dumps({"text": str(int(decoded_ms))}).encode())
+
+            def _read_frame(self):
+                header = self.rfile.read(2)
+                if len(header) < 2:
+                    return None
+                fin, opcode = header[0] & 0x80, header[0] & 0x0F
+                masked, length = header[1] & 0x80, header[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack(">H", self.rfile.read(2))[0]
+                elif length == 127:
+                    length = struct.unpack(">Q", self.rfile.read(8))[0]
+                mask = self.rfile.read(4) if masked else None
+                payload = self.rfile.read(length)
+                if mask:
+                    key = (mask * (length // 4 + 1))[:length]
+                    payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+                return fin, opcode, payload
+
+            def _send_frame(self, opcode, payload):
+                length = len(payload)
+                if length < 126:
+                    header = struct.pack(">BB", 0x80 | opcode, length)
+                elif length < 65536:
+                    header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+                else:
+                    header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+                try:
+                    self.wfile.write(header + payload)
+                except OSError:
+                    pass
+
+        return Handler
+
+
+# --- ELEVENLABS STAND-IN ---
+class FakeTTSClient:
+    """
+    Mimics `ElevenLabs().text_to_speech.stream(...)`: yields `chunk_size` bytes every `chunk_delay` seconds.
+    For a replay, `timings` maps a sentence to its recorded (first chunk seconds, total seconds, bytes).
+    """
+    def __init__(self, chunks_per_sentence=50, chunk_size=1024, chunk_delay=0.02, sample=b"\x00\x00", timings=None):
+        self.chunks_per_sentence = chunks_per_sentence
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.chunk = sample * (chunk_size // len(sample)) # Non-silent samples let a bench tell speech from gaps
+        self.timings = timings or {}
+        self.aborted_streams = 0
+        self.text_to_speech = self
+
+    def _schedule(self, text):
+        """Seconds since the request at which each chunk is yielded."""
+        if text not in self.timings:
+            return [(i + 1) * self.chunk_delay for i in range(self.chunks_per_sentence)]
+        first, total, size = self.timings[text]
+        count = max(1, -(-size // self.chunk_size))
+        step = (total - first) / max(1, count - 1)
+        return [first + i * step for i in range(count)]
+
+    def stream(self, text, voice_id=None, model_id=None, **kwargs):
+        schedule = self._schedule(text)
+        started = time.perf_counter()
+        sent = 0
+        try:
+            for at in schedule:
+                time.sleep(max(0.0, started + at - time.perf_counter()))
+                sent += 1
+                yield self.chunk
+        finally:
+            if sent < len(schedule):
+                self.aborted_streams += 1
+
+
+# --- AUDIO OUTPUT STAND-IN ---
+class FakeOutputStream:
+    """
+    A sound card for PcmPlayer: pulls a block from the callback in real time,
+    the way PortAudio does, and hands each one to `on_block(block)`.
+    Use `lambda rate, frames, callback: FakeOutputStream(rate, frames, callback, on_block)` as `open_output`.
+    """
+    def __init__(self, sample_rate, frames_per_buffer, callback, on_block=None):
+        self.callback = callback
+        self.frames_per_buffer = frames_per_buffer
+        self.period = frames_per_buffer / sample_rate
+        self.on_block = on_block
+        self.blocks = 0
+        self._closed = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        next_at = time.perf_counter()
+        while not self._closed.is_set():
+            block = self.callback(self.frames_per_buffer)
+            self.blocks += 1
+            if self.on_block:
+                self.on_block(block)
+            next_at += self.period
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+
+    def is_active(self):
+        return not self._closed.is_set()
+
+    def close(self):
+        self._closed.set()
+
+
+# --- DESKTOP STAND-IN (headless mode) ---
+class FakeDesktop:
+    """
+    Stands in for everything the skills drive on the desktop: pyautogui, screen
+    brightness, battery, master volume and the browser. install() swaps it into
+    skills.py (and skips the pauses that wait for the UI); every action is
+    appended to `actions` instead of being performed.
+    """
+    Error = webbrowser.Error
+
+    def __init__(self, volume=50, brightness=50, battery=80):
+        self.actions = []
+        self.volume = volume
+        self.brightness = brightness
+        self.battery = battery
+
+    def install(self, skills):
+        skills.pyautogui = skills.sbc = skills.psutil = self
+        skills.webbrowser = self
+        skills._get_volume_percentage = lambda: self.volume
+        skills._set_volume_percentage = self._set_volume
+        skills.UI_PAUSE_SCALE = 0.0
+        return self
+
+    def _set_volume(self, percent):
+        self.volume = percent
+        self.actions.append(("volume", percent))
+
+    # pyautogui
+    def hotkey(self, *keys):
+        self.actions.append(("hotkey", keys))
+
+    def press(self, key):
+        self.actions.append(("press", key))
+
+    def write(self, text, interval=0.0):
+        self.actions.append(("write", text))
+
+    typewrite = write
+
+    def click(self, x=None, y=None):
+        self.actions.append(("click", (x, y)))
+
+    # screen_brightness_control
+    def get_brightness(self):
+        return [self.brightness]
+
+    def set_brightness(self, value):
+        self.brightness = value
+        self.actions.append(("brightness", value))
+
+    # psutil
+    def sensors_battery(self):
+        return SimpleNamespace(percent=self.battery, power_plugged=True)
+
+    # webbrowser
+    def BackgroundBrowser(self, command):
+        return command
+
+    def register(self, name, klass, instance=None, preferred=False):
+        pass
+
+    def get(self, name=None):
+        return self
+
+    def open(self, url, *args, **kwargs):
+        self.actions.append(("open", url))
+        return True
+
+    open_new_tab = open
+
+
+# --- SPOTIFY STAND-IN (headless mode) ---
+class FakeSpotifyAuth:
+    """
+    The token side of spotipy's SpotifyOAuth: tokens live `lifetime` seconds and
+    a refresh takes `refresh_delay`. get_access_token() refreshes lazily, the
+    way spotipy does inside an API call once the token is within a minute (of an hour) of expiry.
+    """
+    class _Cache:
+        def __init__(self):
+            self.token_info = None
+
+        def get_cached_token(self):
+            return self.token_info
+
+        def save_token_to_cache(self, token_info):
+            self.token_info = token_info
+
+    def __init__(self, lifetime=3600.0, refresh_delay=0.3):
+        self.lifetime = lifetime
+        self.refresh_delay = refresh_delay
+        self.cache_handler = self._Cache()
+        self.refreshes = 0
+        self._issue()
+
+    def _issue(self):
+        self.cache_handler.save_token_to_cache({"access_token": f"token-{self.refreshes}", "refresh_token": "refresh",
+                                                "expires_in": self.lifetime, "expires_at": time.time() + self.lifetime})
+
+    def refresh_access_token(self, refresh_token):
+        time.sleep(self.refresh_delay)
+        self.refreshes += 1
+        self._issue()
+        return self.cache_handler.get_cached_token()
+
+    def get_access_token(self, as_dict=False):
+        info = self.cache_handler.get_cached_token()
+        if info["expires_at"] - time.time() < self.lifetime / 60: # spotipy: 60 s of an hour
+            info = self.refresh_access_token(info["refresh_token"])
+        return info if as_dict else info["access_token"]
+
+
+class FakeSpotifyClient:
+    """
+    The subset of spotipy.Spotify that spotify_api.py calls: one active desktop
+    device, a few playlists, and a search that always finds a track. Each call
+    takes `latency` seconds and is appended to `calls`; with a FakeSpotifyAuth
+    it first gets a token, refreshing it if it has (nearly) expired.
+    """
+    def __init__(self, playlists=("Focus", "English", "Download"), latency=0.0, auth=None):
+        self.playlists = [{"name": name, "uri": f"spotify:playlist:{i}"} for i, name in enumerate(playlists)]
+        self.latency = latency
+        self.auth = auth
+        self.calls = []
+
+    def _call(self, name, **kwargs):
+        if self.auth:
+            self.auth.get_access_token()
+        time.sleep(self.latency)
+        self.calls.append((name, kwargs))
+
+    def devices(self):
+        self._call("devices")
+        return {"devices": [{"id": "headless", "name": "Headless", "type": "Computer", "is_active": True}]}
+
+    def transfer_playback(self, device_id, force_play=False):
+        self._call("transfer_playback", device_id=device_id)
+
+    def start_playback(self, device_id=None, context_uri=None, uris=None):
+        self._call("start_playback", context_uri=context_uri, uris=uris)
+
+    def pause_playback(self, device_id=None):
+        self._call("pause_playback")
+
+    def next_track(self, device_id=None):
+        self._call("next_track")
+
+    def previous_track(self, device_id=None):
+        self._call("previous_track")
+
+    def current_user(self):
+        self._call("current_user")
+        return {"id": "headless"}
+
+    def current_user_playlists(self, limit=50):
+        self._call("current_user_playlists")
+        return {"items": self.playlists[:limit]}
+
+    def search(self, q, limit=1, type="track"):
+        self._call("search", q=q)
+        return {"tracks": {"items": [{"uri": "spotify:track:headless", "name": q.title()}]}}
@@ -0,0 +1,52 @@
+# startup.py (Audio path first; network clients and rarely used imports in the background)
+import threading
+import time
+
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("startup")
+
+
+class StartupOrchestrator:
+    """
+    Runs slow startup steps (Spotify login, the ElevenLabs client, a warm
+    Fireworks connection, GUI automation imports) on background threads in
+    parallel while the caller brings up the microphone and wake word. Each
+    step's duration is exported, as is the time from process start to
+    "listening".
+    """
+    def __init__(self, process_started):
+        self.process_started = process_started # time.perf_counter() taken before the heavy imports
+        self.steps = {}
+
+    def background(self, name, fn, on_done=None):
+        """Starts `fn()` on its own thread. `on_done(result)` runs on that thread if it succeeds."""
+        done = threading.Event()
+        self.steps[name] = done
+
+        def run():
+            started = time.perf_counter()
+            try:
+                result = fn()
+                if on_done:
+                    on_done(result)
+                logger.debug("Startup step '%s' finished in %.2fs.", name, time.perf_counter() - started)
+            except Exception as e:
+                logger.error("🚨 Startup step '%s' failed: %s", name, e)
+            finally:
+                metrics.STARTUP_STEP_SECONDS.set(time.perf_counter() - started, step=name)
+                done.set()
+
+        threading.Thread(target=run, name=f"startup-{name}", daemon=True).start()
+        return done
+
+    def mark_listening(self):
+        elapsed = time.perf_counter() - self.process_started
+        metrics.STARTUP_TO_LISTENING.set(elapsed)
+        logger.info("⏱️ Listening %.2fs after start.", elapsed)
+        return elapsed
+
+    def wait(self, timeout=None):
+        """Blocks until every background step has finished (or `timeout` per step). Returns True if all did."""
+        return all(done.wait(timeout) for done in self.steps.values())
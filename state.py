@@ -1,22 +1,248 @@
+import contextvars
 import threading
-import queue
 import os
+import time
+
+from . import metrics
+from .command_queue import CommandQueue
+from .follow_up import FollowUpWindow
+from .log import get_logger
+from .sentence_queue import SentenceQueue
+
+logger = get_logger("state")
 
 # --- STATE, EVENTS, & QUEUES ---
 class AssistantState:
     IDLE, LISTENING, THINKING, SPEAKING = "IDLE", "LISTENING", "THINKING", "SPEAKING" 
-STATE = AssistantState.IDLE
-state_lock = threading.Lock()
-interruption_event = threading.Event()
-command_queue = queue.Queue()
-tts_sentence_queue = queue.Queue()
 
-# --- GLOBAL INTERFACE FOR LISTENING CONTROL ---
-# Used to expose control methods from AudioHandler to other threads (e.g., Responder)
-LISTENING_INTERFACE = {} 
 
-# --- GLOBAL SENTINEL (End of Queue marker) ---
-END_OF_AUDIO = object()
+class IllegalTransition(RuntimeError):
+    pass
+
+
+class AssistantStateMachine:
+    """
+    The assistant's state with declared transitions.
+
+    Reads of `current` take no lock (a single attribute read), so the audio loop
+    can check it on every chunk. Writes go through transition(), which
+    validates the move against TRANSITIONS and optionally against `expected`
+    (compare-and-set): a worker that only wants to go IDLE "if still SPEAKING"
+    can no longer clobber a new turn that has already moved to LISTENING.
+    """
+    TRANSITIONS = {
+        AssistantState.IDLE: {AssistantState.LISTENING, AssistantState.THINKING},
+        AssistantState.LISTENING: {AssistantState.THINKING, AssistantState.IDLE},
+        AssistantState.THINKING: {AssistantState.SPEAKING, AssistantState.IDLE},
+        AssistantState.SPEAKING: {AssistantState.LISTENING, AssistantState.THINKING, AssistantState.IDLE},
+    }
+
+    def __init__(self, initial=AssistantState.IDLE, strict=False):
+        self.current = initial
+        self.strict = strict # Raise on illegal transitions instead of refusing them
+        self._lock = threading.Lock()
+        self._entered = time.monotonic()
+        self._dwell = {name: 0.0 for name in self.TRANSITIONS}
+        self._subscribers = []
+        self.illegal_transitions = 0
+        self.stale_transitions = 0
+
+    def subscribe(self, callback):
+        """callback(previous, new) runs on the thread that made the transition, in transition order."""
+        self._subscribers.append(callback)
+
+    def _enter_locked(self, previous, target):
+        now = time.monotonic()
+        elapsed = now - self._entered
+        self._dwell[previous] += elapsed
+        self._entered = now
+        self.current = target
+        if previous != target:
+            # Subscribers run under the lock so every one sees transitions in the order they happened
+            for callback in list(self._subscribers):
+                try:
+                    callback(previous, target)
+                except Exception as e:
+                    logger.warning("State subscriber error: %s", e)
+        return elapsed
+
+    def transition(self, target, expected=None, reason=""):
+        """
+        Moves to `target`. Returns False, without changing anything, when the
+        current state is not in `expected` (stale request) or the move is not
+        declared (illegal; raises IllegalTransition in strict mode).
+        Moving to the current state is a no-op that returns True.
+        """
+        with self._lock:
+            previous = self.current
+            if expected is not None and previous not in expected:
+                self.stale_transitions += 1
+                metrics.STATE_STALE_TRANSITIONS.inc(source=previous, target=target)
+                return False
+            if previous == target:
+                return True
+            if target not in self.TRANSITIONS[previous]:
+                self.illegal_transitions += 1
+                metrics.STATE_ILLEGAL_TRANSITIONS.inc(source=previous, target=target)
+                if self.strict:
+                    raise IllegalTransition(f"{previous} -> {target} ({reason})")
+                return False
+
+            elapsed = self._enter_locked(previous, target)
+
+        metrics.STATE_SECONDS.inc(elapsed, state=previous)
+        metrics.STATE_TRANSITIONS.inc(source=previous, target=target)
+        return True
+
+    def reset(self, reason=""):
+        """Forces IDLE from any state (error recovery)."""
+        with self._lock:
+            previous = self.current
+            elapsed = self._enter_locked(previous, AssistantState.IDLE)
+        metrics.STATE_SECONDS.inc(elapsed, state=previous)
+        if previous != AssistantState.IDLE:
+            metrics.STATE_TRANSITIONS.inc(source=previous, target=AssistantState.IDLE)
+
+    def dwell_seconds(self):
+        """Total seconds spent in each state, including the time so far in the current one."""
+        with self._lock:
+            dwell = dict(self._dwell)
+            dwell[self.current] += time.monotonic() - self._entered
+        return dwell
+
+
+# --- PER-TURN CANCELLATION (Barge-in) ---
+class CancellationToken:
+    """
+    Cancels one turn. cancel() sets the flag and immediately runs every closer
+    registered against the token (HTTP responses, TTS streams, playback), so
+    in-flight network streams are torn down instead of being polled between chunks.
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._closers = []
+
+    def register(self, closer):
+        with self._lock:
+            if not self._event.is_set():
+                self._closers.append(closer)
+                return
+        _run_closer(closer) # Already cancelled: close right away
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            _run_closer(closer)
+
+    def is_cancelled(self):
+        return self._event.is_set()
+
+def _run_closer(closer):
+    try:
+        closer()
+    except Exception as e:
+        logger.warning("Error while closing a cancelled stream: %s", e)
+
+
+# --- SESSIONS (One per conversation: the desktop loop, or each server-mode client) ---
+class Session:
+    """
+    Everything that belongs to one conversation: the state machine, the
+    command and sentence queues, the running turn's cancellation token, the
+    dialogue context, the follow-up window and the listening controls.
+
+    The desktop assistant has a single session (DEFAULT_SESSION). Server mode
+    (server.py) creates one per connected client, and the module-level names
+    below (state.state_machine, state.DIALOGUE_CONTEXT, state.CURRENT_TURN...)
+    resolve to the session that is current in the calling thread: the one
+    activated with bind() or start(), else DEFAULT_SESSION. Code written
+    against the globals therefore runs unchanged in every session.
+    """
+    def __init__(self, name="local"):
+        self.name = name
+        self.state_machine = AssistantStateMachine()
+        self.interruption_event = threading.Event()
+        self.command_queue = CommandQueue(on_preempt=self._preempt_turn)
+        self.tts_sentence_queue = SentenceQueue() # Bounded; each turn ends with exactly one end_turn() marker
+        self.listening_interface = {} # Control methods of the audio loop for other threads (e.g. "go to sleep")
+        self.dialogue = {"active": False, "intent": None, "slots": {}} # Multi-turn dialogue (WhatsApp)
+        self.follow_up = FollowUpWindow() # Listening for the answer to a dialogue prompt without the wake word
+        self.turn = CancellationToken()
+        metrics.register_queue("command_queue", self.command_queue, session=name)
+        metrics.register_queue("tts_sentence_queue", self.tts_sentence_queue, session=name)
+
+    def _preempt_turn(self):
+        """A higher-priority command arrived: cancel the running turn and drop its pending sentences."""
+        self.interruption_event.set()
+        self.turn.cancel()
+        self.tts_sentence_queue.drop_sentences()
+
+    def new_turn(self):
+        """Starts a fresh cancellation token for the next command."""
+        self.turn = CancellationToken()
+        return self.turn
+
+    def end_dialogue(self):
+        self.dialogue = {"active": False, "intent": None, "slots": {}}
+
+    def close(self):
+        """Cancels the running turn and ends the session's worker loops (their queues return None)."""
+        self.follow_up.close("interrupted")
+        self._preempt_turn()
+        self.command_queue.close()
+        self.tts_sentence_queue.close()
+        metrics.unregister_queues(self.name)
+
+    def bind(self, fn):
+        """`fn` wrapped to run with this session current, on whichever thread calls it."""
+        def run(*args, **kwargs):
+            token = _current_session.set(self)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _current_session.reset(token)
+        return run
+
+    def start(self, thread):
+        """Starts a worker thread (responder, speaker...) with this session current in it."""
+        thread.run = self.bind(thread.run)
+        thread.start()
+        return thread
+
+
+_current_session = contextvars.ContextVar("assistant_session")
+DEFAULT_SESSION = Session()
+
+def current_session():
+    return _current_session.get(DEFAULT_SESSION)
+
+# Module attribute -> Session attribute, looked up in the current session on every access
+_SESSION_ATTRIBUTES = {
+    "state_machine": "state_machine",
+    "interruption_event": "interruption_event",
+    "command_queue": "command_queue",
+    "tts_sentence_queue": "tts_sentence_queue",
+    "LISTENING_INTERFACE": "listening_interface",
+    "DIALOGUE_CONTEXT": "dialogue",
+    "follow_up": "follow_up",
+    "CURRENT_TURN": "turn",
+}
+
+def __getattr__(name):
+    attribute = _SESSION_ATTRIBUTES.get(name)
+    if attribute is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(current_session(), attribute)
+
+def new_turn():
+    """Starts a fresh cancellation token for the current session's next command."""
+    return current_session().new_turn()
 
-# --- GLOBAL STATE FOR MULTI-TURN DIALOGUE ---
-DIALOGUE_CONTEXT = {"active": False, "intent": None, "slots": {}}
\ No newline at end of file
+def end_dialogue():
+    """Resets the current session's multi-turn dialogue."""
+    current_session().end_dialogue()
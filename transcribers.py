@@ -0,0 +1,380 @@
+# transcribers.py (Streaming speech-to-text engines behind one interface)
+import importlib.util
+import json
+import os
+import queue
+import threading
+import time
+
+import websocket
+
+from . import config
+from . import metrics
+from .log import get_logger
+from .uplink_codecs import PcmEncoder, choose_encoder
+
+logger = get_logger("transcriber")
+
+
+# --- TRANSCRIBER INTERFACE ---
+# Every engine exposes the same calls used by AudioHandler:
+#   start()                -> begin a session (non-blocking)
+#   wait_ready(timeout)    -> True once audio can be sent, False on failure/timeout
+#   send(frame)            -> push one 16 kHz int16 PCM frame
+#   stop()                 -> end the session
+# Transcripts are delivered through the on_text(text) callback given at construction.
+# send() is called from the capture loop and must never block on I/O.
+
+
+# --- UPLINK (Network sends off the capture thread) ---
+class FrameUplink:
+    """
+    Bounded frame queue drained by a sender thread, so capture timing never
+    depends on network latency. Frames that are waiting together are joined
+    into one message of about UPLINK_BATCH_MS of audio (up to
+    UPLINK_MAX_BATCH_MS when catching up). When the queue is full the oldest
+    frame is dropped and counted: stale audio is worth less than current audio.
+    Batches are compressed by `encoder` (see uplink_codecs.py) on the sender
+    thread, so encoding never delays capture either.
+
+    `send_message(data)` runs on the sender thread and returns False if the
+    connection is not usable.
+    """
+    def __init__(self, send_message, encoder=None, max_frames=None, batch_ms=None, max_batch_ms=None):
+        self.send_message = send_message
+        self.encoder = encoder or PcmEncoder()
+        self.frames = queue.Queue(maxsize=max_frames or config.UPLINK_QUEUE_FRAMES)
+        self.batch_ms = config.UPLINK_BATCH_MS if batch_ms is None else batch_ms
+        self.max_batch_ms = max_batch_ms or config.UPLINK_MAX_BATCH_MS
+        self.sent_frames = self.dropped_frames = self.messages = 0
+        self.raw_bytes = self.sent_bytes = 0
+        metrics.register_queue("transcriber_uplink", self.frames)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, frame):
+        """Never blocks. Called from the capture thread."""
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self._dropped(1, "queue_full")
+                except queue.Empty:
+                    pass
+
+    def close(self, wait=None):
+        """Sends what is already queued, then stops the sender thread. Blocks only if `wait` (seconds) is given."""
+        self.put(None)
+        if wait:
+            self.thread.join(timeout=wait)
+
+    def _dropped(self, count, reason):
+        self.dropped_frames += count
+        metrics.UPLINK_FRAMES.inc(count, result="dropped", reason=reason)
+
+    def _frame_ms(self, frame):
+        return len(frame) / 2 / config.SAMPLE_RATE * 1000 # int16 mono
+
+    def _run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                return
+            batch, audio_ms = [frame], self._frame_ms(frame)
+            deadline = time.monotonic() + (self.batch_ms - audio_ms) / 1000
+            closing = False
+            while audio_ms < self.max_batch_ms:
+                try:
+                    if audio_ms < self.batch_ms:
+                        frame = self.frames.get(timeout=max(0.0, deadline - time.monotonic()))
+                    else:
+                        frame = self.frames.get_nowait() # Backlog only; never wait past the batch size
+                except queue.Empty:
+                    break
+                if frame is None:
+                    closing = True
+                    break
+                batch.append(frame)
+                audio_ms += self._frame_ms(frame)
+            self._send(batch, closing)
+            if closing:
+                return
+
+    def _send(self, batch, closing=False):
+        pcm = b"".join(batch)
+        started = time.perf_counter()
+        try:
+            messages = self.encoder.encode(pcm)
+            if closing:
+                messages += self.encoder.flush()
+            sent = True
+            for message in messages:
+                sent = self.send_message(message)
+                if not sent:
+                    break
+                self.sent_bytes += len(message)
+                metrics.UPLINK_BYTES.inc(len(message), codec=self.encoder.name)
+        except Exception as e:
+            logger.debug("Uplink send failed: %s", e)
+            sent = False
+        if not sent:
+            self._dropped(len(batch), "disconnected")
+            return
+        metrics.UPLINK_SEND_SECONDS.observe(time.perf_counter() - started)
+        metrics.UPLINK_FRAMES.inc(len(batch), result="sent")
+        metrics.UPLINK_MESSAGES.inc(len(messages))
+        self.raw_bytes += len(pcm)
+        self.sent_frames += len(batch)
+        self.messages += len(messages)
+
+
+FIREWORKS_STREAMING_URL = "wss://audio-streaming-v2.api.fireworks.ai/v1/audio/transcriptions/streaming"
+
+
+class FireworksTranscriber:
+    """
+    Cloud streaming transcriber (Fireworks WebSocket). The uplink codec is
+    chosen when the session starts; anything but raw PCM is announced to the
+    endpoint with an `encoding=` query parameter.
+    """
+    name = "fireworks"
+
+    def __init__(self, on_text, url=None, codecs=None):
+        self.on_text = on_text
+        self.url = url or FIREWORKS_STREAMING_URL
+        self.codecs = codecs # Overrides UPLINK_CODECS/TRANSCRIBER_ACCEPTED_CODECS (benchmarks)
+        self.ws = None
+        self.ws_thread = None
+        self.uplink = None
+        self.connected = threading.Event()
+        self.failed = threading.Event()
+        self._ready = threading.Event() # Set on open OR on failure, so wait_ready() returns early on errors
+
+    def start(self):
+        logger.info("Connecting to transcriber...")
+        self.connected.clear()
+        self.failed.clear()
+        self._ready.clear()
+        encoder = choose_encoder(self.codecs, self.codecs)
+        url = f"{self.url}?authorization=Bearer {config.FIREWORKS_API_KEY}&language=en"
+        if encoder.name != "pcm":
+            url += f"&encoding={encoder.name}"
+        logger.debug("Uplink codec: %s", encoder.name)
+        self.ws = websocket.WebSocketApp(url, on_message=self._on_message, on_open=self._on_open, on_error=self._on_error, on_close=self._on_close)
+        self.ws_thread = threading.Thread(target=self.ws.run_forever, daemon=True)
+        self.ws_thread.start()
+        self.uplink = FrameUplink(self._send_message, encoder=encoder)
+
+    def wait_ready(self, timeout):
+        self._ready.wait(timeout=timeout)
+        return self.connected.is_set() and not self.failed.is_set()
+
+    def send(self, frame):
+        if self.uplink:
+            self.uplink.put(frame)
+
+    def _send_message(self, data):
+        ws = self.ws
+        if ws and ws.sock and ws.sock.connected:
+            ws.send(data, opcode=websocket.ABNF.OPCODE_BINARY)
+            return True
+        return False
+
+    def stop(self):
+        if self.uplink:
+            self.uplink.close()
+            logger.debug("Uplink: %d frames in %d messages (%s, %d of %d bytes), %d dropped.", self.uplink.sent_frames, self.uplink.messages,
+                         self.uplink.encoder.name, self.uplink.sent_bytes, self.uplink.raw_bytes, self.uplink.dropped_frames)
+            self.uplink = None
+        if self.ws:
+            logger.debug("Closing connection.")
+            try:
+                self.ws.close()
+            except Exception as e:
+                logger.warning("Error closing websocket: %s", e)
+            self.ws = None
+            self.ws_thread = None
+
+    def _on_open(self, ws):
+        logger.info("...now listening for your command...")
+        self.connected.set()
+        self._ready.set()
+
+    def _on_error(self, ws, error):
+        logger.error("Transcriber error: %s", error)
+        self.failed.set()
+        self._ready.set()
+
+    def _on_close(self, ws, status, msg):
+        logger.debug("Connection closed.")
+
+    def _on_message(self, ws, message):
+        response = json.loads(message)
+        transcript = response.get("text", "")
+        if transcript:
+            self.on_text(transcript)
+
+
+# --- LOCAL CPU TRANSCRIBER (Vosk, optional dependency) ---
+_VOSK_MODEL = None
+_VOSK_MODEL_LOCK = threading.Lock()
+_LOCAL_ASR_CONFIGURED = None
+
+def _model_size_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total / (1024 * 1024)
+
+def local_asr_configured():
+    """
+    Cheap check (no model load): vosk is installed, the model exists and it fits
+    in LOCAL_ASR_MEMORY_BUDGET_MB. The result is cached for the process.
+    """
+    global _LOCAL_ASR_CONFIGURED
+    if _LOCAL_ASR_CONFIGURED is not None:
+        return _LOCAL_ASR_CONFIGURED
+
+    model_path = config.LOCAL_ASR_MODEL_PATH
+    if importlib.util.find_spec("vosk") is None:
+        logger.warning("⚠️ vosk is not installed. Offline transcription disabled.")
+        _LOCAL_ASR_CONFIGURED = False
+    elif not model_path or not os.path.isdir(model_path):
+        logger.warning("⚠️ Local ASR model not found at '%s'. Offline transcription disabled.", model_path)
+        _LOCAL_ASR_CONFIGURED = False
+    else:
+        size_mb = _model_size_mb(model_path)
+        _LOCAL_ASR_CONFIGURED = size_mb <= config.LOCAL_ASR_MEMORY_BUDGET_MB
+        if not _LOCAL_ASR_CONFIGURED:
+            logger.warning("⚠️ Local ASR model is %.0f MB, over the %d MB budget. Offline transcription disabled.", size_mb, config.LOCAL_ASR_MEMORY_BUDGET_MB)
+    return _LOCAL_ASR_CONFIGURED
+
+def load_local_model():
+    """Loads the Vosk model once, on first offline session. Returns None if it cannot be loaded."""
+    global _VOSK_MODEL, _LOCAL_ASR_CONFIGURED
+    with _VOSK_MODEL_LOCK:
+        if _VOSK_MODEL is not None or not local_asr_configured():
+            return _VOSK_MODEL
+        try:
+            import vosk
+            vosk.SetLogLevel(-1)
+            started = time.time()
+            _VOSK_MODEL = vosk.Model(config.LOCAL_ASR_MODEL_PATH)
+            logger.info("✅ Local ASR model loaded in %.1fs.", time.time() - started)
+        except Exception as e:
+            logger.error("🚨 Failed to load local ASR model: %s", e)
+            _LOCAL_ASR_CONFIGURED = False
+        return _VOSK_MODEL
+
+
+class LocalTranscriber:
+    """
+    Offline CPU transcriber (Vosk small model). Frames are decoded on a worker
+    thread so the capture loop never waits on recognition.
+    """
+    name = "local"
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.frames = queue.Queue()
+        self.worker = None
+        self.recognizer = None
+
+    def start(self):
+        import vosk
+        model = load_local_model()
+        if model is None:
+            return
+        self.recognizer = vosk.KaldiRecognizer(model, config.SAMPLE_RATE)
+        self.frames = queue.Queue()
+        self.worker = threading.Thread(target=self._decode_loop, args=(self.frames, self.recognizer), daemon=True)
+        self.worker.start()
+        logger.info("...now listening for your command (offline)...")
+
+    def wait_ready(self, timeout):
+        return self.recognizer is not None
+
+    def send(self, frame):
+        self.frames.put(frame)
+
+    def stop(self):
+        if self.worker:
+            self.frames.put(None)
+            self.worker = None
+            self.recognizer = None
+
+    def _decode_loop(self, frames, recognizer):
+        text = ""
+        while True:
+            frame = frames.get()
+            if frame is None:
+                break
+            if recognizer.AcceptWaveform(frame):
+                final = json.loads(recognizer.Result()).get("text", "")
+                if final:
+                    text = f"{text} {final}".strip()
+                    self.on_text(text)
+            else:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                if partial:
+                    self.on_text(f"{text} {partial}".strip())
+
+
+# --- FAILOVER: cloud first, local on connect failure or high latency ---
+class TranscriberFailover:
+    """
+    Opens a session on the cloud transcriber and falls back to the local engine
+    when the cloud does not connect within TRANSCRIBER_CONNECT_TIMEOUT or its
+    measured first-transcript latency exceeds TRANSCRIBER_MAX_LATENCY_S. After a
+    failure the cloud is skipped for TRANSCRIBER_RETRY_AFTER_S, so repeated
+    turns do not each pay the connect timeout.
+    """
+    def __init__(self, on_text, url=None):
+        self.on_text = on_text
+        self.url = url # Cloud endpoint override (stand-ins); FIREWORKS_STREAMING_URL by default
+        self.cloud_down_until = 0.0
+
+    def _mark_cloud_down(self, reason):
+        metrics.TRANSCRIBER_FAILOVERS.inc()
+        self.cloud_down_until = time.time() + config.TRANSCRIBER_RETRY_AFTER_S
+        logger.warning("⚠️ Cloud transcriber %s. Using local ASR for the next %ss.", reason, config.TRANSCRIBER_RETRY_AFTER_S)
+
+    def open_session(self):
+        """Returns a started, ready transcriber, or None if no engine is usable."""
+        if time.time() >= self.cloud_down_until:
+            cloud = FireworksTranscriber(self.on_text, url=self.url)
+            cloud.start()
+            logger.debug("Waiting for connection...")
+            # Only wait the full timeout when there is nothing to fall back to
+            timeout = config.TRANSCRIBER_CONNECT_TIMEOUT if local_asr_configured() else 5
+            if cloud.wait_ready(timeout=timeout):
+                metrics.TRANSCRIBER_SESSIONS.inc(engine="fireworks", result="connected")
+                return cloud
+            metrics.TRANSCRIBER_SESSIONS.inc(engine="fireworks", result="failed")
+            cloud.stop()
+            self._mark_cloud_down("did not connect")
+
+        if local_asr_configured():
+            local = LocalTranscriber(self.on_text)
+            local.start()
+            if local.wait_ready(timeout=0):
+                metrics.TRANSCRIBER_SESSIONS.inc(engine="local", result="connected")
+                return local
+            metrics.TRANSCRIBER_SESSIONS.inc(engine="local", result="failed")
+        return None
+
+    def is_available(self):
+        """True if a session could be opened now (cloud not marked down, or a local model configured)."""
+        return time.time() >= self.cloud_down_until or local_asr_configured()
+
+    def report_latency(self, transcriber, seconds):
+        """Called with the delay between the first speech frame and the first transcript."""
+        if transcriber.name == "fireworks" and seconds > config.TRANSCRIBER_MAX_LATENCY_S:
+            self._mark_cloud_down(f"is slow ({seconds:.1f}s to first transcript)")
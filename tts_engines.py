@@ -0,0 +1,239 @@
+# tts_engines.py (Text-to-speech engines behind one interface, and the cloud/local routing policy)
+import importlib.util
+import math
+import os
+import shutil
+import struct
+import subprocess
+import threading
+import time
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("tts")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ELEVENLABS_VOICE_ID = "pNInz6obpgDQGcFmaJgB"
+ELEVENLABS_MODEL_ID = "eleven_turbo_v2"
+
+
+class Reply(str):
+    """A templated reply (skill result, dialogue prompt, error), as opposed to a sentence of an LLM answer."""
+
+
+class PcmResampler:
+    """
+    Linear-interpolation resampling of one 16-bit mono PCM stream, chunk by
+    chunk (needs numpy). The read position, the last sample and a chunk's odd
+    trailing byte carry over to the next chunk, so the output is the same as
+    resampling the whole stream at once: no clicks or drift at chunk boundaries.
+    """
+    def __init__(self, from_rate, to_rate):
+        self.from_rate = from_rate
+        self.to_rate = to_rate
+        self.step = from_rate / to_rate # Input samples per output sample
+        self._odd = b"" # Half a sample left over from the previous chunk
+        self._last = None # Previous chunk's last sample: left neighbour of this chunk's first
+        self._pos = 0.0 # Position of the next output sample; 0 is _last (or the first sample)
+        if from_rate != to_rate and np is None:
+            raise RuntimeError(f"numpy is needed to play {from_rate} Hz audio at {to_rate} Hz")
+
+    def process(self, pcm):
+        if self.from_rate == self.to_rate:
+            return pcm
+        data = self._odd + pcm
+        whole = len(data) // 2 * 2
+        self._odd = data[whole:]
+        samples = np.frombuffer(data[:whole], dtype=np.int16).astype(np.float32)
+        if self._last is not None:
+            samples = np.concatenate(([self._last], samples))
+        if len(samples) == 0:
+            return b""
+        # Output samples that have both neighbours in this chunk; the rest wait for the next one
+        count = max(0, math.ceil((len(samples) - 1 - self._pos) / self.step))
+        positions = self._pos + self.step * np.arange(count)
+        out = np.interp(positions, np.arange(len(samples)), samples)
+        self._pos += count * self.step - (len(samples) - 1)
+        self._last = samples[-1]
+        return np.round(out).astype(np.int16).tobytes()
+
+
+# --- ENGINES: stream(text) yields 16-bit mono PCM at engine.sample_rate ---
+_reading = threading.local() # The TTSStream this thread is reading a chunk of, for the HTTP response hook
+
+
+class TTSStream:
+    """
+    One sentence of audio chunks from an engine. close() may be called from
+    any thread (barge-in): a cloud stream's HTTP response is closed at once,
+    which ends a read waiting for the next chunk instead of letting it finish;
+    any other stream stops at its next chunk and is closed by its reader.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self.response = None # The HTTP response, once the client's response hook has seen it
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        _reading.stream = self
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            raise
+        except Exception:
+            if self.closed: # The read was aborted by close()
+                raise StopIteration from None
+            raise
+        finally:
+            _reading.stream = None
+
+    def close(self):
+        self.closed = True
+        if self.response is not None:
+            self.response.close()
+        try:
+            close = getattr(self._chunks, "close", None)
+            if close:
+                close()
+        except ValueError:
+            pass # A generator still inside a read on the reader's thread; it stops when that read returns
+
+def _on_response(response):
+    stream = getattr(_reading, "stream", None)
+    if stream is not None:
+        stream.response = response
+        if stream.closed: # Closed while the request was being sent
+            response.close()
+
+def create_elevenlabs_client(api_key):
+    """The ElevenLabs SDK client, on an HTTP client that hands each streaming response to the TTSStream reading it."""
+    import httpx
+    from elevenlabs.client import ElevenLabs
+    return ElevenLabs(api_key=api_key, httpx_client=httpx.Client(follow_redirects=True, event_hooks={"response": [_on_response]}))
+
+
+class ElevenLabsTTS:
+    name = "elevenlabs"
+
+    def __init__(self, client=None, sample_rate=None):
+        self.client = client
+        self.sample_rate = sample_rate or config.TTS_SAMPLE_RATE
+
+    def stream(self, text):
+        return self.client.text_to_speech.stream(text=text, voice_id=ELEVENLABS_VOICE_ID, model_id=ELEVENLABS_MODEL_ID,
+                                                 output_format=f"pcm_{self.sample_rate}")
+
+
+class PiperTTS:
+    """Piper neural voice on the CPU (pip install piper-tts; an .onnx voice with its .onnx.json next to it)."""
+    name = "piper"
+
+    def __init__(self, model_path):
+        from piper.voice import PiperVoice # Imported here: loads onnxruntime
+        self.voice = PiperVoice.load(model_path)
+        self.sample_rate = self.voice.config.sample_rate
+
+    def stream(self, text):
+        if hasattr(self.voice, "synthesize_stream_raw"): # piper-tts < 1.3
+            yield from self.voice.synthesize_stream_raw(text)
+        else:
+            for chunk in self.voice.synthesize(text):
+                yield chunk.audio_int16_bytes
+
+
+class EspeakTTS:
+    """espeak-ng (or espeak) as a subprocess, streaming its WAV output from stdout."""
+    name = "espeak"
+    WAV_HEADER_BYTES = 44
+
+    def __init__(self, executable):
+        self.executable = executable
+        self.sample_rate = 22050 # espeak-ng's output rate; checked against each WAV header
+
+    def stream(self, text):
+        process = subprocess.Popen([self.executable, "--stdout", "-v", config.ESPEAK_VOICE, "-s", str(config.ESPEAK_WORDS_PER_MINUTE), text],
+                                   stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            header = process.stdout.read(self.WAV_HEADER_BYTES)
+            if len(header) < self.WAV_HEADER_BYTES:
+                raise RuntimeError(f"{self.executable} produced no audio")
+            rate = struct.unpack("<I", header[24:28])[0]
+            if rate != self.sample_rate:
+                raise RuntimeError(f"{self.executable} wrote {rate} Hz audio, expected {self.sample_rate} Hz")
+            while True:
+                chunk = process.stdout.read(4096)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+
+def create_local_tts():
+    """Builds the engine named by LOCAL_TTS_ENGINE ("auto" tries Piper, then espeak-ng). Returns None if none is usable."""
+    choice = config.LOCAL_TTS_ENGINE
+    if choice in ("piper", "auto") and config.PIPER_MODEL_PATH:
+        if importlib.util.find_spec("piper") is None or not os.path.exists(config.PIPER_MODEL_PATH):
+            logger.warning("⚠️ Piper voice unavailable (pip install piper-tts; PIPER_MODEL_PATH=%s).", config.PIPER_MODEL_PATH)
+        else:
+            engine = PiperTTS(config.PIPER_MODEL_PATH)
+            logger.info("✅ Local TTS: Piper (%d Hz).", engine.sample_rate)
+            return engine
+    if choice in ("espeak", "auto"):
+        executable = shutil.which("espeak-ng") or shutil.which("espeak")
+        if executable:
+            logger.info("✅ Local TTS: %s.", executable)
+            return EspeakTTS(executable)
+    if choice:
+        logger.warning("⚠️ No local TTS engine found (LOCAL_TTS_ENGINE=%s). Every reply uses ElevenLabs.", choice)
+    return None
+
+
+# --- ROUTING POLICY ---
+class TTSRouter:
+    """
+    Orders the engines to try for one sentence:
+      - the local voice while ElevenLabs is not ready or recently failed (offline),
+      - the local voice for short templated replies (Reply, up to TTS_LOCAL_MAX_CHARS),
+      - with TTS_LOCAL_FIRST_SENTENCE, the local voice for the first sentence of an
+        answer; the speaker fetches the next sentence from ElevenLabs while it plays,
+      - ElevenLabs otherwise, with the local voice as the fallback if it fails.
+    """
+    def __init__(self, cloud, local=None):
+        self.cloud = cloud
+        self.local = local
+        self.cloud_down_until = 0.0
+
+    def mark_cloud_down(self, reason):
+        if self.local is None:
+            return # Nothing to fall back to: keep trying the cloud
+        self.cloud_down_until = time.time() + config.TTS_CLOUD_RETRY_AFTER_S
+        logger.warning("⚠️ ElevenLabs %s. Using the local voice for the next %ss.", reason, config.TTS_CLOUD_RETRY_AFTER_S)
+
+    def route(self, text, cloud_ready, first_in_turn):
+        """Returns the engines to try, in order."""
+        if self.local is None:
+            reason, engines = "cloud only", [self.cloud]
+        elif not cloud_ready or time.time() < self.cloud_down_until:
+            reason, engines = "cloud unavailable", [self.local]
+        elif isinstance(text, Reply) and len(text) <= config.TTS_LOCAL_MAX_CHARS:
+            reason, engines = "short reply", [self.local, self.cloud]
+        elif first_in_turn and config.TTS_LOCAL_FIRST_SENTENCE and not isinstance(text, Reply):
+            reason, engines = "first sentence", [self.local, self.cloud]
+        else:
+            reason, engines = "default", [self.cloud, self.local]
+        metrics.TTS_ROUTES.inc(engine=engines[0].name, reason=reason)
+        return engines
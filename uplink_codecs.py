@@ -0,0 +1,108 @@
+# uplink_codecs.py (Optional compression of the audio sent to the transcriber)
+import io
+
+from . import config
+from .log import get_logger
+
+logger = get_logger("transcriber")
+
+# Libraries that failed to load once are not retried (and not warned about) every session
+_unavailable = set()
+
+
+# --- ENCODERS ---
+# Every encoder takes 16 kHz mono int16 PCM and returns the WebSocket messages to send:
+#   encode(pcm) -> [bytes, ...]   (may buffer a remainder)
+#   flush()     -> [bytes, ...]   (end of session)
+
+class PcmEncoder:
+    """Raw int16 PCM, 256 kbit/s. Accepted by every endpoint."""
+    name = "pcm"
+
+    def encode(self, pcm):
+        return [pcm] if pcm else []
+
+    def flush(self):
+        return []
+
+
+class FlacEncoder:
+    """
+    Lossless FLAC via soundfile (libsndfile). Each message is a complete FLAC
+    stream, so the endpoint can decode it without state from earlier messages.
+    """
+    name = "flac"
+
+    def __init__(self):
+        import soundfile
+        self.soundfile = soundfile
+
+    def encode(self, pcm):
+        if not pcm:
+            return []
+        buffer = io.BytesIO()
+        with self.soundfile.SoundFile(buffer, mode="w", samplerate=config.SAMPLE_RATE, channels=1, format="FLAC", subtype="PCM_16") as f:
+            f.buffer_write(pcm, dtype="int16")
+        return [buffer.getvalue()]
+
+    def flush(self):
+        return []
+
+
+class OpusEncoder:
+    """
+    Opus via opuslib (needs the system libopus). One message per Opus packet.
+    Packets are the longest valid size (60/40/20 ms) that the buffered audio
+    fills; a remainder under 20 ms waits for the next batch.
+    """
+    name = "opus"
+    PACKET_MS = (60, 40, 20)
+
+    def __init__(self):
+        import opuslib
+        self.encoder = opuslib.Encoder(config.SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = config.UPLINK_OPUS_BITRATE
+        self.pending = b""
+
+    def _packet_bytes(self, ms):
+        return int(config.SAMPLE_RATE * ms / 1000) * 2
+
+    def encode(self, pcm):
+        self.pending += pcm
+        packets = []
+        for ms in self.PACKET_MS:
+            size = self._packet_bytes(ms)
+            while len(self.pending) >= size:
+                chunk, self.pending = self.pending[:size], self.pending[size:]
+                packets.append(self.encoder.encode(chunk, size // 2))
+        return packets
+
+    def flush(self):
+        if not self.pending:
+            return []
+        size = self._packet_bytes(self.PACKET_MS[-1])
+        padded = self.pending + b"\x00" * (-len(self.pending) % size) # Pad with silence
+        self.pending = b""
+        return self.encode(padded)
+
+
+ENCODERS = {encoder.name: encoder for encoder in (PcmEncoder, FlacEncoder, OpusEncoder)}
+
+
+def choose_encoder(preferred=None, accepted=None):
+    """
+    Called at session start: the first codec in `preferred` (UPLINK_CODECS) that
+    the endpoint accepts (TRANSCRIBER_ACCEPTED_CODECS) and whose library loads.
+    Falls back to raw PCM.
+    """
+    preferred = preferred or config.UPLINK_CODECS
+    accepted = set(accepted or config.TRANSCRIBER_ACCEPTED_CODECS)
+    for name in preferred:
+        if name not in accepted or name in _unavailable or name not in ENCODERS:
+            continue
+        try:
+            return ENCODERS[name]()
+        except Exception as e: # opuslib raises a plain Exception when libopus is missing
+            _unavailable.add(name)
+            logger.warning("⚠️ %s uplink encoder unavailable (%s). Trying the next codec.", name, e)
+    return PcmEncoder()
@@ -0,0 +1,80 @@
+# wake_gate.py (Energy pre-gate in front of the wake-word engine)
+from collections import deque
+
+from . import config
+from . import metrics
+from .log import get_logger
+
+logger = get_logger("wake_gate")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FLOOR_FALL = 0.2 # Per frame: the noise floor follows quieter audio quickly...
+FLOOR_RISE = 0.002 # ...and louder audio slowly (about 15 s), so speech does not raise it
+DECIMATE = 4 # Energy is estimated on every 4th sample; plenty for a loudness check
+
+
+class WakeWordGate:
+    """
+    Tracks frame energy and the room's noise floor (vectorized with NumPy) and
+    decides which microphone frames reach Porcupine. During sustained silence
+    frames are skipped. Porcupine is a streaming model that needs contiguous
+    audio, so the gate does not thin the frames out. Skipped frames go into a
+    short look-back buffer instead. When sound starts, the buffer is replayed
+    ahead of the live frame, so a wake word at the onset of speech is not cut.
+    The gate then stays open for WAKE_GATE_HANGOVER_S after the last loud frame.
+
+    Without NumPy, or with WAKE_GATE_ENABLED off, every frame is admitted.
+    """
+    def __init__(self, frame_length, sample_rate=None):
+        sample_rate = sample_rate or config.SAMPLE_RATE
+        frame_s = frame_length / sample_rate
+        self.enabled = config.WAKE_GATE_ENABLED and np is not None
+        if config.WAKE_GATE_ENABLED and np is None:
+            logger.warning("⚠️ numpy is not installed. Wake-word energy gate disabled.")
+        self.lookback = deque(maxlen=max(1, int(config.WAKE_GATE_LOOKBACK_MS / 1000 / frame_s)))
+        self.hangover_frames = int(config.WAKE_GATE_HANGOVER_S / frame_s)
+        self.floor_db = None
+        self.open_for = self.hangover_frames # Start open: nothing is known about the room yet
+        self.processed = self.skipped = 0
+
+    def energy_db(self, pcm):
+        samples = np.frombuffer(pcm, dtype=np.int16)[::DECIMATE].astype(np.float32)
+        power = float(np.dot(samples, samples)) / max(1, len(samples))
+        return 10.0 * np.log10(power / (32768.0 ** 2) + 1e-12) # dBFS
+
+    def _is_loud(self, pcm):
+        db = self.energy_db(pcm)
+        if self.floor_db is None:
+            self.floor_db = db
+        loud = db > max(self.floor_db + config.WAKE_GATE_MARGIN_DB, config.WAKE_GATE_MIN_DBFS)
+        self.floor_db += (db - self.floor_db) * (FLOOR_FALL if db < self.floor_db else FLOOR_RISE)
+        return loud
+
+    def reset(self):
+        """Opens the gate (e.g. when returning from LISTENING) and forgets the look-back audio."""
+        self.lookback.clear()
+        self.open_for = self.hangover_frames
+
+    def admit(self, pcm):
+        """Returns the frames Porcupine should process now, oldest first (empty while gated)."""
+        if not self.enabled:
+            return [pcm]
+        if self._is_loud(pcm):
+            frames = list(self.lookback) + [pcm] if self.open_for <= 0 else [pcm]
+            self.lookback.clear()
+            self.open_for = self.hangover_frames
+        elif self.open_for > 0:
+            self.open_for -= 1
+            frames = [pcm]
+        else:
+            self.lookback.append(pcm)
+            self.skipped += 1
+            metrics.WAKE_GATE_FRAMES.inc(result="skipped")
+            return []
+        self.processed += len(frames)
+        metrics.WAKE_GATE_FRAMES.inc(len(frames), result="processed")
+        return frames